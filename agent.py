@@ -18,14 +18,23 @@ The agent:
   4. The LLM decides to convert °C → °F, we run that tool, feed the result
      back, and finally print a concise forecast.
 
+Questions that name coordinates or a place in the offline gazetteer are
+planned by `tools/fast_planner.py` instead – same trace, no LLM calls.
+Several places at once (“Paris, London and Tokyo”) are fetched in
+parallel and compared in a single LLM summary (`run_many`).
+
 Run the script, type a city, watch the full trace, and get the answer.
 """
 
 # ───────────────────────── standard library ─────────────────────────
 import json
 import textwrap
+import threading
+import time
 
-from typing import Dict
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
 import requests                           # simple HTTP client
 
@@ -34,6 +43,12 @@ import requests                           # simple HTTP client
 # local Ollama server like any other LangChain LLM.
 from langchain_ollama import ChatOllama
 
+# ───────────────────────── local helpers ────────────────────────────
+from tools.fast_planner import FastPlanner, Plan  # rule-based planning
+from tools.gazetteer import Gazetteer       # offline place → coordinates
+from tools.llm_cache import LLMCache        # persistent LLM reply cache
+from tools.speculation import ThreadSpeculator, weather_key  # prefetch
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # ║ 1.  Static lookup: WMO weather-code → friendly description       ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -57,13 +72,81 @@ WEATHER_CODES: Dict[int, str] = {
 # ╔══════════════════════════════════════════════════════════════════╗
 # ║ 2.  “Tool” functions (simple Python, no server needed)           ║
 # ╚══════════════════════════════════════════════════════════════════╝
+GRID_DEG   = 0.1         # cache cell size in degrees (≈ 11 km)
+CACHE_TTL  = 600         # seconds a cell's forecast is reused
+CACHE_SIZE = 256         # max cells kept (least recently used evicted)
+
+
+class WeatherCache:
+    """
+    LRU + TTL cache keyed by grid cell, with hit/miss counters.  Calls
+    for a cell that is already being fetched wait for that fetch
+    instead of issuing their own request.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL, max_size: int = CACHE_SIZE):
+        self.ttl      = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[Tuple[int, int], Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, int], threading.Event] = {}
+        self._lock    = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get_or_fetch(self, cell: Tuple[int, int], fetch: Callable[[], dict]) -> dict:
+        while True:
+            with self._lock:
+                entry = self._data.get(cell)
+                if entry and entry[0] > time.monotonic():
+                    self._data.move_to_end(cell)
+                    self.hits += 1
+                    return entry[1]
+                waiter = self._inflight.get(cell)
+                if waiter is None:
+                    self.misses += 1
+                    done = self._inflight[cell] = threading.Event()
+                    break
+            waiter.wait()                      # someone else is fetching
+
+        try:
+            value = fetch()
+            with self._lock:
+                self._data[cell] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(cell)
+                while len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(cell, None)
+            done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._data)}
+
+
+weather_cache = WeatherCache()
+
+
 def get_weather(lat: float, lon: float) -> dict:
     """
     Query the **daily** endpoint of Open-Meteo and return *today’s*
     max / min temperature and the weather-code description.
 
+    Forecasts are cached per `GRID_DEG` grid cell for `CACHE_TTL`
+    seconds, so repeated questions about the same place skip the API.
+
     Returned dict always has the same keys so the LLM can rely on them.
     """
+    cell = (round(lat / GRID_DEG), round(lon / GRID_DEG))
+    return dict(weather_cache.get_or_fetch(cell, lambda: _fetch_weather(*cell)))
+
+
+def _fetch_weather(lat_idx: int, lon_idx: int) -> dict:
+    """Upstream Open-Meteo call for the centre of one grid cell."""
+    lat = round(lat_idx * GRID_DEG, 4)
+    lon = round(lon_idx * GRID_DEG, 4)
     url = (
         "https://api.open-meteo.com/v1/forecast"
         f"?latitude={lat}&longitude={lon}"
@@ -92,6 +175,32 @@ def convert_c_to_f(c: float) -> float:
 # to 0.0 for deterministic planning.
 llm = ChatOllama(model="llama3.2", temperature=0.0)
 
+# Replies are cached on disk.  Planning step 1 (place → coordinates)
+# does not depend on the weather, so it is kept for a month; step 2
+# sees the observation, so it lives only as long as the forecast.
+PLAN_TTL  = 30 * 24 * 3600
+llm_cache = LLMCache(llm, ttl=CACHE_TTL)
+
+# Planning replies are printed token by token as Ollama generates them;
+# time-to-first-token of each streamed step is kept in `ttft_ms`.
+STREAM  = True
+ttft_ms: List[float] = []
+
+# Prompts that name coordinates or a place in the offline gazetteer are
+# planned by rules, without Llama; everything else falls back to it.
+planner = FastPlanner(Gazetteer.load())
+
+# While Llama plans, the weather at a fuzzy guess of the place is fetched
+# on a worker thread; it is used if the plan lands in the same grid cell.
+prefetcher = ThreadPoolExecutor(max_workers=2)
+spec_stats = Counter()
+
+# Questions about several places ("Paris, London and Tokyo") fetch every
+# forecast at once – at most FANOUT_WORKERS in flight – and ask for one
+# summary instead of one TAO episode per place.
+FANOUT_WORKERS = 8
+fanout_pool    = ThreadPoolExecutor(max_workers=FANOUT_WORKERS)
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # ║ 4.  “System” prompt that defines the tools and the TAO protocol  ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -112,10 +221,54 @@ Args: {"lat":X,"lon":Y}   or   {"c":Z}
 Do NOT output anything else.
 """).strip()
 
+FANOUT_SYSTEM = textwrap.dedent("""
+You are a weather assistant.  You get today's forecast for several places,
+one per line, with temperatures already in °F.  Answer the user's question
+in one short paragraph: compare the places and name the warmest and the
+coldest.  Use only the data given.
+""").strip()
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # ║ 5.  Helper that runs a single TAO episode and prints the trace   ║
 # ╚══════════════════════════════════════════════════════════════════╝
-def run(question: str) -> str:
+def plan_args(plan: str) -> dict:
+    """JSON arguments of a plan's "Args:" line; ValueError if it has none."""
+    try:
+        return json.loads(plan.split("Args:")[1].strip())
+    except (IndexError, json.JSONDecodeError) as err:
+        raise ValueError(f"No usable 'Args:' line in plan: {plan!r}") from err
+
+
+def is_weather_plan(plan: str) -> bool:
+    """True if the plan parses and gives both coordinates."""
+    args = plan_args(plan)
+    return isinstance(args, dict) and {"lat", "lon"} <= set(args)
+
+
+def ask_llm(messages: List[dict], ttl: float, stream: bool = STREAM,
+            validate: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    One planning step: print the LLM's reply – streamed as it is
+    generated, or all at once – and return its stripped text.  The
+    reply is only cached if `validate` (optional) accepts it.
+    """
+    if not stream:
+        text = llm_cache.invoke(messages, ttl=ttl, validate=validate).content.strip()
+        print(text + "\n")
+        return text
+
+    started = time.perf_counter()
+    parts: List[str] = []
+    for piece in llm_cache.stream(messages, ttl=ttl, validate=validate):
+        if not parts:
+            ttft_ms.append((time.perf_counter() - started) * 1000)
+        parts.append(piece)
+        print(piece, end="", flush=True)
+    print(f"\n(first token after {ttft_ms[-1]:.0f} ms)\n" if parts else "\n")
+    return "".join(parts).strip()
+
+
+def run(question: str, stream: bool = STREAM) -> str:
     """
     Execute *one* two-step TAO loop:
 
@@ -124,6 +277,11 @@ def run(question: str) -> str:
            call convert_c_to_f() for both temps.
         3. Print the entire trace (Thought / Action / Observation) and
            return the final sentence so the caller could display it.
+
+    If `planner` resolves the question on its own, both steps are
+    planned by rules and the LLM is not called at all; otherwise the
+    weather at its best guess is prefetched while the LLM plans.  The LLM's
+    replies stream to the terminal unless `stream=False`.
     """
     # Initial conversation history
     messages = [
@@ -133,16 +291,26 @@ def run(question: str) -> str:
 
     print("\n--- Thought → Action → Observation → Final ---\n")
 
-    # ── First planning step: choose coordinates ────────────────────
-    reply1 = llm.invoke(messages)
-    plan1  = reply1.content.strip()
-    print(plan1 + "\n")
-
-    # Extract JSON args from the “Args: …” line
-    coords = json.loads(plan1.split("Args:")[1].strip())
-
-    # Call the first tool and show observation
-    obs1 = get_weather(**coords)
+    with ThreadSpeculator(prefetcher, spec_stats) as spec:
+        # ── First planning step: choose coordinates ────────────────
+        fast = planner.plan(question)
+        if fast is not None:
+            plan1 = fast.text
+            print(f"{plan1}\n(planned by rule: {fast.source})\n")
+        else:
+            planner.fallback()
+            guess = planner.guess(question)
+            if guess is not None:              # prefetch while Llama plans
+                spec.start(weather_key(*guess), get_weather, *guess)
+            # cached for PLAN_TTL, so only once it parses
+            plan1 = ask_llm(messages, PLAN_TTL, stream, validate=is_weather_plan)
+
+        # Extract JSON args from the “Args: …” line
+        coords = plan_args(plan1)
+
+        # Call the first tool (or take the prefetch) and show observation
+        lat, lon = coords["lat"], coords["lon"]
+        obs1 = spec.get(weather_key(lat, lon), get_weather, lat, lon)
     print(f"Observation: {obs1}\n")
 
     # ── Second planning step: decide whether to convert units ──────
@@ -150,9 +318,13 @@ def run(question: str) -> str:
         {"role": "assistant", "content": plan1},          # what the LLM “said”
         {"role": "user",      "content": f"Observation: {obs1}"},
     ]
-    reply2 = llm.invoke(messages)
-    plan2  = reply2.content.strip()
-    print(plan2 + "\n")
+    if fast is not None:
+        plan2 = ("Thought: The temperatures are in °C; convert them to °F.\n"
+                 "Action: convert_c_to_f\n"
+                 f"Args: {json.dumps({'c': obs1['high']})}")
+        print(plan2 + "\n")
+    else:
+        plan2 = ask_llm(messages, CACHE_TTL, stream)
 
     # In this toy protocol the second tool call is always °C→°F
     high_f = convert_c_to_f(obs1["high"])
@@ -168,6 +340,42 @@ def run(question: str) -> str:
     print(f"Final: {final}\n")
     return final
 
+
+def run_many(question: str, plans: List[Plan], stream: bool = STREAM) -> str:
+    """
+    Fan-out episode for a question about several places: every
+    `get_weather` call runs concurrently on `fanout_pool`, then the LLM
+    writes *one* comparison of all the observations.  Latency is the
+    slowest lookup plus a single LLM call, not N TAO episodes.
+    """
+    print("\n--- Actions (parallel) → Observations → Final ---\n")
+    for plan in plans:
+        print(plan.text + "\n")
+
+    futures = [fanout_pool.submit(get_weather, plan.args["lat"], plan.args["lon"])
+               for plan in plans]
+    lines = []
+    for plan, future in zip(plans, futures):
+        try:
+            obs = future.result()
+        except Exception as e:                 # one failed place ≠ failed question
+            print(f"Observation ({plan.place}): error {e}")
+            lines.append(f"{plan.place}: forecast unavailable")
+            continue
+        high_f = convert_c_to_f(obs["high"])
+        low_f  = convert_c_to_f(obs["low"])
+        print(f"Observation ({plan.place}): {obs}")
+        lines.append(f"{plan.place}: {obs['conditions']}, "
+                     f"high {high_f:.0f} °F, low {low_f:.0f} °F")
+    print()
+
+    messages = [
+        {"role": "system", "content": FANOUT_SYSTEM},
+        {"role": "user",   "content": f"{question}\n\n" + "\n".join(lines)},
+    ]
+    print("Final: ", end="")
+    return ask_llm(messages, CACHE_TTL, stream)
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # ║ 6.  Simple REPL so you can type locations interactively          ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -176,6 +384,14 @@ if __name__ == "__main__":
     while True:
         loc = input("Location (or 'exit'): ").strip()
         if loc.lower() == "exit":
+            print(f"Weather cache: {weather_cache.stats()}")
+            print(f"LLM cache: {llm_cache.stats()}")
+            print(f"Planner paths: {planner.stats()}")
+            print(f"Weather prefetch: {dict(spec_stats)}")
+            if ttft_ms:
+                print(f"Time to first token: median "
+                      f"{sorted(ttft_ms)[len(ttft_ms) // 2]:.0f} ms "
+                      f"over {len(ttft_ms)} steps")
             print("Goodbye!")
             break
 
@@ -186,6 +402,10 @@ if __name__ == "__main__":
         )
 
         try:
-            run(query)              # full TAO trace is printed inside run()
+            plans = planner.plan_many(query)
+            if plans:
+                run_many(query, plans)  # several places: one fan-out episode
+            else:
+                run(query)              # full TAO trace is printed inside run()
         except Exception as e:
             print(f"⚠️  Error: {e}\n")
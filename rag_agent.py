@@ -12,37 +12,71 @@ Pipeline
 
        "Paris Office 88 Champs-Élysées, Paris, France …"
 
+   Hybrid by default: a BM25 index (`tools/bm25_index.py`) catches
+   exact tokens (office names, street numbers) that embeddings blur,
+   and its ranking is fused with the vector one.  A confident exact
+   match skips the embedding model entirely.
+
+   `VECTOR_BACKEND=local` swaps Chroma for the memory-mapped float16
+   export in `tools/local_index.py` (exact or IVF search, read-only).
+
 2. **Information extraction**  
-   • Prefer explicit   latitude/longitude in the text.  
+   • Office-row hits carry structured metadata (office, city, country,
+     lat/lon) parsed once by `tools/index_pdf.py`; use it directly.  
+   • Else prefer explicit latitude/longitude in the text.  
    • Else pull a city name (“City, ST”, “City, Country”, or fallback).  
-   • If we have a city but no coords, use Open-Meteo’s geocoding API.
+   • If we have a city but no coords, look it up in the offline
+     gazetteer (`tools/gazetteer.py`, built by `tools/build_gazetteer.py`),
+     falling back to Open-Meteo’s geocoding API (async, pooled and
+     cached – see `tools/geocoding.py`).
 
 3. **Tool calls over FastMCP**  
-   • `get_weather(lat, lon)` → °C + conditions.  
-   • `convert_c_to_f(c)`     → °F.
+   • `get_weather(lat, lon)` → °C *and* °F + conditions, in one call.  
+   • `convert_c_to_f(c)`     → °F, only for servers that return °C alone.
 
 4. **Final answer** printed to stdout.
 
+Steps 2–3 do not wait for step 1 when the prompt itself names a place:
+its geocode and weather are fetched speculatively while retrieval runs
+(`tools/speculation.py`) and used if step 2 lands in the same weather
+grid cell; otherwise they are cancelled.
+
+The model, collection and MCP session live in one `RagAgent` that the
+REPL keeps open for the whole session (no per-prompt start-up cost).
+`RagAgent.run()` returns a JSON-friendly dict, which is what
+`rag_service.py` serves over HTTP.
+
 Dependencies
 ------------
-    pip install sentence-transformers chromadb fastmcp requests tiktoken
+    pip install sentence-transformers chromadb fastmcp httpx tiktoken
 """
 
 # ────────────────────────── standard libs ───────────────────────────
 import asyncio
 import json
+import os
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # ────────────────────────── third-party libs ────────────────────────
-import requests
 import chromadb
 from chromadb.config import Settings, DEFAULT_TENANT, DEFAULT_DATABASE
 from sentence_transformers import SentenceTransformer
 from fastmcp import Client
 from fastmcp.exceptions import ToolError
 
+# ────────────────────────── local helpers ───────────────────────────
+from tools.bm25_index import BM25_DIR, BM25Index, rrf_fuse  # lexical index
+from tools.embed_cache import EmbeddingCache     # query-vector LRU + disk
+from tools.fast_planner import place_phrases    # place named in a prompt
+from tools.gazetteer import Gazetteer            # offline place index
+from tools.local_index import LOCAL_DIR, LocalCollection  # mmap'd export
+from tools.geocoding import AsyncGeocoder        # async, cached, pooled
+from tools.speculation import Speculator, weather_key  # prefetch on a guess
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # 1.  Config / constants                                             ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -51,6 +85,12 @@ COLLECTION_NAME  = "codebase"                   # collection inside Chroma
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"           # SBERT model for queries
 MCP_ENDPOINT     = "http://127.0.0.1:8000/mcp/" # FastMCP server
 TOP_K            = 5                            # RAG: retrieve top-5 chunks
+SEARCH_MODE      = "hybrid"                     # "hybrid" (BM25 + vector) or "vector"
+CANDIDATES       = 20                           # per ranking, before fusion
+EXECUTOR_WORKERS = 8                            # threads for blocking work
+EMBED_CACHE_DIR  = CHROMA_PATH / "embed_cache"  # persistent query vectors
+VECTOR_BACKEND   = os.environ.get("VECTOR_BACKEND", "chroma")  # or "local"
+LOCAL_MODE       = os.environ.get("LOCAL_MODE", "auto")  # "exact", "ivf", "auto"
 
 # Regex patterns for lat/lon and various city formats
 COORD_RE        = re.compile(r"\b(-?\d{1,2}(?:\.\d+)?)[,\s]+(-?\d{1,3}(?:\.\d+)?)\b")
@@ -60,11 +100,25 @@ CITY_RE         = re.compile(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+)*)\b")
 
 STOPWORDS = {"office", "hq", "center", "centre"}  # ignore tokens like “HQ”
 
+# Structured fields `tools/index_pdf.py` stores on office-row hits
+OFFICE_FIELDS = ("office", "city", "region", "country", "employees",
+                 "revenue_usd", "services")
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # 2.  Vector search helpers                                          ║
 # ╚══════════════════════════════════════════════════════════════════╝
-def open_collection() -> chromadb.Collection:
-    """Return (or create) the Chroma collection."""
+def open_collection(backend: str = VECTOR_BACKEND) -> chromadb.Collection:
+    """
+    Return (or create) the Chroma collection – or, with backend "local",
+    the read-only memory-mapped export of it (`tools/local_index.py`),
+    which answers the same `query()` / `get()` calls.
+    """
+    if backend == "local":
+        local = LocalCollection.load(CHROMA_PATH / LOCAL_DIR, LOCAL_MODE)
+        if local is None:
+            raise FileNotFoundError(f"{CHROMA_PATH / LOCAL_DIR}: no local index; "
+                                    "run tools/local_index.py first.")
+        return local
     client = chromadb.PersistentClient(
         path=str(CHROMA_PATH),
         settings=Settings(),
@@ -74,24 +128,71 @@ def open_collection() -> chromadb.Collection:
     return client.get_or_create_collection(COLLECTION_NAME)
 
 
+def fetch_chunks(coll: chromadb.Collection,
+                 ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """`id → (text, metadata)` for chunk IDs; IDs no longer in Chroma are skipped."""
+    if not ids:
+        return {}
+    res   = coll.get(ids=ids, include=["documents", "metadatas"])
+    metas = res.get("metadatas") or [None] * len(res["ids"])
+    return {cid: (doc, meta or {})
+            for cid, doc, meta in zip(res["ids"], res["documents"], metas)}
+
+
 def rag_search(query: str,
-               model: SentenceTransformer,
-               coll: chromadb.Collection) -> List[str]:
+               embedder: EmbeddingCache,
+               coll: chromadb.Collection,
+               lexical: Optional[BM25Index] = None,
+               mode: str = SEARCH_MODE) -> List[Tuple[str, Dict[str, Any]]]:
     """
-    Embed the *query*, search the vector DB, and return the text of the
-    top-k chunks (empty list if collection is empty).
+    Return `(text, metadata)` of the top-k chunks for *query* (empty list
+    if the collection is empty).
+
+    * "vector" – embed the query (cached – repeat phrasings skip the
+      model) and search the vector DB.
+    * "hybrid" – also rank with the BM25 index and merge both rankings
+      with reciprocal rank fusion.  A confident lexical hit (every query
+      term, clear lead – e.g. an exact office name) is returned without
+      touching the embedding model at all.
+
+    Without a BM25 index, "hybrid" is plain vector search.
     """
-    q_emb = model.encode(query).tolist()
+    lex_hits = lexical.search(query, CANDIDATES) \
+        if lexical is not None and mode == "hybrid" else []
+    if lex_hits and lexical.confident(query, lex_hits):
+        ids    = [h.id for h in lex_hits[:TOP_K]]
+        chunks = fetch_chunks(coll, ids)
+        if ids[0] in chunks:                       # else the index is stale
+            return [chunks[cid] for cid in ids if cid in chunks]
+
+    q_emb = embedder.encode(query).tolist()
     res = coll.query(
         query_embeddings=[q_emb],
-        n_results=TOP_K,
-        include=["documents"],
+        n_results=CANDIDATES if lex_hits else TOP_K,
+        include=["documents", "metadatas"],
     )
-    return res["documents"][0] if res["documents"] else []
+    ids   = res["ids"][0] if res["ids"] else []
+    docs  = res["documents"][0] if res["documents"] else []
+    metas = res["metadatas"][0] if res.get("metadatas") else []
+    chunks = {cid: (doc, (metas[i] if i < len(metas) else None) or {})
+              for i, (cid, doc) in enumerate(zip(ids, docs))}
+    if not lex_hits:
+        return [chunks[cid] for cid in ids[:TOP_K]]
+
+    fused = rrf_fuse([ids, [h.id for h in lex_hits]])[:TOP_K]
+    chunks.update(fetch_chunks(coll, [cid for cid in fused if cid not in chunks]))
+    return [chunks[cid] for cid in fused if cid in chunks]
 
 # ╔══════════════════════════════════════════════════════════════════╗
 # 3.  Information-extraction helpers                                 ║
 # ╚══════════════════════════════════════════════════════════════════╝
+def office_coords(meta: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Coordinates stored on an office row at index time, if any."""
+    if "lat" in meta and "lon" in meta:
+        return float(meta["lat"]), float(meta["lon"])
+    return None
+
+
 def find_coords(texts: List[str]) -> Optional[Tuple[float, float]]:
     """First valid lat/lon in the supplied texts, else None."""
     for txt in texts:
@@ -129,33 +230,6 @@ def guess_city(texts: List[str]) -> Optional[str]:
                 return token
     return None
 
-
-def geocode(name: str) -> Optional[Tuple[float, float]]:
-    """
-    Ask Open-Meteo’s geocoding API for coords.
-    If “City, XX” fails, retry with just “City”.
-    """
-    url = "https://geocoding-api.open-meteo.com/v1/search"
-
-    def _lookup(n: str):
-        try:
-            r = requests.get(url, params={"name": n, "count": 1}, timeout=10)
-            r.raise_for_status()
-            data = r.json()
-            if data.get("results"):
-                hit = data["results"][0]
-                return hit["latitude"], hit["longitude"]
-        except Exception:
-            pass
-        return None
-
-    coords = _lookup(name)
-    if coords:
-        return coords
-    if "," in name:                              # retry with simpler string
-        return _lookup(name.split(",", 1)[0].strip())
-    return None
-
 # ╔══════════════════════════════════════════════════════════════════╗
 # 4.  unwrap(): CallToolResult → plain Python                        ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -177,80 +251,205 @@ def unwrap(obj):
     return obj
 
 # ╔══════════════════════════════════════════════════════════════════╗
-# 5.  Main workflow (async)                                          ║
+# 5.  Agent runtime: heavy resources loaded once, reused per prompt  ║
 # ╚══════════════════════════════════════════════════════════════════╝
-async def run(prompt: str) -> None:
+class RagAgent:
     """
-    0. User prompt ➜ vector search ➜ possible office chunk.
-    1. Extract coordinates *or* city name.
-    2. If only a city, geocode to lat/lon.
-    3. Call MCP tools: get_weather → convert_c_to_f.
-    4. Print final weather.
+    Long-lived agent that owns the SentenceTransformer, the Chroma
+    collection and an open MCP `Client` session for its whole lifetime,
+    so each prompt only pays for the actual search + tool calls.
+
+        async with RagAgent() as agent:
+            await agent.run("Tell me about HQ")
     """
-    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
-    coll        = open_collection()
-
-    # Vector search
-    rag_hits = rag_search(prompt, embed_model, coll)
-    top_hit  = rag_hits[0] if rag_hits else ""
-    if top_hit:
-        print("\nTop RAG hit:\n", top_hit, "\n")
-
-    # — step 1: direct coordinates? —
-    coords = find_coords([top_hit, prompt])
-
-    # — step 2: if no coords, derive city then geocode —
-    if not coords:
-        city_str = (
-            find_city_state([top_hit, prompt])
-            or find_city_country([top_hit, prompt])
-            or guess_city([top_hit, prompt])
-        )
-        if city_str:
-            print(f"No coords found; geocoding '{city_str}'.")
-            coords = geocode(city_str)
-
-    if not coords:
-        print("Could not determine latitude/longitude.\n")
-        return
-
-    lat, lon = coords
-    print(f"Using coordinates: {lat:.4f}, {lon:.4f}\n")
-
-    # — step 3: call MCP tools —
-    async with Client(MCP_ENDPOINT) as mcp:
+
+    def __init__(self, mcp_endpoint: str = MCP_ENDPOINT, verbose: bool = True):
+        self.verbose     = verbose
+        self.executor    = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+        self.embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+        self.embed_cache = EmbeddingCache(self.embed_model, EMBED_MODEL_NAME,
+                                          disk_dir=EMBED_CACHE_DIR)
+        self.coll        = open_collection()
+        self.lexical     = BM25Index.load(CHROMA_PATH / BM25_DIR)  # None → vector only
+        self.geocoder    = AsyncGeocoder(local=Gazetteer.load())
+        self.mcp         = Client(mcp_endpoint)
+        self.spec_stats  = Counter()            # speculative steps
+
+    async def __aenter__(self) -> "RagAgent":
+        await self.mcp.__aenter__()            # open the MCP session once
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.mcp.__aexit__(*exc)
+        await self.geocoder.aclose()
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the agent's caches and speculative steps."""
+        return {"embed_cache": self.embed_cache.stats(),
+                "geocoder":    dict(self.geocoder.stats),
+                "speculation": dict(self.spec_stats)}
+
+    def _log(self, *args) -> None:
+        """Print the step-by-step trace (REPL) or stay quiet (service)."""
+        if self.verbose:
+            print(*args)
+
+    async def _offload(self, fn: Callable, *args) -> Any:
+        """
+        Run a blocking / CPU-bound call (SBERT encode, Chroma query)
+        on the agent's thread pool so the event loop keeps
+        serving other prompts meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def run(self, prompt: str) -> Dict[str, Any]:
+        """
+        Answer one prompt (see `_pipeline` for the steps).  A location
+        guessed from the prompt is geocoded and its weather fetched while
+        retrieval runs; guesses the pipeline ends up not using are
+        cancelled before this returns.
+
+        Returns a JSON-friendly dict; `error` is set if a step failed.
+        """
+        async with Speculator(self.spec_stats) as spec:
+            spec.spawn(self._speculate(prompt, spec))
+            return await self._pipeline(prompt, spec)
+
+    async def _speculate(self, prompt: str, spec: Speculator) -> None:
+        """
+        Guess the location from the prompt alone – coordinates, or the
+        first place it names – and, while retrieval is still running,
+        geocode it and prefetch its weather.
+        """
+        coords = find_coords([prompt])
+        if coords is None:
+            names = [name for _, name in place_phrases(prompt)]
+            if not names:
+                return
+            key = ("geocode", names[0])
+            spec.start(key, self.geocoder.geocode(names[0]))
+            coords = await spec.peek(key)
+            if coords is None:
+                return
+        lat, lon = coords
+        spec.start(weather_key(lat, lon),
+                   self.mcp.call_tool("get_weather", {"lat": lat, "lon": lon}))
+
+    async def _pipeline(self, prompt: str, spec: Speculator) -> Dict[str, Any]:
+        """
+        0. User prompt ➜ vector search ➜ possible office chunk.
+        1. Take coordinates from the hit's office metadata (set at index
+           time); else extract coordinates *or* city name from the text.
+        2. If only a city, geocode to lat/lon.
+        3. Call MCP get_weather (returns °C and °F; convert_c_to_f is
+           only called for servers that predate that).
+        4. Print final weather.
+
+        Returns a JSON-friendly dict; `error` is set if a step failed.
+        """
+        result: Dict[str, Any] = {"prompt": prompt, "top_hit": None,
+                                  "office": None, "coords": None,
+                                  "weather": None, "error": None}
+
+        # Retrieval (hybrid BM25 + vector); `_speculate` runs meanwhile
+        rag_hits = await self._offload(rag_search, prompt,
+                                       self.embed_cache, self.coll, self.lexical)
+        top_hit, top_meta = rag_hits[0] if rag_hits else ("", {})
+        if top_hit:
+            self._log("\nTop RAG hit:\n", top_hit, "\n")
+            result["top_hit"] = top_hit
+        if top_meta.get("office"):
+            result["office"] = {k: top_meta[k] for k in OFFICE_FIELDS if k in top_meta}
+
+        # — step 1: coordinates from the index, or written in the text? —
+        coords = office_coords(top_meta)
+        if coords:
+            self._log(f"Indexed location of {top_meta['office']}.")
+        else:
+            coords = find_coords([top_hit, prompt])
+
+        # — step 2: if no coords, derive city then geocode —
+        if not coords:
+            city_str = (
+                find_city_state([top_hit, prompt])
+                or find_city_country([top_hit, prompt])
+                or guess_city([top_hit, prompt])
+            )
+            if city_str:
+                self._log(f"No coords found; geocoding '{city_str}'.")
+                coords = await spec.get(("geocode", city_str),
+                                        lambda: self.geocoder.geocode(city_str))
+
+        if not coords:
+            self._log("Could not determine latitude/longitude.\n")
+            result["error"] = "Could not determine latitude/longitude."
+            return result
+
+        lat, lon = coords
+        result["coords"] = {"lat": lat, "lon": lon}
+        self._log(f"Using coordinates: {lat:.4f}, {lon:.4f}\n")
+
+        # — step 3: call MCP tools over the already-open session —
         try:
-            w_raw = await mcp.call_tool("get_weather", {"lat": lat, "lon": lon})
+            w_raw = await spec.get(weather_key(lat, lon), lambda: self.mcp.call_tool(
+                "get_weather", {"lat": lat, "lon": lon}))
         except ToolError as e:
-            print(f"Error calling get_weather: {e}")
-            return
+            self._log(f"Error calling get_weather: {e}")
+            result["error"] = f"get_weather failed: {e}"
+            return result
 
         weather = unwrap(w_raw)
         if not isinstance(weather, dict):
-            print(f"Unexpected get_weather result: {weather}")
-            return
+            self._log(f"Unexpected get_weather result: {weather}")
+            result["error"] = f"Unexpected get_weather result: {weather}"
+            return result
 
-        temp_c = weather.get("temperature")
+        temp_c = weather.get("temperature_c", weather.get("temperature"))
+        temp_f = weather.get("temperature_f")
         cond   = weather.get("conditions", "Unknown")
 
-        try:
-            tf_raw = await mcp.call_tool("convert_c_to_f", {"c": temp_c})
-            temp_f = float(unwrap(tf_raw))
-        except (ToolError, ValueError) as e:
-            print(f"Temperature conversion failed: {e}")
-            return
+        if temp_f is None:                     # older server: °C only
+            try:
+                tf_raw = await self.mcp.call_tool("convert_c_to_f", {"c": temp_c})
+                temp_f = float(unwrap(tf_raw))
+            except (ToolError, ValueError) as e:
+                self._log(f"Temperature conversion failed: {e}")
+                result["error"] = f"Temperature conversion failed: {e}"
+                return result
+
+        result["weather"] = {"conditions": cond, "temperature_c": temp_c,
+                             "temperature_f": temp_f}
+
+        # — step 4: print result —
+        self._log(f"Weather: {cond}, {temp_f:.1f} °F\n")
+        return result
+
 
-    # — step 4: print result —
-    print(f"Weather: {cond}, {temp_f:.1f} °F\n")
+async def run(prompt: str) -> Dict[str, Any]:
+    """One-shot helper: start an agent, answer a single prompt, shut down."""
+    async with RagAgent() as agent:
+        return await agent.run(prompt)
 
 # ╔══════════════════════════════════════════════════════════════════╗
 # 6.  Command-line REPL                                              ║
 # ╚══════════════════════════════════════════════════════════════════╝
+async def repl() -> None:
+    """
+    One event loop and one `RagAgent` for the whole session; `input()`
+    runs in a worker thread so the MCP session stays serviced.
+    """
+    async with RagAgent() as agent:
+        while True:
+            prompt = (await asyncio.to_thread(input, "Prompt: ")).strip()
+            if prompt.lower() == "exit":
+                print(f"Cache stats: {agent.stats()}")
+                break
+            if prompt:
+                await agent.run(prompt)
+
+
 if __name__ == "__main__":
     print("Office-aware weather agent. Type 'exit' to quit.\n")
-    while True:
-        prompt = input("Prompt: ").strip()
-        if prompt.lower() == "exit":
-            break
-        if prompt:
-            asyncio.run(run(prompt))
+    asyncio.run(repl())
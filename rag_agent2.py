@@ -10,6 +10,31 @@
 #       • ONE interesting fact about the city
 # • Works even if the indexed PDF line is messy; we hand the *raw* top-hit
 #   line plus structured weather data to the LLM and let it compose.
+# • The embedding model, Chroma collection, ChatOllama client and MCP
+#   session live in one `RagAgent`, created once per REPL session.
+# • `RagAgent.run()` returns a JSON-friendly dict; `rag_service.py` serves
+#   it over HTTP to many concurrent callers.
+# • City names resolve from the offline gazetteer (`tools/gazetteer.py`)
+#   when it has been built; the online geocoder is only the fallback.
+# • Retrieval is hybrid: BM25 (`tools/bm25_index.py`) + vector ranks are
+#   fused, and a confident exact match (e.g. an office name) skips the
+#   embedding model.
+# • `RagAgent.stream()` yields the summary token by token (the REPL prints
+#   it as it is generated; `rag_service.py` serves it as SSE) and records
+#   time-to-first-token.
+# • Summaries are cached (`tools/llm_cache.py`): the same office, weather
+#   and whole-degree °F within 10 minutes reuse the earlier reply, and
+#   rephrased prompts with identical numbers can hit semantically.
+# • `VECTOR_BACKEND=local` searches the memory-mapped float16 export
+#   (`tools/local_index.py`) instead of Chroma – same results, instant start.
+# • While retrieval runs, a place named in the prompt is geocoded and its
+#   weather fetched speculatively (`tools/speculation.py`); the pipeline
+#   uses the prefetch if it lands in the same grid cell, else cancels it.
+# • Fan-out: prompts about several places ("compare the weather in all our
+#   European offices", "Paris, London and Tokyo") take every office among
+#   the top FANOUT_K hits (or every place named), fetch all the weather in
+#   one `get_weather_many` call and write ONE summary; `result["locations"]`
+#   lists each place.
 #
 # Prerequisites (additions)
 #   pip install langchain-ollama
@@ -31,12 +56,15 @@
 # ────────────────────────── standard libs ───────────────────────────
 import asyncio
 import json
+import os
 import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 # ────────────────────────── third-party libs ────────────────────────
-import requests
 import chromadb
 from chromadb.config import Settings, DEFAULT_TENANT, DEFAULT_DATABASE
 from sentence_transformers import SentenceTransformer
@@ -44,6 +72,17 @@ from fastmcp import Client
 from fastmcp.exceptions import ToolError
 from langchain_ollama import ChatOllama          # NEW: local Llama 3.2
 
+# ────────────────────────── local helpers ───────────────────────────
+from tools.bm25_index import BM25_DIR, BM25Index, rrf_fuse  # lexical index
+from tools.embed_cache import EmbeddingCache     # query-vector LRU + disk
+from tools.fast_planner import FastPlanner, Plan, place_phrases, wants_fanout
+from tools.gazetteer import Gazetteer            # offline place index
+from tools.llm_cache import LLMCache             # exact + semantic replies
+from tools.local_index import LOCAL_DIR, LocalCollection  # mmap'd export
+from tools.geocoding import AsyncGeocoder        # async, cached, pooled
+from tools.offices import place_name             # "City, Region" of a row
+from tools.speculation import Speculator, bounded_gather, weather_key
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # 1.  Config / constants                                             ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -52,6 +91,18 @@ COLLECTION_NAME  = "codebase"                   # collection inside Chroma
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"           # SBERT model for queries
 MCP_ENDPOINT     = "http://127.0.0.1:8000/mcp/" # FastMCP server
 TOP_K            = 5                            # RAG: retrieve top-5 chunks
+SEARCH_MODE      = "hybrid"                     # "hybrid" (BM25 + vector) or "vector"
+CANDIDATES       = 20                           # per ranking, before fusion
+EXECUTOR_WORKERS = 8                            # threads for blocking work
+EMBED_CACHE_DIR  = CHROMA_PATH / "embed_cache"  # persistent query vectors
+VECTOR_BACKEND   = os.environ.get("VECTOR_BACKEND", "chroma")  # or "local"
+LOCAL_MODE       = os.environ.get("LOCAL_MODE", "auto")  # "exact", "ivf", "auto"
+LLM_CACHE_PATH   = CHROMA_PATH / "llm_cache.sqlite"  # cached summaries
+LLM_CACHE_TTL    = 600                          # s – same as the weather cache
+LLM_SIMILARITY   = 0.97                         # semantic tier: min cosine
+TTFT_WINDOW      = 1000                         # recent time-to-first-token samples
+FANOUT_K         = 10                           # RAG hits scanned for offices (fan-out)
+FANOUT_LIMIT     = 8                            # concurrent lookups (fan-out)
 
 # Regex patterns for lat/lon and various city formats
 COORD_RE        = re.compile(r"\b(-?\d{1,2}(?:\.\d+)?)[,\s]+(-?\d{1,3}(?:\.\d+)?)\b")
@@ -60,11 +111,25 @@ CITY_COUNTRY_RE = re.compile(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+)*),\s*([A-Z][a-z]{2
 CITY_RE         = re.compile(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+)*)\b")
 STOPWORDS = {"office", "hq", "center", "centre"}  # ignore tokens like “HQ”
 
+# Structured fields `tools/index_pdf.py` stores on office-row hits
+OFFICE_FIELDS = ("office", "city", "region", "country", "employees",
+                 "revenue_usd", "services")
+
 # ╔══════════════════════════════════════════════════════════════════╗
 # 2.  Vector search helpers                                          ║
 # ╚══════════════════════════════════════════════════════════════════╝
-def open_collection() -> chromadb.Collection:
-    """Return (or create) the Chroma collection."""
+def open_collection(backend: str = VECTOR_BACKEND) -> chromadb.Collection:
+    """
+    Return (or create) the Chroma collection – or, with backend "local",
+    the read-only memory-mapped export of it (`tools/local_index.py`),
+    which answers the same `query()` / `get()` calls.
+    """
+    if backend == "local":
+        local = LocalCollection.load(CHROMA_PATH / LOCAL_DIR, LOCAL_MODE)
+        if local is None:
+            raise FileNotFoundError(f"{CHROMA_PATH / LOCAL_DIR}: no local index; "
+                                    "run tools/local_index.py first.")
+        return local
     client = chromadb.PersistentClient(
         path=str(CHROMA_PATH),
         settings=Settings(),
@@ -73,24 +138,72 @@ def open_collection() -> chromadb.Collection:
     )
     return client.get_or_create_collection(COLLECTION_NAME)
 
+def fetch_chunks(coll: chromadb.Collection,
+                 ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """`id → (text, metadata)` for chunk IDs; IDs no longer in Chroma are skipped."""
+    if not ids:
+        return {}
+    res   = coll.get(ids=ids, include=["documents", "metadatas"])
+    metas = res.get("metadatas") or [None] * len(res["ids"])
+    return {cid: (doc, meta or {})
+            for cid, doc, meta in zip(res["ids"], res["documents"], metas)}
+
+
 def rag_search(query: str,
-               model: SentenceTransformer,
-               coll: chromadb.Collection) -> List[str]:
+               embedder: EmbeddingCache,
+               coll: chromadb.Collection,
+               lexical: Optional[BM25Index] = None,
+               mode: str = SEARCH_MODE,
+               top_k: int = TOP_K) -> List[Tuple[str, Dict[str, Any]]]:
     """
-    Embed the *query*, search the vector DB, and return the text of the
-    top-k chunks (empty list if collection is empty).
+    Return `(text, metadata)` of the `top_k` chunks for *query* (empty
+    list if the collection is empty).
+
+    * "vector" – embed the query (cached – repeat phrasings skip the
+      model) and search the vector DB.
+    * "hybrid" – also rank with the BM25 index and merge both rankings
+      with reciprocal rank fusion.  A confident lexical hit (every query
+      term, clear lead – e.g. an exact office name) is returned without
+      touching the embedding model at all.
+
+    Without a BM25 index, "hybrid" is plain vector search.
     """
-    q_emb = model.encode(query).tolist()
+    lex_hits = lexical.search(query, CANDIDATES) \
+        if lexical is not None and mode == "hybrid" else []
+    if lex_hits and lexical.confident(query, lex_hits):
+        ids    = [h.id for h in lex_hits[:top_k]]
+        chunks = fetch_chunks(coll, ids)
+        if ids[0] in chunks:                       # else the index is stale
+            return [chunks[cid] for cid in ids if cid in chunks]
+
+    q_emb = embedder.encode(query).tolist()
     res = coll.query(
         query_embeddings=[q_emb],
-        n_results=TOP_K,
-        include=["documents"],
+        n_results=max(CANDIDATES, top_k) if lex_hits else top_k,
+        include=["documents", "metadatas"],
     )
-    return res["documents"][0] if res["documents"] else []
+    ids   = res["ids"][0] if res["ids"] else []
+    docs  = res["documents"][0] if res["documents"] else []
+    metas = res["metadatas"][0] if res.get("metadatas") else []
+    chunks = {cid: (doc, (metas[i] if i < len(metas) else None) or {})
+              for i, (cid, doc) in enumerate(zip(ids, docs))}
+    if not lex_hits:
+        return [chunks[cid] for cid in ids[:top_k]]
+
+    fused = rrf_fuse([ids, [h.id for h in lex_hits]])[:top_k]
+    chunks.update(fetch_chunks(coll, [cid for cid in fused if cid not in chunks]))
+    return [chunks[cid] for cid in fused if cid in chunks]
 
 # ╔══════════════════════════════════════════════════════════════════╗
 # 3.  Information-extraction helpers                                 ║
 # ╚══════════════════════════════════════════════════════════════════╝
+def office_coords(meta: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Coordinates stored on an office row at index time, if any."""
+    if "lat" in meta and "lon" in meta:
+        return float(meta["lat"]), float(meta["lon"])
+    return None
+
+
 def find_coords(texts: List[str]) -> Optional[Tuple[float, float]]:
     """First valid lat/lon in the supplied texts, else None."""
     for txt in texts:
@@ -128,33 +241,6 @@ def guess_city(texts: List[str]) -> Optional[str]:
                 return token
     return None
 
-
-def geocode(name: str) -> Optional[Tuple[float, float]]:
-    """
-    Ask Open-Meteo’s geocoding API for coords.
-    If “City, XX” fails, retry with just “City”.
-    """
-    url = "https://geocoding-api.open-meteo.com/v1/search"
-
-    def _lookup(n: str):
-        try:
-            r = requests.get(url, params={"name": n, "count": 1}, timeout=10)
-            r.raise_for_status()
-            data = r.json()
-            if data.get("results"):
-                hit = data["results"][0]
-                return hit["latitude"], hit["longitude"]
-        except Exception:
-            pass
-        return None
-
-    coords = _lookup(name)
-    if coords:
-        return coords
-    if "," in name:                              # retry with simpler string
-        return _lookup(name.split(",", 1)[0].strip())
-    return None
-
 # ╔══════════════════════════════════════════════════════════════════╗
 # 4.  unwrap(): CallToolResult → plain Python                        ║
 # ╚══════════════════════════════════════════════════════════════════╝
@@ -176,113 +262,437 @@ def unwrap(obj):
     return obj
 
 # ╔══════════════════════════════════════════════════════════════════╗
-# 5.  Main workflow (async)                                          ║
+# 5.  Agent runtime: heavy resources loaded once, reused per prompt  ║
 # ╚══════════════════════════════════════════════════════════════════╝
-async def run(prompt: str) -> None:
-    """
-    0. User prompt ➜ vector search ➜ possible office chunk.
-    1. Extract coordinates *or* city name.
-    2. If only a city, geocode to lat/lon.
-    3. Call MCP tools: get_weather → convert_c_to_f.
-    4. Ask LLM to craft a human summary incl. interesting fact.
-    """
-    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
-    coll        = open_collection()
-
-    # Vector search
-    rag_hits = rag_search(prompt, embed_model, coll)
-    top_hit  = rag_hits[0] if rag_hits else ""
-    if top_hit:
-        print("\nTop RAG hit:\n", top_hit, "\n")
-
-    # — step 1: direct coordinates? —
-    coords = find_coords([top_hit, prompt])
-
-    # — step 2: if no coords, derive city then geocode —
-    if not coords:
-        city_str = (
-            find_city_state([top_hit, prompt])
-            or find_city_country([top_hit, prompt])
-            or guess_city([top_hit, prompt])
-        )
-        if city_str:
-            print(f"No coords found; geocoding '{city_str}'.")
-            coords = geocode(city_str)
+class Summary(NamedTuple):
+    """What `_prepare` asks the LLM to write, plus its cache guard."""
+    messages: List[Dict[str, str]]
+    facts: Dict[str, Any]                       # names/conditions: must match exactly
 
-    if not coords:
-        print("Could not determine latitude/longitude.\n")
-        return
 
-    lat, lon = coords
-    print(f"Using coordinates: {lat:.4f}, {lon:.4f}\n")
+class RagAgent:
+    """
+    Long-lived agent that owns the SentenceTransformer, the Chroma
+    collection, the ChatOllama client and an open MCP `Client` session
+    for its whole lifetime, so each prompt only pays for the actual
+    search, tool calls and summary generation.
+
+        async with RagAgent() as agent:
+            await agent.run("Tell me about HQ")
+    """
 
-    # — step 3: call MCP tools —
-    async with Client(MCP_ENDPOINT) as mcp:
+    def __init__(self, mcp_endpoint: str = MCP_ENDPOINT, verbose: bool = True):
+        self.verbose     = verbose
+        self.executor    = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+        self.embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+        self.embed_cache = EmbeddingCache(self.embed_model, EMBED_MODEL_NAME,
+                                          disk_dir=EMBED_CACHE_DIR)
+        self.coll        = open_collection()
+        self.lexical     = BM25Index.load(CHROMA_PATH / BM25_DIR)  # None → vector only
+        self.llm         = ChatOllama(model="llama3.2", temperature=0.2)
+        self.llm_cache   = LLMCache(self.llm, LLM_CACHE_PATH, ttl=LLM_CACHE_TTL,
+                                    embedder=self.embed_cache,
+                                    similarity=LLM_SIMILARITY)
+        self.geocoder    = AsyncGeocoder(local=Gazetteer.load())
+        self.planner     = FastPlanner(self.geocoder.local)  # place lists
+        self.mcp         = Client(mcp_endpoint)
+        self.spec_stats  = Counter()            # speculative steps
+        self.ttft_ms: "deque[float]" = deque(maxlen=TTFT_WINDOW)
+
+    async def __aenter__(self) -> "RagAgent":
+        await self.mcp.__aenter__()            # open the MCP session once
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.mcp.__aexit__(*exc)
+        await self.geocoder.aclose()
+        self.llm_cache.close()
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the caches and speculation, summary latency."""
+        return {"embed_cache": self.embed_cache.stats(),
+                "geocoder":    dict(self.geocoder.stats),
+                "llm_cache":   self.llm_cache.stats(),
+                "speculation": dict(self.spec_stats),
+                "ttft_ms":     self._ttft_stats()}
+
+    def _ttft_stats(self) -> Dict[str, Any]:
+        """Count, p50 and p95 of recent summary time-to-first-token (ms)."""
+        values = sorted(self.ttft_ms)
+        if not values:
+            return {"count": 0, "p50": None, "p95": None}
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        return {"count": len(values), "p50": pick(0.50), "p95": pick(0.95)}
+
+    def _log(self, *args) -> None:
+        """Print the step-by-step trace (REPL) or stay quiet (service)."""
+        if self.verbose:
+            print(*args)
+
+    async def _offload(self, fn: Callable, *args) -> Any:
+        """
+        Run a blocking / CPU-bound call (SBERT encode, Chroma query)
+        on the agent's thread pool so the event loop keeps
+        serving other prompts meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def _prepare(self, prompt: str) -> Tuple[Dict[str, Any], Optional[Summary]]:
+        """
+        Everything before the summary (see `_pipeline` for the steps).  A
+        location guessed from the prompt is geocoded and its weather
+        fetched while retrieval runs; guesses the pipeline ends up not
+        using are cancelled before the summary starts.
+
+        Prompts about several places ("compare the weather in all our
+        European offices") go to `_prepare_many` instead.
+        """
+        plans = self.planner.plan_many(prompt)  # counted once, here
+        if plans or wants_fanout(prompt):
+            return await self._prepare_many(prompt, plans)
+        async with Speculator(self.spec_stats) as spec:
+            spec.spawn(self._speculate(prompt, spec))
+            return await self._pipeline(prompt, spec)
+
+    async def _speculate(self, prompt: str, spec: Speculator) -> None:
+        """
+        Guess the location from the prompt alone – coordinates, or the
+        first place it names – and, while retrieval is still running,
+        geocode it and prefetch its weather.
+        """
+        coords = find_coords([prompt])
+        if coords is None:
+            names = [name for _, name in place_phrases(prompt)]
+            if not names:
+                return
+            key = ("geocode", names[0])
+            spec.start(key, self.geocoder.geocode(names[0]))
+            coords = await spec.peek(key)
+            if coords is None:
+                return
+        lat, lon = coords
+        spec.start(weather_key(lat, lon),
+                   self.mcp.call_tool("get_weather", {"lat": lat, "lon": lon}))
+
+    async def _pipeline(self, prompt: str,
+                        spec: Speculator) -> Tuple[Dict[str, Any], Optional[Summary]]:
+        """
+        0. User prompt ➜ vector search ➜ possible office chunk.
+        1. Take coordinates from the hit's office metadata (set at index
+           time); else extract coordinates *or* city name from the text.
+        2. If only a city, geocode to lat/lon.
+        3. Call MCP get_weather (returns °C and °F; convert_c_to_f is
+           only called for servers that predate that).
+        4. Build the LLM messages for a human summary incl. interesting fact.
+
+        Returns the JSON-friendly result so far and the `Summary` to
+        request, or `(result, None)` with `error` set if a step failed.
+        """
+        result: Dict[str, Any] = {"prompt": prompt, "top_hit": None,
+                                  "office": None, "coords": None,
+                                  "weather": None, "locations": None,
+                                  "summary": None, "ttft_ms": None,
+                                  "error": None}
+
+        # Retrieval (hybrid BM25 + vector); `_speculate` runs meanwhile
+        rag_hits = await self._offload(rag_search, prompt,
+                                       self.embed_cache, self.coll, self.lexical)
+        top_hit, top_meta = rag_hits[0] if rag_hits else ("", {})
+        if top_hit:
+            self._log("\nTop RAG hit:\n", top_hit, "\n")
+            result["top_hit"] = top_hit
+        if top_meta.get("office"):
+            result["office"] = {k: top_meta[k] for k in OFFICE_FIELDS if k in top_meta}
+
+        # — step 1: coordinates from the index, or written in the text? —
+        coords = office_coords(top_meta)
+        if coords:
+            self._log(f"Indexed location of {top_meta['office']}.")
+        else:
+            coords = find_coords([top_hit, prompt])
+
+        # — step 2: if no coords, derive city then geocode —
+        if not coords:
+            city_str = (
+                find_city_state([top_hit, prompt])
+                or find_city_country([top_hit, prompt])
+                or guess_city([top_hit, prompt])
+            )
+            if city_str:
+                self._log(f"No coords found; geocoding '{city_str}'.")
+                coords = await spec.get(("geocode", city_str),
+                                        lambda: self.geocoder.geocode(city_str))
+
+        if not coords:
+            self._log("Could not determine latitude/longitude.\n")
+            result["error"] = "Could not determine latitude/longitude."
+            return result, None
+
+        lat, lon = coords
+        result["coords"] = {"lat": lat, "lon": lon}
+        self._log(f"Using coordinates: {lat:.4f}, {lon:.4f}\n")
+
+        # — step 3: call MCP tools over the already-open session —
         try:
-            w_raw = await mcp.call_tool("get_weather", {"lat": lat, "lon": lon})
+            w_raw = await spec.get(weather_key(lat, lon), lambda: self.mcp.call_tool(
+                "get_weather", {"lat": lat, "lon": lon}))
         except ToolError as e:
-            print(f"Error calling get_weather: {e}")
-            return
+            self._log(f"Error calling get_weather: {e}")
+            result["error"] = f"get_weather failed: {e}"
+            return result, None
 
         weather = unwrap(w_raw)
         if not isinstance(weather, dict):
-            print(f"Unexpected get_weather result: {weather}")
-            return
+            self._log(f"Unexpected get_weather result: {weather}")
+            result["error"] = f"Unexpected get_weather result: {weather}"
+            return result, None
 
-        temp_c = weather.get("temperature")
+        temp_c = weather.get("temperature_c", weather.get("temperature"))
+        temp_f = weather.get("temperature_f")
         cond   = weather.get("conditions", "Unknown")
 
-        try:
-            tf_raw = await mcp.call_tool("convert_c_to_f", {"c": temp_c})
-            temp_f = float(unwrap(tf_raw))
-        except (ToolError, ValueError) as e:
-            print(f"Temperature conversion failed: {e}")
-            return
-                
-    # — Step 4: LLM-crafted final summary —─────────────────────────
-    # 1. Strip any street-address segment so we don’t reveal an exact location.
-    #    Pattern: leading digits + word chars until the first comma.
-    safe_line = re.sub(r"\d+\s+\S+(?:\s+\S+)*,?\s*", "", top_hit, count=1).strip()
-
-    # 2. Pull what looks like the city/country piece (everything *after* the
-    #    first comma), just for the model’s context.
-    city_part = ", ".join(top_hit.split(",", 2)[1:]).strip() or "N/A"
-
-    llm = ChatOllama(model="llama3.2", temperature=0.2)
-
-    system_msg = (
-        "You are a helpful business assistant. "
-        "It is safe to summarise this public-facing office information. "
-        "Do NOT reproduce any street address—only office name, city, "
-        "state, or country."
-    )
-
-    user_msg = (
-        "Using the details below, write **three short sentences** (≤60 words):\n"
-        f"• Office: {safe_line}\n"
-        f"• Location context: {city_part}\n"
-        f"• Weather: {cond}, {temp_f:.1f} °F\n\n"
-        "Sentence-1  → Office name + city/country.\n"
-        "Sentence-2  → Current weather.\n"
-        "Sentence-3  → One interesting fact about the city "
-        "(history, culture, or geography).\n"
-    )
+        if temp_f is None:                     # older server: °C only
+            try:
+                tf_raw = await self.mcp.call_tool("convert_c_to_f", {"c": temp_c})
+                temp_f = float(unwrap(tf_raw))
+            except (ToolError, ValueError) as e:
+                self._log(f"Temperature conversion failed: {e}")
+                result["error"] = f"Temperature conversion failed: {e}"
+                return result, None
+
+        result["weather"] = {"conditions": cond, "temperature_c": temp_c,
+                             "temperature_f": temp_f}
+
+        # — Step 4: LLM-crafted final summary —─────────────────────────
+        office = result["office"]
+        if office:
+            # Structured record from the index: no street address in it
+            safe_line = office["office"]
+            city_part = ", ".join(p for p in (office.get("city"),
+                                              office.get("region")) if p)
+        else:
+            # 1. Strip any street-address segment so we don’t reveal an exact
+            #    location.  Pattern: leading digits + word chars until the
+            #    first comma.
+            safe_line = re.sub(r"\d+\s+\S+(?:\s+\S+)*,?\s*", "", top_hit, count=1).strip()
+
+            # 2. Pull what looks like the city/country piece (everything
+            #    *after* the first comma), just for the model’s context.
+            city_part = ", ".join(top_hit.split(",", 2)[1:]).strip() or "N/A"
+
+        system_msg = (
+            "You are a helpful business assistant. "
+            "It is safe to summarise this public-facing office information. "
+            "Do NOT reproduce any street address—only office name, city, "
+            "state, or country."
+        )
 
-    summary = llm.invoke(
-        [{"role": "system", "content": system_msg},
-         {"role": "user",   "content": user_msg}]
-    ).content.strip()
+        user_msg = (
+            "Using the details below, write **three short sentences** (≤60 words):\n"
+            f"• Office: {safe_line}\n"
+            f"• Location context: {city_part}\n"
+            f"• Weather: {cond}, {temp_f:.0f} °F\n\n"   # whole °F: cache bucket
+            "Sentence-1  → Office name + city/country.\n"
+            "Sentence-2  → Current weather.\n"
+            "Sentence-3  → One interesting fact about the city "
+            "(history, culture, or geography).\n"
+        )
 
-    print(summary + "\n")
+        # Semantic cache hits need the same office, place and conditions;
+        # the whole-°F temperature is checked by the number guard.
+        facts = {"office": safe_line, "city": city_part, "conditions": cond}
+        return result, Summary([{"role": "system", "content": system_msg},
+                                {"role": "user",   "content": user_msg}], facts)
+
+    # ── fan-out: many places, one summary ────────────────────────
+    async def _prepare_many(self, prompt: str,
+                            plans: List[Plan]) -> Tuple[Dict[str, Any], Optional[Summary]]:
+        """
+        Fan-out variant of `_prepare` for prompts about several places.
+
+        1. Places: every one the prompt names (`plans`, resolved by
+           `FastPlanner.plan_many` in `_prepare`), else every office row
+           among the top `FANOUT_K` RAG hits – not just the first hit.
+        2. Coordinates: indexed on the row, else geocoded – concurrently,
+           at most `FANOUT_LIMIT` at a time.
+        3. Weather for all of them in one `get_weather_many` call (the
+           server fetches uncached cells in bulk).
+        4. Messages for *one* summary covering every place.
+        """
+        result: Dict[str, Any] = {"prompt": prompt, "top_hit": None,
+                                  "office": None, "coords": None,
+                                  "weather": None, "locations": [],
+                                  "summary": None, "ttft_ms": None,
+                                  "error": None}
+
+        if plans:
+            places = [{"name": p.place, "office": None,
+                       "lat": p.args["lat"], "lon": p.args["lon"]} for p in plans]
+        else:
+            hits   = await self._offload(rag_search, prompt, self.embed_cache,
+                                         self.coll, self.lexical, SEARCH_MODE, FANOUT_K)
+            places = await self._office_places([meta for _, meta in hits])
+
+        places = [p for p in places if p["lat"] is not None]
+        if not places:
+            self._log("Could not determine any locations.\n")
+            result["error"] = "Could not determine any locations."
+            return result, None
+        self._log(f"Fan-out over {len(places)} locations: "
+                  + "; ".join(p["name"] for p in places) + "\n")
+
+        weathers = await self._weather_many([(p["lat"], p["lon"]) for p in places])
+
+        lines = []
+        for place, weather in zip(places, weathers):
+            entry = {**place, "weather": None, "error": None}
+            if not isinstance(weather, dict) or "error" in weather:
+                entry["error"] = weather.get("error") if isinstance(weather, dict) else str(weather)
+            else:
+                entry["weather"] = {"conditions":    weather.get("conditions", "Unknown"),
+                                    "temperature_c": weather.get("temperature_c",
+                                                                 weather.get("temperature")),
+                                    "temperature_f": weather.get("temperature_f")}
+            result["locations"].append(entry)
+            label = f"{place['office']} — {place['name']}" if place["office"] else place["name"]
+            w = entry["weather"]
+            if w is None:
+                lines.append(f"• {label}: weather unavailable")
+            elif w["temperature_f"] is not None:
+                lines.append(f"• {label}: {w['conditions']}, {w['temperature_f']:.0f} °F")
+            elif w["temperature_c"] is not None:   # older server: °C only
+                lines.append(f"• {label}: {w['conditions']}, {w['temperature_c']:.0f} °C")
+            else:
+                lines.append(f"• {label}: {w['conditions']}, temperature unavailable")
+            self._log(lines[-1])
+
+        system_msg = (
+            "You are a helpful business assistant. "
+            "Summarise current weather across company offices and cities. "
+            "Do NOT reproduce any street address and do not invent weather data."
+        )
+        user_msg = (
+            f"Question: {prompt}\n\n"
+            "Current weather:\n" + "\n".join(lines) + "\n\n"
+            "Answer the question in one short paragraph (≤80 words) that "
+            "compares these places – only those the question is about – and "
+            "names the warmest and the coldest.\n"
+        )
+        facts = {"places": [[e["office"], e["name"],
+                             e["weather"]["conditions"] if e["weather"] else None]
+                            for e in result["locations"]]}
+        return result, Summary([{"role": "system", "content": system_msg},
+                                {"role": "user",   "content": user_msg}], facts)
+
+    async def _office_places(self, metas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Distinct office rows → name + coordinates (geocoded if not indexed)."""
+        rows = list({m["office"]: m for m in metas if m.get("office")}.values())
+
+        async def locate(meta: Dict[str, Any]) -> Dict[str, Any]:
+            name   = place_name(meta) if meta.get("city") else meta["office"]
+            coords = office_coords(meta) or await self.geocoder.geocode(name)
+            lat, lon = coords if coords else (None, None)
+            return {"name": name, "office": meta["office"], "lat": lat, "lon": lon}
+
+        return await bounded_gather([locate(m) for m in rows], FANOUT_LIMIT)
+
+    async def _weather_many(self, points: List[Tuple[float, float]]) -> List[Any]:
+        """
+        Weather per point, in order: one `get_weather_many` call, or – if
+        that fails for any reason (older server without the tool, a bad
+        batch) – `get_weather` per point, at most `FANOUT_LIMIT` at a
+        time, as in `extra/lab3-agent`.  A failed point is `{"error": ...}`.
+        """
+        locations = [{"lat": lat, "lon": lon} for lat, lon in points]
+        try:
+            raw = unwrap(await self.mcp.call_tool("get_weather_many",
+                                                  {"locations": locations}))
+            if isinstance(raw, dict) and "result" in raw:   # wrapped list
+                raw = raw["result"]
+            if isinstance(raw, list) and len(raw) == len(points):
+                return raw
+        except ToolError:
+            pass                                # fall back to one call per point
+
+        async def one(loc: Dict[str, float]) -> Any:
+            try:
+                return unwrap(await self.mcp.call_tool("get_weather", loc))
+            except ToolError as e:
+                return {"error": str(e)}
+
+        return await bounded_gather([one(loc) for loc in locations], FANOUT_LIMIT)
+
+    async def stream(self, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the pipeline, yielding summary tokens as Ollama generates them:
+
+            {"event": "token",  "data": "It"}          (zero or more)
+            {"event": "result", "data": {...}}         (always last)
+
+        The result carries `ttft_ms`, the time from the summary request
+        to its first token (a cached summary arrives as one token).
+        """
+        result, summary = await self._prepare(prompt)
+        if summary is not None:
+            # Same office + conditions + °F within LLM_CACHE_TTL → cached
+            # summary; otherwise tokens stream from Ollama asynchronously.
+            started = time.perf_counter()
+            parts: List[str] = []
+            async for token in self.llm_cache.astream(summary.messages,
+                                                      facts=summary.facts):
+                if not parts:
+                    result["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    self.ttft_ms.append(result["ttft_ms"])
+                parts.append(token)
+                yield {"event": "token", "data": token}
+            result["summary"] = "".join(parts).strip()
+        yield {"event": "result", "data": result}
+
+    async def run(self, prompt: str) -> Dict[str, Any]:
+        """
+        Whole pipeline in one go (see `_prepare` for the steps).
+
+        Returns a JSON-friendly dict; `error` is set if a step failed.
+        """
+        async for event in self.stream(prompt):
+            if event["event"] == "result":
+                result = event["data"]
+        if result["summary"]:
+            self._log(result["summary"] + "\n")
+        return result
+
+
+async def run(prompt: str) -> Dict[str, Any]:
+    """One-shot helper: start an agent, answer a single prompt, shut down."""
+    async with RagAgent() as agent:
+        return await agent.run(prompt)
 
 # ╔══════════════════════════════════════════════════════════════════╗
 # 6.  Command-line REPL                                              ║
 # ╚══════════════════════════════════════════════════════════════════╝
+async def repl() -> None:
+    """
+    One event loop and one `RagAgent` for the whole session; `input()`
+    runs in a worker thread so the MCP session stays serviced.  The
+    summary streams to the terminal as Ollama generates it.
+    """
+    async with RagAgent() as agent:
+        while True:
+            prompt = (await asyncio.to_thread(input, "Prompt: ")).strip()
+            if prompt.lower() == "exit":
+                print(f"Cache stats: {agent.stats()}")
+                break
+            if prompt:
+                # Print the summary token by token as it is generated
+                async for event in agent.stream(prompt):
+                    if event["event"] == "token":
+                        print(event["data"], end="", flush=True)
+                    elif event["data"]["summary"]:
+                        print(f"\n\n(first token after {event['data']['ttft_ms']:.0f} ms)\n")
+
+
 if __name__ == "__main__":
     print("Office-aware weather agent. Type 'exit' to quit.\n")
-    while True:
-        prompt = input("Prompt: ").strip()
-        if prompt.lower() == "exit":
-            break
-        if prompt:
-            asyncio.run(run(prompt))
+    asyncio.run(repl())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+rag_service.py
+────────────────────────────────────────────────────────────────────
+Async HTTP front-end (ASGI) for the office-weather RAG agent, so an
+internal portal can send many lookups at once instead of typing into
+the REPL.
+
+Endpoints
+---------
+    POST /ask      {"prompt": "Tell me about HQ"}  →  JSON result of run()
+    POST /ask/stream  same body → Server-Sent Events: `token` events as
+                   the summary is generated, then the `result` event
+    GET  /health   → {"status": "ok"}
+    GET  /stats    → cache hit/miss counters (+ summary time-to-first-token)
+
+How it scales
+-------------
+* **One event loop, one agent.**  A single `RagAgent` (model, Chroma
+  collection, LLM client, open MCP session) is created at start-up and
+  shared by every request.
+* **Nothing blocks the loop.**  Inside `RagAgent.run()` the CPU-bound
+  embedding/search runs on the agent's thread pool, geocoding uses the
+  async pooled client (`tools/geocoding.py`), MCP calls are async, and
+  the LLM is awaited via `ainvoke`.  Dozens of requests therefore
+  progress concurrently.
+* **Read-only vectors.**  With `VECTOR_BACKEND=local` the agent
+  searches the mmap'd export from `tools/local_index.py`: start-up is
+  near-instant and several service processes share one copy of the
+  vectors in the page cache.
+* **Back-pressure.**  At most `MAX_IN_FLIGHT` pipelines run at once; the
+  rest wait their turn instead of swamping Ollama.
+
+Run
+---
+    python rag_service.py                      # serves rag_agent2 (LLM summary)
+    python rag_service.py --agent rag_agent    # weather only, no LLM
+
+    curl -s localhost:8080/ask -d '{"prompt": "Tell me about HQ"}'
+    curl -N localhost:8080/ask/stream -d '{"prompt": "Tell me about HQ"}'
+
+Starlette and Uvicorn are pinned in `requirements/requirements.txt`.
+"""
+
+# ────────────────────────── standard libs ───────────────────────────
+import argparse
+import asyncio
+import importlib
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+# ────────────────────────── third-party libs ────────────────────────
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                             ║
+# ╚══════════════════════════════════════════════════════════════════╝
+HOST          = "127.0.0.1"
+PORT          = 8080
+AGENT_MODULE  = "rag_agent2"                    # or "rag_agent"
+MAX_IN_FLIGHT = 32                              # concurrent pipelines
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 2.  Request handlers                                               ║
+# ╚══════════════════════════════════════════════════════════════════╝
+async def read_prompt(request: Request) -> Tuple[Optional[str], Optional[JSONResponse]]:
+    """`(prompt, None)` from a `{"prompt": ...}` body, or `(None, 400 response)`."""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, JSONResponse({"error": "Body must be JSON."}, status_code=400)
+
+    prompt = body.get("prompt") if isinstance(body, dict) else None
+    if not isinstance(prompt, str) or not prompt.strip():
+        return None, JSONResponse({"error": "Field 'prompt' is required."},
+                                  status_code=400)
+    return prompt.strip(), None
+
+
+async def ask(request: Request) -> JSONResponse:
+    """Run the RAG pipeline for `{"prompt": ...}` and return its result."""
+    prompt, error = await read_prompt(request)
+    if error:
+        return error
+
+    state = request.app.state
+    async with state.limiter:
+        result = await state.agent.run(prompt)
+    return JSONResponse(result)
+
+
+async def agent_events(agent, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+    """Token events from agents that stream (rag_agent2), then the result."""
+    if hasattr(agent, "stream"):
+        async for event in agent.stream(prompt):
+            yield event
+    else:
+        yield {"event": "result", "data": await agent.run(prompt)}
+
+
+async def ask_stream(request: Request) -> Response:
+    """
+    Same pipeline as /ask, as Server-Sent Events: one `token` event per
+    generated piece of the summary, then one `result` event.  `data` is
+    always JSON (a string for tokens).
+    """
+    prompt, error = await read_prompt(request)
+    if error:
+        return error
+
+    state = request.app.state
+
+    async def sse() -> AsyncIterator[str]:
+        async with state.limiter:
+            async for event in agent_events(state.agent, prompt):
+                data = json.dumps(event["data"], ensure_ascii=False)
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache",
+                                      "X-Accel-Buffering": "no"})
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({"status": "ok"})
+
+
+async def stats(request: Request) -> JSONResponse:
+    return JSONResponse(request.app.state.agent.stats())
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 3.  App factory                                                    ║
+# ╚══════════════════════════════════════════════════════════════════╝
+def create_app(agent_module: str = AGENT_MODULE,
+               max_in_flight: int = MAX_IN_FLIGHT) -> Starlette:
+    """
+    Build the ASGI app.  The agent is created in the lifespan hook so
+    the model loads once, before the first request is accepted.
+    """
+    agent_cls = importlib.import_module(agent_module).RagAgent
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        async with agent_cls(verbose=False) as agent:
+            app.state.agent   = agent
+            app.state.limiter = asyncio.Semaphore(max_in_flight)
+            yield
+
+    return Starlette(
+        routes=[
+            Route("/ask",    ask,    methods=["POST"]),
+            Route("/ask/stream", ask_stream, methods=["POST"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/stats",  stats,  methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 4.  Entry point                                                    ║
+# ╚══════════════════════════════════════════════════════════════════╝
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP front-end for the RAG agent.")
+    parser.add_argument("--agent", default=AGENT_MODULE,
+                        choices=("rag_agent", "rag_agent2"))
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.agent, args.max_in_flight),
+                host=args.host, port=args.port)
@@ -0,0 +1,35 @@
+"""
+Shared fixtures.  Tests run from the repo root (`python -m pytest -q`)
+and import the helpers the way their callers do: `tools.<module>` for
+the agents' helpers, bare names for the indexer scripts.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+# The indexer scripts run as `python tools/index_pdf.py` and import their
+# siblings by bare name (`from offices import …`), so their tests do too.
+if str(ROOT / "tools") not in sys.path:
+    sys.path.append(str(ROOT / "tools"))
+
+from tools.gazetteer import Gazetteer, PlaceRecord, write_gazetteer  # noqa: E402
+
+PLACES = [
+    PlaceRecord("Paris, FR",      48.85341,   2.3488,   2_138_551, ["Paris", "Paris, FR", "Paris, France"]),
+    PlaceRecord("London, GB",     51.50853,  -0.12574,  8_961_989, ["London", "London, GB", "London, UK"]),
+    PlaceRecord("Austin, TX, US", 30.26715, -97.74306,    961_855, ["Austin", "Austin, TX", "Austin, US"]),
+    PlaceRecord("São Paulo, BR", -23.5475,  -46.63611, 10_021_295, ["São Paulo", "Sao Paulo, BR"]),
+]
+
+
+@pytest.fixture(scope="session")
+def gazetteer(tmp_path_factory) -> Gazetteer:
+    """A four-city gazetteer built with the real writer."""
+    out = tmp_path_factory.mktemp("gazetteer")
+    write_gazetteer(PLACES, out, sources=["tests"])
+    return Gazetteer.load(out)
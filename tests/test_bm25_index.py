@@ -0,0 +1,89 @@
+"""
+Incremental BM25 updates (`tools/bm25_index.py`): applying the written
+and deleted IDs of a run must give the same index as a full rebuild.
+"""
+
+import pytest
+
+from bm25_index import BM25Index, sync_bm25, update_bm25
+
+
+class FakeCollection:
+    """Chroma's `get()` (by page or by IDs) over an ID → document dict."""
+
+    def __init__(self, docs):
+        self.docs = dict(docs)
+
+    def get(self, ids=None, include=None, limit=None, offset=0):
+        keys = [i for i in ids if i in self.docs] if ids is not None else list(self.docs)
+        if ids is None and limit is not None:
+            keys = keys[offset:offset + limit]
+        return {"ids": keys, "documents": [self.docs[i] for i in keys]}
+
+
+def contents(index):
+    """ID → (length, {term: tf}): the index independent of row order."""
+    out = {}
+    for row, cid in enumerate(index.doc_ids):
+        out[bytes(cid).decode("utf-8")] = (int(index.doc_len[row]), {})
+    for t, term in enumerate(index.terms):
+        for p in range(int(index.ptr[t]), int(index.ptr[t + 1])):
+            cid = bytes(index.doc_ids[index.post_doc[p]]).decode("utf-8")
+            out[cid][1][bytes(term).decode("ascii")] = int(index.post_tf[p])
+    return out
+
+
+def assert_same_as_rebuild(coll, path, tmp_path):
+    fresh = tmp_path / "fresh"
+    sync_bm25(coll, fresh, page_size=2)
+    got, want = BM25Index.load(path), BM25Index.load(fresh)
+    assert contents(got) == contents(want)
+    assert got.n_docs == want.n_docs and got.avgdl == pytest.approx(want.avgdl)
+    assert list(got.terms) == list(want.terms)
+    for query in ("Paris office", "weather", "get_weather London", "Berlin"):
+        assert ({h.id: round(h.score, 5) for h in got.search(query)} ==
+                {h.id: round(h.score, 5) for h in want.search(query)})
+
+
+@pytest.fixture
+def coll():
+    return FakeCollection({
+        "offices.pdf-0": "Paris Office 88 Champs-Élysées, Paris, France",
+        "offices.pdf-1": "London Office 1 High St, London, UK",
+        "offices.pdf-2": "Berlin Office 22 Friedrichstrasse, Berlin, Germany",
+        "agent.py-0":    "def get_weather(lat, lon): return weather for the office",
+    })
+
+
+def test_first_update_builds_the_whole_index(coll, tmp_path):
+    path   = tmp_path / "bm25"
+    counts = update_bm25(coll, path, changed=["offices.pdf-0"], removed=[])
+    assert counts["docs"] == 4
+    assert_same_as_rebuild(coll, path, tmp_path)
+
+
+def test_changed_added_and_removed_documents(coll, tmp_path):
+    path = tmp_path / "bm25"
+    sync_bm25(coll, path)
+
+    coll.docs["offices.pdf-1"] = "London Office 2 Strand, London, UK weather"   # changed
+    coll.docs["offices.pdf-3"] = "Madrid Office 5 Gran Via, Madrid, Spain"      # added
+    del coll.docs["offices.pdf-2"]                                              # removed
+    update_bm25(coll, path, changed=["offices.pdf-1", "offices.pdf-3"],
+                removed=["offices.pdf-2"], page_size=1)
+
+    assert_same_as_rebuild(coll, path, tmp_path)
+    index = BM25Index.load(path)
+    assert [h.id for h in index.search("Madrid")] == ["offices.pdf-3"]
+    assert index.search("Friedrichstrasse") == []
+
+
+def test_removing_everything_leaves_an_empty_index(coll, tmp_path):
+    path = tmp_path / "bm25"
+    sync_bm25(coll, path)
+    removed = list(coll.docs)
+    coll.docs.clear()
+
+    counts = update_bm25(coll, path, changed=[], removed=removed)
+    assert counts == {"docs": 0, "terms": 0}
+    assert BM25Index.load(path).search("Paris office") == []
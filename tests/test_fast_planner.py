@@ -0,0 +1,59 @@
+"""Rule-based planning and fan-out routing (`tools/fast_planner.py`)."""
+
+import pytest
+
+from tools.fast_planner import FastPlanner, wants_fanout
+
+
+def routes_to_fanout(planner: FastPlanner, prompt: str) -> bool:
+    """The routing rule `rag_agent2.RagAgent._prepare` applies."""
+    return bool(planner.plan_many(prompt, count=False)) or wants_fanout(prompt)
+
+
+@pytest.mark.parametrize("prompt", [
+    "Tell me all about the Paris office",
+    "Tell me about each team at HQ",
+    "Which office has the most employees of all?",
+    "What's the weather at the Paris office?",
+    "Which offices are in Europe?",
+    "What's the weather in Paris?",
+    "weather in Austin, TX",
+])
+def test_single_place_prompts_do_not_fan_out(gazetteer, prompt):
+    assert not routes_to_fanout(FastPlanner(gazetteer), prompt)
+
+
+@pytest.mark.parametrize("prompt", [
+    "Compare the weather in all our European offices",
+    "What's the weather at every office?",
+    "How is the weather at each of our offices?",
+    "Paris vs London",
+])
+def test_explicit_comparisons_fan_out(gazetteer, prompt):
+    assert routes_to_fanout(FastPlanner(gazetteer), prompt)
+
+
+def test_two_named_places_fan_out_without_keywords(gazetteer):
+    planner = FastPlanner(gazetteer)
+    plans   = planner.plan_many("weather in Paris, London and Austin, TX")
+    assert [p.place for p in plans] == ["Paris, FR", "London, GB", "Austin, TX, US"]
+    assert all(p.source == "multi" for p in plans)
+    assert planner.stats()["multi"] == 1
+
+
+def test_routing_check_does_not_count(gazetteer):
+    planner = FastPlanner(gazetteer)
+    assert routes_to_fanout(planner, "Paris vs London")
+    assert planner.stats()["multi"] == 0
+
+
+def test_plan_many_needs_every_place_to_resolve(gazetteer):
+    assert FastPlanner(gazetteer).plan_many("weather in Paris and Atlantis") == []
+
+
+def test_plan_resolves_exact_names_only(gazetteer):
+    planner = FastPlanner(gazetteer)
+    plan    = planner.plan("What's the weather in Paris?")
+    assert plan.args == {"lat": 48.85341, "lon": 2.3488}
+    assert planner.plan("What's the weather in Pariss?") is None
+    assert planner.guess("What's the weather in Pariss?") == (48.85341, 2.3488)
@@ -0,0 +1,108 @@
+"""
+AsyncGeocoder caching and coalescing against an httpx MockTransport
+standing in for Open-Meteo's geocoding API.
+"""
+
+import asyncio
+
+import httpx
+
+from tools.geocoding import AsyncGeocoder, normalise
+
+PARIS = {"results": [{"latitude": 48.85341, "longitude": 2.3488}]}
+
+
+class Upstream:
+    """Counts requests; answers `status` / `body` after `delay` seconds."""
+
+    def __init__(self, status=200, body=PARIS, delay=0.0):
+        self.status = status
+        self.body   = body
+        self.delay  = delay
+        self.calls  = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return httpx.Response(self.status, json=self.body)
+
+
+def geocoder(upstream: Upstream, **kwargs) -> AsyncGeocoder:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    return AsyncGeocoder("https://geo.test/search", client=client, **kwargs)
+
+
+def test_concurrent_lookups_share_one_request():
+    upstream = Upstream(delay=0.05)
+    geo      = geocoder(upstream)
+
+    async def main():
+        return await asyncio.gather(*(geo.geocode("Paris") for _ in range(5)))
+
+    assert asyncio.run(main()) == [(48.85341, 2.3488)] * 5
+    assert upstream.calls == 1
+    assert geo.stats["misses"] == 1 and geo.stats["coalesced"] == 4
+
+
+def test_cancelled_leader_does_not_fail_the_waiters():
+    upstream = Upstream(delay=0.05)
+    geo      = geocoder(upstream)
+
+    async def main():
+        leader = asyncio.ensure_future(geo.geocode("Paris"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(geo.geocode("Paris"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) == (48.85341, 2.3488)
+    assert upstream.calls == 1
+    assert geo.cache.get(normalise("Paris")) == (True, (48.85341, 2.3488))
+
+
+def test_cancelled_only_caller_still_caches_the_answer():
+    upstream = Upstream(delay=0.02)
+    geo      = geocoder(upstream)
+
+    async def main():
+        caller = asyncio.ensure_future(geo.geocode("Paris"))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.05)               # the shared lookup finishes
+        return await geo.geocode("Paris")
+
+    assert asyncio.run(main()) == (48.85341, 2.3488)
+    assert upstream.calls == 1 and geo.stats["hits"] == 1
+
+
+def test_upstream_errors_are_not_cached():
+    upstream = Upstream(status=503, body={})
+    geo      = geocoder(upstream)
+
+    async def main():
+        return [await geo.geocode("Paris") for _ in range(2)]
+
+    assert asyncio.run(main()) == [None, None]
+    assert upstream.calls == 2 and geo.stats["errors"] == 2
+    assert geo.cache.get(normalise("Paris")) == (False, None)
+
+
+def test_unknown_place_is_cached_as_negative():
+    upstream = Upstream(body={})
+    geo      = geocoder(upstream)
+
+    async def main():
+        return [await geo.geocode("Atlantis") for _ in range(2)]
+
+    assert asyncio.run(main()) == [None, None]
+    assert upstream.calls == 1 and geo.stats["hits"] == 1
+
+
+def test_local_index_is_asked_first(gazetteer):
+    upstream = Upstream()
+    geo      = geocoder(upstream, local=gazetteer)
+
+    assert asyncio.run(geo.geocode("London, UK")) == (51.50853, -0.12574)
+    assert upstream.calls == 0 and geo.stats["local"] == 1
@@ -0,0 +1,97 @@
+"""
+Code chunking (`tools/index_code.py`): AST boundaries, oversized
+definitions and the fallback for files that do not parse.  Every line
+counts as one token here, so `max_tokens` reads as a line budget.
+"""
+
+import textwrap
+
+import pytest
+
+import index_code
+from index_code import _token_ranges, chunk_file, chunk_python_ast
+
+
+@pytest.fixture(autouse=True)
+def one_token_per_line(monkeypatch):
+    monkeypatch.setattr(index_code, "line_token_counts", lambda lines: [1] * len(lines))
+
+
+def spans(code, max_tokens=50):
+    """(qualname, kind, start_line, end_line) of every AST chunk."""
+    return [(m["qualname"], m["kind"], m["start_line"], m["end_line"])
+            for _, m in chunk_python_ast(textwrap.dedent(code), max_tokens)]
+
+
+@pytest.mark.parametrize("counts, lo, hi, budget, ranges", [
+    ([1, 1, 1, 1],    0, 4, 2, [(0, 2), (2, 4)]),
+    ([3, 3, 3],       0, 3, 5, [(0, 1), (1, 2), (2, 3)]),
+    ([9, 1, 1],       0, 3, 5, [(0, 1), (1, 3)]),    # an oversized line stands alone
+    ([1, 1, 1, 1, 1], 1, 4, 2, [(1, 3), (3, 4)]),
+    ([1, 1],          1, 1, 2, []),
+])
+def test_token_ranges(counts, lo, hi, budget, ranges):
+    assert list(_token_ranges(counts, lo, hi, budget)) == ranges
+
+
+def test_one_chunk_per_top_level_definition():
+    code = '''
+    import os
+    LIMIT = 3
+
+    # helper comment belongs to the function
+    def helper(x):
+        return x + 1
+
+
+    class Box:
+        size = 1
+
+        def area(self):
+            return self.size ** 2
+    '''
+    assert spans(code) == [
+        ("<module>", "module",   2,  3),
+        ("helper",   "function", 5,  7),
+        ("Box",      "class",   10, 14),
+    ]
+
+
+def test_oversized_class_is_split_into_members():
+    code = '''
+    class Box:
+        """Doc."""
+        size = 1
+
+        def area(self):
+            return self.size ** 2
+
+        def grow(self, by):
+            self.size += by
+            return self
+    '''
+    assert spans(code, max_tokens=4) == [
+        ("Box",      "class",    2,  4),
+        ("Box.area", "function", 6,  7),
+        ("Box.grow", "function", 9, 11),
+    ]
+
+
+def test_oversized_function_keeps_its_name_across_pieces():
+    body = "\n".join(f"    x{i} = {i}" for i in range(7))
+    code = f"def big():\n{body}\n    return x0\n"
+    chunks = list(chunk_python_ast(code, max_tokens=4))
+    assert [(m["qualname"], m["start_line"], m["end_line"]) for _, m in chunks] == [
+        ("big", 1, 4), ("big", 5, 8), ("big", 9, 9)]
+    assert "\n".join(text for text, _ in chunks) == code.rstrip("\n")
+
+
+def test_syntax_error_falls_back_to_token_windows():
+    code = "def broken(:\n    pass\nx = 1\ny = 2\n"
+    assert spans(code, max_tokens=3) == [("<module>", "module", 1, 3),
+                                         ("<module>", "module", 4, 4)]
+
+
+def test_lines_mode_breaks_on_blank_lines():
+    code = "a = 1\nb = 2\n\nc = 3\n"
+    assert chunk_file(code, "lines") == [("a = 1\nb = 2", {}), ("c = 3", {})]
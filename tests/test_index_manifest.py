@@ -0,0 +1,108 @@
+"""
+Content-hash diffing and stored-vector reads (`tools/index_manifest.py`):
+what an incremental run re-embeds, copies and deletes.
+"""
+
+import pytest
+
+from index_manifest import (IndexManifest, apply_settings, chunk_hash,
+                            diff_chunks, old_positions, stored_vectors)
+
+
+def hashes(*texts):
+    return [chunk_hash(t) for t in texts]
+
+
+@pytest.mark.parametrize("old, new, changed, moved, stale", [
+    # unchanged
+    ("abc",  "abc",  [],     {},                    []),
+    # edited in place
+    ("abc",  "aXc",  [1],    {},                    []),
+    # inserted at the top: everything after it moves, nothing re-embedded
+    ("abc",  "Xabc", [0],    {1: 0, 2: 1, 3: 2},    []),
+    # inserted in the middle
+    ("abc",  "abXc", [2],    {3: 2},                []),
+    # deleted at the top: the rest moves up, the last ID goes stale
+    ("abc",  "bc",   [],     {0: 1, 1: 2},          [2]),
+    # truncated
+    ("abcd", "ab",   [],     {},                    [2, 3]),
+    # duplicates copy from the first old occurrence
+    ("aab",  "baa",  [],     {0: 2, 2: 0},          []),
+    ("ab",   "abbb", [],     {2: 1, 3: 1},          []),
+    # new file / emptied file
+    ("",     "ab",   [0, 1], {},                    []),
+    ("ab",   "",     [],     {},                    [0, 1]),
+])
+def test_diff_chunks(old, new, changed, moved, stale):
+    assert diff_chunks(hashes(*old), hashes(*new)) == (changed, moved, stale)
+
+
+def test_old_positions_keeps_the_first_index():
+    assert old_positions(["h1", "h2", "h1"]) == {"h1": 0, "h2": 1}
+
+
+class FakeCollection:
+    """Stores one vector per ID; records the IDs of every get()."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.gets    = []
+
+    def get(self, ids, include):
+        assert include == ["embeddings"]
+        self.gets.append(list(ids))
+        found = [i for i in ids if i in self.vectors]
+        return {"ids": found, "embeddings": [self.vectors[i] for i in found]}
+
+    def delete(self, ids):
+        for i in ids:
+            self.vectors.pop(i, None)
+
+
+def test_stored_vectors_reads_only_the_given_ids_in_pages():
+    coll = FakeCollection({f"doc.pdf-{i}": [float(i)] for i in range(10)})
+    got  = stored_vectors(coll, "doc.pdf", [7, 3, 3, 9, 1, 5], page=2)
+    assert got == {1: [1.0], 3: [3.0], 5: [5.0], 7: [7.0], 9: [9.0]}
+    assert coll.gets == [["doc.pdf-1", "doc.pdf-3"], ["doc.pdf-5", "doc.pdf-7"],
+                         ["doc.pdf-9"]]
+
+
+def test_stored_vectors_skips_missing_ids_and_empty_requests():
+    coll = FakeCollection({"doc.pdf-0": [0.0]})
+    assert stored_vectors(coll, "doc.pdf", [0, 4]) == {0: [0.0]}
+    assert stored_vectors(coll, "doc.pdf", []) == {}
+    assert len(coll.gets) == 1
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    manifest.update("doc.pdf", "digest", hashes("a", "b"))
+    manifest.save()
+
+    again = IndexManifest(tmp_path / "manifest.json")
+    assert again.is_unchanged("doc.pdf", "digest")
+    assert not again.is_unchanged("doc.pdf", "other")
+    assert again.get("doc.pdf")["chunks"] == hashes("a", "b")
+    assert again.settings == {}
+
+
+def test_changed_chunk_settings_drop_every_indexed_file(tmp_path):
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    coll     = FakeCollection({"a.py-0": [0.0], "a.py-1": [1.0], "b.py-0": [2.0]})
+    ast_500  = {"chunk_mode": "ast", "max_tokens": 500}
+    assert not apply_settings(coll, manifest, ast_500)        # first run
+
+    manifest.update("a.py", "d1", hashes("x", "y"))
+    manifest.update("b.py", "d2", hashes("z"))
+    manifest.save()
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    assert manifest.settings == ast_500
+    assert not apply_settings(coll, manifest, ast_500)        # same settings
+    assert len(coll.vectors) == 3
+
+    deleted = set()
+    assert apply_settings(coll, manifest, {"chunk_mode": "lines", "max_tokens": 500},
+                          deleted)
+    assert deleted == {"a.py-0", "a.py-1", "b.py-0"}
+    assert coll.vectors == {} and manifest.paths() == []
+    assert manifest.settings == {"chunk_mode": "lines", "max_tokens": 500}
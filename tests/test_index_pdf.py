@@ -0,0 +1,56 @@
+"""
+Office metadata on incrementally rewritten lines: Chroma merges metadata
+keys on upsert()/update(), so a line ID that no longer holds an office
+row must not keep the old row's fields or coordinates.
+"""
+
+import chromadb
+import pytest
+
+import index_pdf
+from offices import OfficeTable, parse_office_line
+
+PDF    = "data/offices.pdf"
+HEADER = "Office Name Address Number of Employees Revenue (USD) Services Offered"
+HQ     = "HQ 123 Main St, New York, NY 200 15M Corporate Operations, Finance"
+NOTE   = "All offices are open Monday to Friday."
+NYC    = {"New York, NY": (40.71427, -74.00597)}
+
+
+@pytest.fixture
+def coll(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    return client.get_or_create_collection("codebase")
+
+
+def index(coll, tmp_path, lines, located, monkeypatch):
+    """Write `lines` as (line index, text) pairs, then their office rows."""
+    monkeypatch.setattr(index_pdf, "locate_offices", lambda rows, online=True: located)
+    items   = list(enumerate(lines)) if isinstance(lines, list) else list(lines.items())
+    vectors = [[float(i), 1.0] for i, _ in items]
+    index_pdf.write_batch(coll, None, PDF, items, vectors=vectors)
+    rows = {i: row for i, line in items if (row := parse_office_line(line))}
+    index_pdf.write_offices(coll, OfficeTable(tmp_path / "offices.json"), PDF, rows)
+
+
+def meta(coll, idx):
+    return coll.get(ids=[f"{PDF}-{idx}"])["metadatas"][0]
+
+
+def test_line_that_replaced_an_office_row_loses_its_fields(coll, tmp_path, monkeypatch):
+    index(coll, tmp_path, [HEADER, HQ], NYC, monkeypatch)
+    assert meta(coll, 1)["office"] == "HQ" and "lat" in meta(coll, 1)
+
+    # a note inserted above HQ: line 1 is now prose, HQ moved to line 2
+    index(coll, tmp_path, {1: NOTE, 2: HQ}, NYC, monkeypatch)
+    assert meta(coll, 1) == {"path": PDF, "chunk_index": 1}
+    assert meta(coll, 2)["office"] == "HQ"
+    assert (meta(coll, 2)["lat"], meta(coll, 2)["lon"]) == NYC["New York, NY"]
+    assert "office" not in meta(coll, 0)
+
+
+def test_row_that_no_longer_geocodes_loses_its_coordinates(coll, tmp_path, monkeypatch):
+    index(coll, tmp_path, [HEADER, HQ], NYC, monkeypatch)
+    index(coll, tmp_path, {1: HQ}, {}, monkeypatch)
+    assert meta(coll, 1)["office"] == "HQ"
+    assert "lat" not in meta(coll, 1) and "lon" not in meta(coll, 1)
@@ -0,0 +1,110 @@
+"""
+LLMCache key rules: what may be served from cache and what must reach
+the model.  The embedder maps every prompt to the same vector, so only
+the scope (`facts=`) and the numbers in the text keep prompts apart.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from tools.llm_cache import LLMCache
+
+SYSTEM = {"role": "system", "content": "Summarise the office weather."}
+
+
+class FakeLLM:
+    model       = "fake"
+    temperature = 0.0
+
+    def __init__(self, reply="Sunny, 68 °F."):
+        self.reply = reply
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=self.reply)
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        return SimpleNamespace(content=self.reply)
+
+
+class SameVector:
+    def encode(self, text):
+        return np.ones(8, dtype=np.float32)
+
+
+def ask(text):
+    return [SYSTEM, {"role": "user", "content": text}]
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def cache(llm, tmp_path):
+    c = LLMCache(llm, path=tmp_path / "llm_cache.sqlite",
+                 embedder=SameVector(), similarity=0.9)
+    yield c
+    c.close()
+
+
+def test_whitespace_only_changes_hit_exactly(cache, llm):
+    cache.invoke(ask("Weather at the Paris office?  20 C"))
+    reply = cache.invoke(ask(" Weather at the Paris   office? 20 C "))
+    assert reply.tier == "exact" and llm.calls == 1
+
+
+def test_rephrasing_with_the_same_facts_hits_semantically(cache, llm):
+    facts = {"office": "Paris Office", "city": "Paris", "conditions": "Clear"}
+    cache.invoke(ask("Weather at the Paris office? 20 C"), facts=facts)
+    reply = cache.invoke(ask("How is it at the Paris office? 20 C"), facts=facts)
+    assert reply.tier == "semantic" and llm.calls == 1
+
+
+def test_different_facts_never_share_a_reply(cache, llm):
+    cache.invoke(ask("Weather at the office? 20 C"),
+                 facts={"office": "Paris Office", "conditions": "Clear"})
+    cache.invoke(ask("Weather at the office? 20 C"),
+                 facts={"office": "Lyon Office", "conditions": "Clear"})
+    cache.invoke(ask("Weather at the office? 20 C"),
+                 facts={"office": "Paris Office", "conditions": "Rain"})
+    assert llm.calls == 3
+
+
+def test_different_numbers_never_share_a_reply(cache, llm):
+    cache.invoke(ask("Weather at the Paris office? 20 C"))
+    cache.invoke(ask("Weather at the Paris office? 21 C"))
+    assert llm.calls == 2 and cache.stats()["semantic_hits"] == 0
+
+
+def test_rejected_replies_are_not_stored(tmp_path):
+    llm   = FakeLLM(reply="I think it is sunny.")
+    cache = LLMCache(llm, path=tmp_path / "llm_cache.sqlite")
+    is_plan = lambda text: text.startswith("Thought:")
+    cache.invoke(ask("Plan: weather in Paris"), validate=is_plan)
+    cache.invoke(ask("Plan: weather in Paris"), validate=is_plan)
+    assert llm.calls == 2 and cache.stats()["entries"] == 0
+    cache.close()
+
+
+def test_cached_reply_failing_validation_is_a_miss(cache, llm):
+    cache.invoke(ask("Plan: weather in Paris"))
+    cache.invoke(ask("Plan: weather in Paris"), validate=lambda text: False)
+    assert llm.calls == 2
+
+
+def test_concurrent_identical_prompts_share_one_call(cache, llm):
+    async def main():
+        return await asyncio.gather(*(cache.ainvoke(ask("Weather in Paris? 20 C"))
+                                      for _ in range(4)))
+
+    replies = asyncio.run(main())
+    assert {r.content for r in replies} == {llm.reply}
+    assert llm.calls == 1 and cache.stats()["coalesced"] == 3
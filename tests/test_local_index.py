@@ -0,0 +1,169 @@
+"""
+Local vector export (`tools/local_index.py`): every search mode must
+agree with a brute-force search over the exported vectors, and
+`update_local` must give the same rows as a full re-export.
+"""
+
+import numpy as np
+import pytest
+
+from local_index import LocalCollection, export_local, update_local
+
+DIM, ROWS = 16, 40
+
+
+class FakeCollection:
+    """Chroma's `get()` (by page or by IDs) and `count()` over in-memory rows."""
+
+    def __init__(self, rows):
+        self.rows = dict(rows)                  # id → (embedding, document, metadata)
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, ids=None, include=None, limit=None, offset=0):
+        keys = [i for i in ids if i in self.rows] if ids is not None else list(self.rows)
+        if ids is None and limit is not None:
+            keys = keys[offset:offset + limit]
+        return {"ids":        keys,
+                "embeddings": [self.rows[i][0] for i in keys],
+                "documents":  [self.rows[i][1] for i in keys],
+                "metadatas":  [self.rows[i][2] for i in keys]}
+
+
+def row(rng, i):
+    return rng.standard_normal(DIM).tolist(), f"chunk {i}", {"source": "doc.pdf", "n": i}
+
+
+def brute_force(coll, queries, k):
+    """IDs of the `k` highest-cosine rows per query, straight from the fake."""
+    ids  = list(coll.rows)
+    mat  = np.asarray([coll.rows[i][0] for i in ids], dtype=np.float32)
+    mat /= np.linalg.norm(mat, axis=1, keepdims=True)
+    q    = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return [[ids[r] for r in np.argsort(-(mat @ v), kind="stable")[:k]] for v in q]
+
+
+@pytest.fixture
+def coll():
+    rng = np.random.default_rng(0)
+    return FakeCollection({f"doc.pdf-{i}": row(rng, i) for i in range(ROWS)})
+
+
+@pytest.fixture
+def queries():
+    return np.random.default_rng(1).standard_normal((5, DIM)).astype(np.float32)
+
+
+def search(path, queries, mode="auto", k=5):
+    local = LocalCollection(path, mode)
+    local.nprobe = 1 << 30                      # IVF: probe every cluster
+    return local.query(queries, n_results=k, include=["documents", "distances"])
+
+
+def test_exact_query_matches_brute_force(coll, queries, tmp_path):
+    counts = export_local(coll, tmp_path / "local", page_size=7)
+    assert counts == {"rows": ROWS, "dim": DIM, "nlist": 0, "quantize": "none"}
+
+    res = search(tmp_path / "local", queries, "exact")
+    assert res["ids"] == brute_force(coll, queries, 5)
+    assert res["documents"][0][0] == coll.rows[res["ids"][0][0]][1]
+    for dists in res["distances"]:
+        assert dists == sorted(dists) and 0.0 <= dists[0] <= 4.0
+
+
+def test_query_with_a_stored_vector_finds_itself(coll, tmp_path):
+    export_local(coll, tmp_path / "local")
+    vec = np.asarray(coll.rows["doc.pdf-7"][0], dtype=np.float32)
+    res = search(tmp_path / "local", vec, "exact", k=1)
+    assert res["ids"] == [["doc.pdf-7"]]
+    assert res["distances"][0][0] == pytest.approx(0.0, abs=1e-3)
+
+
+def test_ivf_query_probing_every_cluster_is_exact(coll, queries, tmp_path):
+    counts = export_local(coll, tmp_path / "local", nlist=4)
+    assert counts["nlist"] == 4
+    assert LocalCollection(tmp_path / "local").mode == "ivf"
+    assert search(tmp_path / "local", queries)["ids"] == brute_force(coll, queries, 5)
+
+
+def test_ivf_mode_needs_an_ivf_export(coll, tmp_path):
+    export_local(coll, tmp_path / "local")
+    with pytest.raises(ValueError, match="no IVF index"):
+        LocalCollection(tmp_path / "local", "ivf")
+
+
+def test_get_by_id_skips_unknown_ids(coll, tmp_path):
+    export_local(coll, tmp_path / "local")
+    got = LocalCollection(tmp_path / "local").get(ids=["doc.pdf-3", "nope", "doc.pdf-0"])
+    assert got["ids"] == ["doc.pdf-3", "doc.pdf-0"]
+    assert got["metadatas"] == [coll.rows["doc.pdf-3"][2], coll.rows["doc.pdf-0"][2]]
+
+
+@pytest.mark.parametrize("nlist", [0, 4])
+def test_update_local_matches_a_full_export(coll, queries, tmp_path, nlist):
+    path = tmp_path / "local"
+    export_local(coll, path, nlist=nlist)
+
+    rng     = np.random.default_rng(2)
+    changed = ["doc.pdf-1", "doc.pdf-20", "doc.pdf-40", "doc.pdf-41"]  # 2 edits, 2 new
+    removed = ["doc.pdf-5", "doc.pdf-39"]
+    for cid in changed:
+        coll.rows[cid] = row(rng, cid)
+    for cid in removed:
+        del coll.rows[cid]
+
+    counts = update_local(coll, path, changed, removed)
+    assert counts == {"rows": ROWS, "dim": DIM, "nlist": nlist, "quantize": "none"}
+
+    local = LocalCollection(path)
+    ids   = sorted(coll.rows)
+    assert sorted(local.get(include=[])["ids"]) == ids
+    assert local.get(ids=removed)["ids"] == []
+    got = local.get(ids=changed, include=["documents", "metadatas"])
+    assert got["documents"] == [coll.rows[i][1] for i in changed]
+    assert got["metadatas"] == [coll.rows[i][2] for i in changed]
+    assert search(path, queries)["ids"] == brute_force(coll, queries, 5)
+
+
+def test_update_local_without_an_export_exports(coll, tmp_path):
+    counts = update_local(coll, tmp_path / "local", ["doc.pdf-0"], [])
+    assert counts["rows"] == ROWS
+
+
+@pytest.mark.parametrize("quantize", ["int8", "binary"])
+def test_quantised_query_rescores_to_exact(coll, queries, tmp_path, quantize):
+    # 40 rows < RESCORE_MIN: every row is a candidate, so rescoring is exact
+    counts = export_local(coll, tmp_path / "local", quantize=quantize)
+    assert counts["quantize"] == quantize
+    local = LocalCollection(tmp_path / "local")
+    vecs  = np.asarray(local.vectors, dtype=np.float32)
+    if quantize == "int8":
+        assert np.all(np.abs(local.codes * local.scale - vecs) <= local.scale / 2 + 1e-3)
+    else:
+        assert np.array_equal(np.unpackbits(local.codes, axis=1)[:, :DIM], vecs > 0)
+    assert search(tmp_path / "local", queries, "exact")["ids"] == brute_force(coll, queries, 5)
+
+
+def test_export_rejects_unknown_quantize(coll, tmp_path):
+    with pytest.raises(ValueError, match="quantize must be one of"):
+        export_local(coll, tmp_path / "local", quantize="int4")
+
+
+@pytest.mark.parametrize("quantize", ["int8", "binary"])
+def test_update_local_quantises_new_rows(coll, queries, tmp_path, quantize):
+    path = tmp_path / "local"
+    export_local(coll, path, quantize=quantize)
+    scale = np.load(path / "scale.npy") if quantize == "int8" else None
+
+    rng = np.random.default_rng(3)
+    coll.rows["doc.pdf-2"] = row(rng, 2)
+    del coll.rows["doc.pdf-3"]
+    counts = update_local(coll, path, ["doc.pdf-2"], ["doc.pdf-3"])
+    assert counts == {"rows": ROWS - 1, "dim": DIM, "nlist": 0, "quantize": quantize}
+
+    local = LocalCollection(path)
+    assert local.codes.shape[0] == ROWS - 1
+    if quantize == "int8":
+        assert np.array_equal(local.scale, scale)      # reused, not retrained
+    assert search(path, queries, "exact")["ids"] == brute_force(coll, queries, 5)
@@ -0,0 +1,61 @@
+"""Office-row parsing (`tools/offices.py`), as pdfplumber flattens the rows."""
+
+import pytest
+
+from offices import parse_office_line, place_name
+
+HEADER = "Office Name Address Number of Employees Revenue (USD) Services Offered"
+
+
+@pytest.mark.parametrize("line, office, street, city, region, country, employees, revenue", [
+    ("HQ 123 Main St, New York, NY 200 15M Corporate Operations, Finance",
+     "HQ", "123 Main St", "New York", "NY", "USA", 200, 15_000_000),
+    ("West Coast Hub 456 Market St, San Francisco, CA 150 12M Tech Development, Customer Support",
+     "West Coast Hub", "456 Market St", "San Francisco", "CA", "USA", 150, 12_000_000),
+    ("London Office 1 High St, London, UK 140 11M Corporate Strategy, Marketing",
+     "London Office", "1 High St", "London", "UK", "UK", 140, 11_000_000),
+    ("Tokyo Office 5-2 Ginza St, Tokyo, Japan 110 10M Product Development, Tech Support",
+     "Tokyo Office", "5-2 Ginza St", "Tokyo", "Japan", "Japan", 110, 10_000_000),
+    ("Paris Office 88 Champs-Élysées, Paris, France 95 9M Marketing, Sales",
+     "Paris Office", "88 Champs-Élysées", "Paris", "France", "France", 95, 9_000_000),
+    ("Mexico City Office 44 Reforma Ave, Mexico City, Mexico 110 6M Sales, Customer Support",
+     "Mexico City Office", "44 Reforma Ave", "Mexico City", "Mexico", "Mexico", 110, 6_000_000),
+    # city-state: no region, the city is the country
+    ("Singapore Office 22 Orchard Rd, Singapore 100 9M Corporate Strategy, Tech Development",
+     "Singapore Office", "22 Orchard Rd", "Singapore", "", "Singapore", 100, 9_000_000),
+    # overlapping cells: the employee count is interleaved into the region
+    ("Cape Town Office 12 Table Mountain St, Cape Town, South Afr7ic0a 5M Customer Support, Sales",
+     "Cape Town Office", "12 Table Mountain St", "Cape Town", "South Africa", "South Africa",
+     70, 5_000_000),
+    # fractional revenue
+    ("Lab 7 Quay Rd, Oslo, Norway 12 1.5B Research",
+     "Lab", "7 Quay Rd", "Oslo", "Norway", "Norway", 12, 1_500_000_000),
+])
+def test_office_rows(line, office, street, city, region, country, employees, revenue):
+    row = parse_office_line(line)
+    assert row is not None
+    assert (row["office"], row["street"], row["city"], row["region"], row["country"],
+            row["employees"], row["revenue_usd"]) == (
+        office, street, city, region, country, employees, revenue)
+
+
+def test_services_and_place_name():
+    row = parse_office_line("HQ 123 Main St, New York, NY 200 15M Corporate Operations, Finance")
+    assert row["services"] == "Corporate Operations, Finance"
+    assert place_name(row) == "New York, NY"
+    singapore = parse_office_line("Singapore Office 22 Orchard Rd, Singapore 100 9M Tech")
+    assert place_name(singapore) == "Singapore"
+
+
+@pytest.mark.parametrize("line", [
+    HEADER,
+    "",
+    "   ",
+    "All offices are open Monday to Friday.",
+    "Headcount grew 12% to 2000 employees in 2023.",
+    "HQ 123 Main St, New York, NY 200 Corporate Operations",     # no revenue
+    "HQ Main St, New York, NY 200 15M Corporate Operations",     # no street number
+    "123 Main St, New York, NY 200 15M",                         # no office, no services
+])
+def test_non_rows_are_rejected(line):
+    assert parse_office_line(line) is None
@@ -0,0 +1,176 @@
+"""
+Retry / back-off, circuit breaker and request coalescing of the MCP
+weather server (`extra/lab3-server.txt`), against an httpx MockTransport
+standing in for Open-Meteo.
+"""
+
+import asyncio
+import importlib.util
+from importlib.machinery import SourceFileLoader
+from pathlib import Path
+
+import httpx
+import pytest
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+
+SERVER_SRC = Path(__file__).resolve().parents[1] / "extra" / "lab3-server.txt"
+CURRENT    = {"current_weather": {"temperature": 20.0, "weathercode": 1}}
+
+
+def load_server():
+    """A fresh copy of the server module (own cache, breaker and client)."""
+    loader = SourceFileLoader("lab3_server", str(SERVER_SRC))
+    spec   = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+class Upstream:
+    """Scripted Open-Meteo: answers with `statuses` in turn, then 200s."""
+
+    def __init__(self, statuses=(), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay    = delay
+        self.calls    = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        status = self.statuses.pop(0) if self.statuses else 200
+        return httpx.Response(status, json=CURRENT if status == 200 else {})
+
+
+@pytest.fixture
+def server(monkeypatch):
+    module = load_server()
+    monkeypatch.setattr(module, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(module, "breaker", module.CircuitBreaker(threshold=2, cooldown=60))
+    return module
+
+
+def use(server, upstream: Upstream) -> None:
+    server.http = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+
+
+def test_transient_errors_are_retried_with_backoff(server, monkeypatch):
+    upstream = Upstream(statuses=[503, 429])
+    use(server, upstream)
+    server.breaker.threshold = 5
+    ceilings = []
+    monkeypatch.setattr(server.random, "uniform",
+                        lambda lo, hi: ceilings.append(hi) or 0.0)
+
+    assert asyncio.run(server.fetch_json({})) == CURRENT
+    assert upstream.calls == 3
+    assert ceilings == [0.01, 0.02]                 # BASE · 2ⁿ⁻¹ full jitter
+    assert server.breaker.state == "closed"
+
+
+def test_gives_up_after_max_retries(server):
+    upstream = Upstream(statuses=[500] * 10)
+    use(server, upstream)
+    server.breaker.threshold = 10
+
+    with pytest.raises(server.UpstreamError, match="HTTP 500"):
+        asyncio.run(server.fetch_json({}))
+    assert upstream.calls == server.MAX_RETRIES
+
+
+def test_circuit_opens_then_fails_fast_then_recovers(server):
+    upstream = Upstream(statuses=[500, 500])
+    use(server, upstream)
+
+    with pytest.raises(server.UpstreamError, match="circuit open"):
+        asyncio.run(server.fetch_json({}))
+    assert upstream.calls == 2 and server.breaker.state == "open"
+
+    with pytest.raises(server.UpstreamError, match="circuit open"):
+        asyncio.run(server.fetch_json({}))
+    assert upstream.calls == 2                      # no request while open
+
+    server.breaker.opened_at -= server.breaker.cooldown
+    assert server.breaker.state == "half-open"
+    assert asyncio.run(server.fetch_json({})) == CURRENT
+    assert upstream.calls == 3 and server.breaker.state == "closed"
+
+
+def test_rejected_requests_fail_at_once_without_tripping_the_breaker(server):
+    upstream = Upstream(statuses=[400] * 10)
+    use(server, upstream)
+
+    for _ in range(server.breaker.threshold + 1):
+        with pytest.raises(server.UpstreamError, match="rejected the request: HTTP 400"):
+            asyncio.run(server.fetch_json({}))
+    assert upstream.calls == server.breaker.threshold + 1      # one try each
+    assert server.breaker.failures == 0 and server.breaker.state == "closed"
+
+
+def test_rejected_trial_call_frees_the_half_open_slot(server):
+    upstream = Upstream(statuses=[500, 500, 400])
+    use(server, upstream)
+    with pytest.raises(server.UpstreamError):
+        asyncio.run(server.fetch_json({}))
+    server.breaker.opened_at -= server.breaker.cooldown
+
+    with pytest.raises(server.UpstreamError, match="HTTP 400"):
+        asyncio.run(server.fetch_json({}))
+    assert server.breaker.state == "half-open"
+    assert asyncio.run(server.fetch_json({})) == CURRENT       # next trial allowed
+    assert server.breaker.state == "closed"
+
+
+@pytest.mark.parametrize("tool, args", [
+    ("get_weather",      {"lat": 200, "lon": 0}),
+    ("get_weather",      {"lat": 0, "lon": -181}),
+    ("get_weather_many", {"locations": [{"lat": 48.8, "lon": 2.3},
+                                        {"lat": -91, "lon": 0}]}),
+])
+def test_out_of_range_coordinates_never_reach_upstream(server, tool, args):
+    upstream = Upstream()
+    use(server, upstream)
+
+    async def main():
+        async with Client(server.mcp) as client:
+            await client.call_tool(tool, args)
+
+    with pytest.raises(ToolError, match="lat must be in"):
+        asyncio.run(main())
+    assert upstream.calls == 0 and server.breaker.failures == 0
+
+
+def test_concurrent_calls_for_one_cell_share_a_request(server):
+    upstream = Upstream(delay=0.05)
+    use(server, upstream)
+    cell = server.grid_cell(48.85, 2.35)
+
+    async def main():
+        return await asyncio.gather(*(
+            server.weather_cache.get_or_fetch(cell, lambda: server.fetch_weather(cell))
+            for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert upstream.calls == 1
+    assert all(r["conditions"] == "Mainly clear" for r in results)
+    assert server.weather_cache.stats()["coalesced"] == 4
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch(server):
+    upstream = Upstream(delay=0.05)
+    use(server, upstream)
+    cell = server.grid_cell(51.5, -0.12)
+
+    async def main():
+        fetch  = lambda: server.fetch_weather(cell)
+        leader = asyncio.ensure_future(server.weather_cache.get_or_fetch(cell, fetch))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(server.weather_cache.get_or_fetch(cell, fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main())["temperature"] == 20.0
+    assert upstream.calls == 1
+    assert server.weather_cache.peek(cell) is not None
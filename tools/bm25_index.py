@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+bm25_index.py
+────────────────────────────────────────────────────────────────────
+Lexical (BM25) inverted index over the documents of the Chroma
+collection, next to the vectors in `./chroma_db/bm25/`.  Dense MiniLM
+retrieval is weak on exact tokens – office names, street numbers,
+identifiers in code – which is exactly what BM25 is good at, so the RAG
+agents fuse both rankings (reciprocal rank fusion, `rrf_fuse`).
+
+On-disk layout (written by `sync_bm25`, called by both indexers)
+--------------------------------------------------------------------
+    terms.npy     S<n>     sorted vocabulary (ASCII)
+    ptr.npy       int64    term row → slice of the postings arrays
+    post_doc.npy  int32    postings: document row
+    post_tf.npy   uint16   postings: term frequency in that document
+    doc_len.npy   int32    document row → length in tokens
+    doc_ids.npy   S<n>     document row → Chroma ID (UTF-8)
+    meta.json              counts, avgdl, k1, b, format version
+
+Like the gazetteer, the arrays are opened with `np.load(mmap_mode="r")`:
+loading is a few page faults, and a query only touches the postings of
+its own terms.
+
+`sync_bm25` rebuilds the index from every document in the collection
+(first run, `--full`).  After an incremental run the indexers call
+`update_bm25` with the IDs they wrote and deleted instead: only those
+documents are re-tokenised, the other postings are filtered and merged
+with numpy.  Runs that changed nothing skip the index altogether.
+
+    index = BM25Index.load(Path("./chroma_db/bm25"))   # None if not built
+    hits  = index.search("Paris Office", top_k=20)      # [LexicalHit, …]
+    index.confident("Paris Office", hits)               # skip the embedder?
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import json
+import math
+import re
+import shutil
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# ─── 3rd-party ────────────────────────────────────────────────────
+import numpy as np
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+BM25_DIR       = "bm25"                         # folder inside the Chroma path
+FORMAT_VERSION = 1
+K1             = 1.2                            # term-frequency saturation
+B              = 0.75                           # length normalisation
+MAX_TERM_LEN   = 40                             # longer tokens are dropped
+PAGE_SIZE      = 5000                           # documents per coll.get()
+RRF_K          = 60                             # reciprocal-rank-fusion constant
+LEAD_RATIO     = 1.5                            # confident: top ≥ 1.5 × runner-up
+
+_WORD_RE  = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in",
+    "is", "it", "me", "of", "on", "or", "the", "to", "what", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case ASCII tokens of `text`.  Accents are folded ("Élysées" →
+    "elysees"); identifiers are kept whole *and* split into their parts
+    (`get_weather` → get_weather, get, weather; `RagAgent` → ragagent,
+    rag, agent) so code and prose queries both match.
+    """
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    out: List[str] = []
+    for word in _WORD_RE.findall(text):
+        parts = [p.lower() for chunk in word.split("_") for p in _CAMEL_RE.findall(chunk)]
+        words = [word.lower()] + (parts if len(parts) > 1 else [])
+        out.extend(tok for tok in dict.fromkeys(words)
+                   if tok not in STOPWORDS and len(tok) <= MAX_TERM_LEN)
+    return out
+
+
+class LexicalHit(NamedTuple):
+    id: str                                     # Chroma ID
+    score: float                                # BM25 score
+    matched: int                                # distinct query terms present
+
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[str]:
+    """
+    Reciprocal rank fusion: IDs ordered by Σ 1 / (k + rank) over the
+    rankings they appear in (rank starts at 1).  Ties keep first-seen
+    order.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Writer                                                       ║
+# ╚════════════════════════════════════════════════════════════════╝
+def _postings(docs: Iterable[str], first_row: int = 0
+              ) -> Tuple[List[bytes], List[int], List[int], List[int]]:
+    """Tokenise `docs`: flat (term, row, tf) postings plus each doc's length."""
+    terms: List[bytes] = []
+    rows:  List[int]   = []
+    tfs:   List[int]   = []
+    lens:  List[int]   = []
+    for row, doc in enumerate(docs, start=first_row):
+        tokens = tokenize(doc or "")
+        lens.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            terms.append(term.encode("ascii"))
+            rows.append(row)
+            tfs.append(tf)
+    return terms, rows, tfs, lens
+
+
+def _save_bm25(out_dir: Path, terms: np.ndarray, term_of: np.ndarray,
+               post_doc: np.ndarray, post_tf: np.ndarray,
+               doc_len: np.ndarray, doc_ids: np.ndarray) -> Dict[str, int]:
+    """
+    Sort postings (term row, doc row, tf) into CSR order and save them
+    with the sorted vocabulary `terms` to `out_dir`, replacing any
+    previous index.
+    """
+    order = np.lexsort((post_doc, term_of))
+    ptr   = np.zeros(len(terms) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(term_of, minlength=len(terms)))
+
+    # write next to the old index, then swap it in
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "terms.npy",    terms)
+    np.save(tmp / "ptr.npy",      ptr)
+    np.save(tmp / "post_doc.npy", np.asarray(post_doc, dtype=np.int32)[order])
+    np.save(tmp / "post_tf.npy",  np.minimum(np.asarray(post_tf, dtype=np.int64)[order],
+                                             np.iinfo(np.uint16).max).astype(np.uint16))
+    np.save(tmp / "doc_len.npy",  np.asarray(doc_len, dtype=np.int32))
+    np.save(tmp / "doc_ids.npy",  doc_ids)
+
+    counts = {"docs": len(doc_len), "terms": len(terms)}
+    avgdl  = float(np.mean(doc_len)) if len(doc_len) else 0.0
+    (tmp / "meta.json").write_text(json.dumps(
+        {"version": FORMAT_VERSION, **counts, "avgdl": avgdl, "k1": K1, "b": B},
+        indent=2))
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp.rename(out_dir)
+    return counts
+
+
+def write_bm25(ids: Sequence[str], docs: Iterable[str], out_dir: Path) -> Dict[str, int]:
+    """
+    Tokenise `docs` (row i ↔ `ids[i]`) and save the inverted index to
+    `out_dir`, replacing any previous one.  Returns doc/term counts.
+    """
+    terms, rows, tfs, lens = _postings(docs)
+    vocab = np.unique(np.asarray(terms, dtype=bytes))
+    return _save_bm25(out_dir, vocab,
+                      np.searchsorted(vocab, np.asarray(terms, dtype=bytes)),
+                      np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.int64),
+                      np.asarray(lens, dtype=np.int32),
+                      np.asarray([i.encode("utf-8") for i in ids], dtype=bytes))
+
+
+def sync_bm25(coll, out_dir: Path, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """Rebuild the index at `out_dir` from every document in `coll`."""
+    ids:  List[str] = []
+    docs: List[str] = []
+    offset = 0
+    while True:
+        page = coll.get(include=["documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        docs.extend(page["documents"])
+        offset += len(page["ids"])
+    return write_bm25(ids, docs, out_dir)
+
+
+def update_bm25(coll, out_dir: Path, changed: Iterable[str], removed: Iterable[str],
+                page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """
+    Apply one indexer run to the index at `out_dir`: drop the rows of
+    the `changed` and `removed` IDs, then tokenise the current documents
+    of `changed` and append them.  Nothing else is re-tokenised.  Falls
+    back to `sync_bm25` when there is no (current-format) index yet.
+    """
+    try:
+        old = BM25Index.load(out_dir)
+    except ValueError:
+        old = None
+    if old is None:
+        return sync_bm25(coll, out_dir, page_size)
+
+    changed = list(dict.fromkeys(changed))
+    drop    = np.asarray([i.encode("utf-8") for i in {*changed, *removed}], dtype=bytes)
+    doc_ids = np.array(old.doc_ids)
+    keep    = ~np.isin(doc_ids, drop) if drop.size else np.ones(doc_ids.size, dtype=bool)
+    new_row = np.cumsum(keep) - 1
+
+    # surviving postings, renumbered
+    old_terms = np.array(old.terms)
+    post      = np.asarray(old.post_doc)
+    live      = keep[post]
+    term_of   = np.repeat(np.arange(old_terms.size), np.diff(old.ptr))[live]
+    post_doc  = new_row[post[live]]
+    post_tf   = np.asarray(old.post_tf)[live]
+
+    # current text of the changed IDs (deleted ones are simply absent)
+    ids:  List[str] = []
+    docs: List[str] = []
+    for lo in range(0, len(changed), page_size):
+        page = coll.get(ids=changed[lo:lo + page_size], include=["documents"])
+        ids.extend(page["ids"])
+        docs.extend(page["documents"])
+    terms, rows, tfs, lens = _postings(docs, first_row=int(keep.sum()))
+    added = np.asarray(terms, dtype=bytes)
+
+    vocab = np.unique(np.concatenate([old_terms[np.unique(term_of)], added]))
+    return _save_bm25(
+        out_dir, vocab,
+        np.concatenate([np.searchsorted(vocab, old_terms)[term_of],
+                        np.searchsorted(vocab, added)]),
+        np.concatenate([post_doc, np.asarray(rows, dtype=np.int64)]),
+        np.concatenate([post_tf, np.asarray(tfs, dtype=np.int64)]),
+        np.concatenate([np.asarray(old.doc_len)[keep], np.asarray(lens, dtype=np.int32)]),
+        np.concatenate([doc_ids[keep], np.asarray([i.encode("utf-8") for i in ids], dtype=bytes)]))
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Reader                                                       ║
+# ╚════════════════════════════════════════════════════════════════╝
+class BM25Index:
+    """Memory-mapped, read-only BM25 index."""
+
+    def __init__(self, path: Path):
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: BM25 format {meta.get('version')}, "
+                             f"expected {FORMAT_VERSION}; re-run an indexer.")
+        self.path     = path
+        self.n_docs   = int(meta["docs"])
+        self.avgdl    = float(meta["avgdl"]) or 1.0
+        self.k1       = float(meta["k1"])
+        self.b        = float(meta["b"])
+        self.terms    = np.load(path / "terms.npy",    mmap_mode="r")
+        self.ptr      = np.load(path / "ptr.npy",      mmap_mode="r")
+        self.post_doc = np.load(path / "post_doc.npy", mmap_mode="r")
+        self.post_tf  = np.load(path / "post_tf.npy",  mmap_mode="r")
+        self.doc_len  = np.load(path / "doc_len.npy",  mmap_mode="r")
+        self.doc_ids  = np.load(path / "doc_ids.npy",  mmap_mode="r")
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """The index at `path`, or None if it has not been built."""
+        if not (path / "meta.json").exists():
+            return None
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def _row(self, term: str) -> Optional[int]:
+        key = term.encode("ascii")
+        i   = int(np.searchsorted(self.terms, key, side="left"))
+        if i < self.terms.size and self.terms[i] == key:
+            return i
+        return None
+
+    def search(self, query: str, top_k: int = 20) -> List[LexicalHit]:
+        """Top-`top_k` documents by BM25 score (only documents with a match)."""
+        docs:  List[np.ndarray] = []
+        gains: List[np.ndarray] = []
+        for term in dict.fromkeys(tokenize(query)):
+            row = self._row(term)
+            if row is None:
+                continue
+            lo, hi = int(self.ptr[row]), int(self.ptr[row + 1])
+            rows = np.asarray(self.post_doc[lo:hi])
+            tf   = np.asarray(self.post_tf[lo:hi], dtype=np.float32)
+            df   = hi - lo
+            idf  = math.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[rows] / self.avgdl)
+            docs.append(rows)
+            gains.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if not docs:
+            return []
+
+        uniq, inv = np.unique(np.concatenate(docs), return_inverse=True)
+        scores    = np.bincount(inv, weights=np.concatenate(gains))
+        matched   = np.bincount(inv)                # one posting per term per doc
+        k         = min(top_k, uniq.size)
+        best      = np.argpartition(-scores, k - 1)[:k]
+        best      = best[np.argsort(-scores[best], kind="stable")]
+        return [LexicalHit(bytes(self.doc_ids[uniq[i]]).decode("utf-8"),
+                           float(scores[i]), int(matched[i]))
+                for i in best]
+
+    def confident(self, query: str, hits: Sequence[LexicalHit],
+                  lead: float = LEAD_RATIO) -> bool:
+        """
+        True when the top lexical hit is clearly the answer: it contains
+        every query term and outscores the runner-up by `lead`×.  Callers
+        can then skip the embedding model.
+        """
+        n_terms = len(set(tokenize(query)))
+        if not hits or n_terms == 0 or hits[0].matched < n_terms:
+            return False
+        return len(hits) == 1 or hits[0].score >= lead * hits[1].score
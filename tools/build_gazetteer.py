@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+build_gazetteer.py
+────────────────────────────────────────────────────────────────────
+Build the offline gazetteer (`./data/gazetteer/`, see `gazetteer.py`)
+from a place dataset plus the offices listed in `./data/*.pdf`.
+
+Sources
+-------
+* **GeoNames** city dump (`--geonames cities15000.txt`, tab-separated,
+  from https://download.geonames.org/export/dump/).  Optional
+  `--countries countryInfo.txt` adds "City, Country Name" keys;
+  `--alt-names` adds every ASCII alternate name (bigger index).
+* **CSV** of extra places (`--csv places.csv`), columns
+  `name,country,lat,lon[,aliases]` with aliases separated by `;`.
+* **Offices** – every office row in the PDFs (`offices.py`).  The office
+  name ("HQ", "Paris Office") becomes an alias for its city.  Office
+  cities the datasets do not know are reported, or resolved once with
+  the online geocoder when `--online` is given.
+
+Run from the repo root, e.g.
+
+    python tools/build_gazetteer.py --geonames cities15000.txt \\
+        --countries countryInfo.txt
+"""
+
+# ───────────────────── standard-library imports ────────────────────
+import argparse
+import asyncio
+import csv
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ───────────────────── local helpers ───────────────────────────────
+from gazetteer import GAZETTEER_DIR, PlaceRecord, normalise, write_gazetteer
+from offices import place_name, read_offices
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Configuration / constants                                    ║
+# ╚════════════════════════════════════════════════════════════════╝
+PDF_DIR        = Path("./data")                # offices come from here
+MIN_POPULATION = 0                             # GeoNames rows below are skipped
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Dataset loaders                                              ║
+# ╚════════════════════════════════════════════════════════════════╝
+def load_countries(path: Path) -> Dict[str, str]:
+    """ISO-2 code → country name, from GeoNames `countryInfo.txt`."""
+    names: Dict[str, str] = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.startswith("#") or not line.strip():
+                continue
+            cols = line.rstrip("\n").split("\t")
+            names[cols[0]] = cols[4]
+    return names
+
+
+def load_geonames(path: Path,
+                  countries: Dict[str, str],
+                  alt_names: bool = False,
+                  min_population: int = MIN_POPULATION) -> Iterator[PlaceRecord]:
+    """Places from a GeoNames dump (`cities*.txt` / `allCountries.txt`)."""
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15:
+                continue
+            name, ascii_name, alternates = cols[1], cols[2], cols[3]
+            cc, admin1 = cols[8], cols[10]
+            population = int(cols[14] or 0)
+            if population < min_population:
+                continue
+
+            bases = {name, ascii_name}
+            if alt_names and alternates:
+                bases.update(a for a in alternates.split(",") if a.isascii())
+
+            quals = [cc]
+            if cc == "US" and admin1:
+                quals.append(admin1)                 # "Austin, TX"
+            if cc in countries:
+                quals.append(countries[cc])          # "Austin, United States"
+
+            names = list(bases) + [f"{b}, {q}" for b in bases for q in quals]
+            label = ", ".join(p for p in (name, admin1 if cc == "US" else "", cc) if p)
+            yield PlaceRecord(label, float(cols[4]), float(cols[5]), population, names)
+
+
+def load_csv(path: Path) -> Iterator[PlaceRecord]:
+    """Places from a `name,country,lat,lon[,aliases]` CSV (header optional)."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.reader(fh):
+            if len(row) < 4 or row[0].strip().lower() == "name":
+                continue
+            name, country = row[0].strip(), row[1].strip()
+            aliases = [a.strip() for a in row[4].split(";")] if len(row) > 4 else []
+            names = [name, f"{name}, {country}", *filter(None, aliases)]
+            yield PlaceRecord(f"{name}, {country}", float(row[2]), float(row[3]),
+                              0, names)
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Offices                                                      ║
+# ╚════════════════════════════════════════════════════════════════╝
+def resolve_local(places: List[PlaceRecord]) -> Dict[str, PlaceRecord]:
+    """Normalised key → most populous place, for resolving office cities."""
+    best: Dict[str, PlaceRecord] = {}
+    for place in places:
+        for key in {normalise(n) for n in place.names}:
+            if key not in best or best[key].population < place.population:
+                best[key] = place
+    return best
+
+
+async def resolve_online(names: List[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+    """Geocode a handful of names with the online API (build time only)."""
+    from geocoding import AsyncGeocoder
+
+    async with AsyncGeocoder() as geo:
+        coords = await asyncio.gather(*(geo.geocode(n) for n in names))
+    return dict(zip(names, coords))
+
+
+def office_places(pdf_files: List[Path],
+                  known: Dict[str, PlaceRecord],
+                  online: bool) -> Tuple[List[PlaceRecord], List[str]]:
+    """Alias records for every office; also returns unresolved offices."""
+    rows = [row for pdf in pdf_files for row in read_offices(pdf)]
+
+    resolved: Dict[str, Tuple[float, float]] = {}
+    for row in rows:
+        hit = known.get(normalise(place_name(row))) or known.get(normalise(row["city"]))
+        if hit:
+            resolved[place_name(row)] = (hit.lat, hit.lon)
+
+    missing = sorted({place_name(r) for r in rows} - set(resolved))
+    if missing and online:
+        found = asyncio.run(resolve_online(missing))
+        resolved.update({k: v for k, v in found.items() if v})
+
+    records: List[PlaceRecord] = []
+    unresolved: List[str] = []
+    for row in rows:
+        coords = resolved.get(place_name(row))
+        if coords is None:
+            unresolved.append(f"{row['office']} ({place_name(row)})")
+            continue
+        names = [row["office"], f"{row['office']}, {row['city']}",
+                 row["city"], place_name(row)]
+        records.append(PlaceRecord(f"{row['office']}, {place_name(row)}",
+                                   coords[0], coords[1], 0, names))
+    return records, unresolved
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 4.  Build                                                        ║
+# ╚════════════════════════════════════════════════════════════════╝
+def build(geonames: Optional[Path], countries: Optional[Path],
+          csv_files: List[Path], alt_names: bool, online: bool,
+          out_dir: Path = GAZETTEER_DIR) -> None:
+    started = time.perf_counter()
+    sources: List[str] = []
+    places:  List[PlaceRecord] = []
+
+    country_names = load_countries(countries) if countries else {}
+    if geonames:
+        places.extend(load_geonames(geonames, country_names, alt_names))
+        sources.append(str(geonames))
+    for path in csv_files:
+        places.extend(load_csv(path))
+        sources.append(str(path))
+
+    pdf_files = sorted(PDF_DIR.glob("*.pdf"))
+    offices, unresolved = office_places(pdf_files, resolve_local(places), online)
+    places.extend(offices)
+    sources.extend(str(p) for p in pdf_files)
+
+    counts  = write_gazetteer(places, out_dir, sources)
+    elapsed = time.perf_counter() - started
+    print(f"Gazetteer: {counts['places']} places, {counts['keys']} keys "
+          f"({len(offices)} offices) in {elapsed:.1f} s → {out_dir}")
+    if unresolved:
+        print("No coordinates for (left to the online geocoder): "
+              + "; ".join(unresolved))
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 5.  Script entry-point                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the offline gazetteer.")
+    parser.add_argument("--geonames", type=Path,
+                        help="GeoNames dump, e.g. cities15000.txt")
+    parser.add_argument("--countries", type=Path,
+                        help="GeoNames countryInfo.txt (adds country-name keys)")
+    parser.add_argument("--csv", type=Path, action="append", default=[],
+                        help="extra places: name,country,lat,lon[,aliases]")
+    parser.add_argument("--alt-names", action="store_true",
+                        help="index GeoNames alternate names too")
+    parser.add_argument("--online", action="store_true",
+                        help="geocode office cities missing from the datasets")
+    parser.add_argument("--out", type=Path, default=GAZETTEER_DIR,
+                        help=f"output folder (default {GAZETTEER_DIR})")
+    args = parser.parse_args()
+    build(args.geonames, args.countries, args.csv, args.alt_names,
+          args.online, args.out)
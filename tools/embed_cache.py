@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+embed_cache.py
+────────────────────────────────────────────────────────────────────
+Query-embedding cache for the retrieval paths (`rag_agent*.rag_search`,
+`tools/search.py`).  Users send the same few hundred phrasings over and
+over, so most `model.encode(query)` calls can be skipped.
+
+Two tiers
+---------
+* **Memory** – LRU of the most recent `max_size` query vectors.
+* **Disk** (optional) – append-only files per model in `disk_dir`:
+
+      <model>.json   {"model": ..., "dim": 384}
+      <model>.keys   one JSON-encoded query key per line
+      <model>.f32    raw float32 vectors, row i ↔ line i of .keys
+
+  Opened as a `np.memmap`, so a restart costs one read of the key file,
+  not of the vectors.  Appends are cheap; a torn last write is ignored
+  on the next load.  The tier stops growing at `disk_size` entries.
+
+Keys are the *normalised* query (stripped, single spaces, case-folded –
+the MiniLM tokenizer is uncased, so this never changes the vector).
+Each model gets its own files, so vectors from different models never
+mix.
+
+    cache = EmbeddingCache(model, "all-MiniLM-L6-v2", disk_dir=Path("./chroma_db/embed_cache"))
+    vec   = cache.encode("paris office")          # drop-in for model.encode
+    mat   = cache.encode_many(queries)            # misses in one batched encode
+    cache.stats()                                 # hits / misses / hit_rate
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+# ─── 3rd-party ────────────────────────────────────────────────────
+import numpy as np
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+CACHE_SIZE = 2048                               # vectors kept in memory
+DISK_SIZE  = 100_000                            # max vectors on disk (~150 MB)
+BATCH_SIZE = 64                                 # encode() batch for encode_many
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalise(text: str) -> str:
+    """Cache key for a query: stripped, single spaces, case-folded."""
+    return _SPACES_RE.sub(" ", text.strip()).casefold()
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Cache                                                        ║
+# ╚════════════════════════════════════════════════════════════════╝
+class EmbeddingCache:
+    """
+    Thread-safe two-tier cache in front of a SentenceTransformer.
+    `encode(text)` behaves like `model.encode(text)` for a single string.
+    """
+
+    def __init__(self, model, model_name: str,
+                 max_size: int = CACHE_SIZE,
+                 disk_dir: Optional[Path] = None,
+                 disk_size: int = DISK_SIZE):
+        self.model      = model
+        self.model_name = model_name
+        self.max_size   = max_size
+        self.disk_size  = disk_size
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock      = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+        # disk tier
+        self._disk_rows: Dict[str, int] = {}       # key → row in _disk_vecs
+        self._disk_vecs: Optional[np.ndarray] = None
+        self._appended: set = set()                 # written since start-up
+        self._on_disk   = 0                         # rows in the files
+        self._paths     = None
+        if disk_dir is not None:
+            self._open_disk(Path(disk_dir))
+
+    # ── disk tier ─────────────────────────────────────────────────
+    def _open_disk(self, disk_dir: Path) -> None:
+        slug = re.sub(r"[^\w.-]", "_", self.model_name)
+        self._paths = {ext: disk_dir / f"{slug}.{ext}" for ext in ("json", "keys", "f32")}
+        disk_dir.mkdir(parents=True, exist_ok=True)
+        if not self._paths["json"].exists():
+            return
+
+        meta = json.loads(self._paths["json"].read_text())
+        dim  = int(meta["dim"])
+        keys = self._paths["keys"].read_text(encoding="utf-8").splitlines() \
+            if self._paths["keys"].exists() else []
+        size = self._paths["f32"].stat().st_size if self._paths["f32"].exists() else 0
+        rows = min(len(keys), size // (dim * 4))   # ignore a torn last append
+        if rows:
+            self._disk_vecs = np.memmap(self._paths["f32"], dtype=np.float32,
+                                        mode="r", shape=(rows, dim))
+        for i, line in enumerate(keys[:rows]):
+            try:
+                self._disk_rows[json.loads(line)] = i
+            except ValueError:
+                break
+        self._on_disk = rows
+
+        # drop the torn tail so new appends line up again
+        if rows < len(keys) or rows * dim * 4 < size:
+            with open(self._paths["f32"], "r+b") as fh:
+                fh.truncate(rows * dim * 4)
+            self._paths["keys"].write_text(
+                "".join(line + "\n" for line in keys[:rows]), encoding="utf-8")
+
+    def _append_disk(self, keys: List[str], vecs: List[np.ndarray]) -> None:
+        """Persist new vectors, one write per file (called with the lock held)."""
+        room = self.disk_size - self._on_disk
+        if self._paths is None or room <= 0 or not keys:
+            return
+        keys, vecs = keys[:room], vecs[:room]
+        if not self._paths["json"].exists():
+            self._paths["json"].write_text(json.dumps(
+                {"model": self.model_name, "dim": int(vecs[0].shape[-1])}))
+        with open(self._paths["f32"], "ab") as fh:
+            fh.write(np.ascontiguousarray(np.stack(vecs), dtype=np.float32).tobytes())
+        with open(self._paths["keys"], "a", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(k) + "\n" for k in keys))
+        self._on_disk += len(keys)
+
+    # ── memory tier ───────────────────────────────────────────────
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_size:
+            self._mem.popitem(last=False)
+
+    def _cached(self, key: str) -> Optional[np.ndarray]:
+        """Memory, then disk; counts the hit (called with the lock held)."""
+        vec = self._mem.get(key)
+        if vec is not None:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return vec
+        row = self._disk_rows.get(key)
+        if row is not None:
+            vec = np.array(self._disk_vecs[row])
+            vec.setflags(write=False)
+            self._remember(key, vec)
+            self.disk_hits += 1
+            return vec
+        return None
+
+    def _store(self, keys: List[str], vecs: List[np.ndarray]) -> None:
+        """Remember freshly encoded vectors (called with the lock held)."""
+        new = [(k, v) for k, v in zip(keys, vecs)
+               if k not in self._disk_rows and k not in self._appended]
+        self._appended.update(k for k, _ in new)
+        self._append_disk([k for k, _ in new], [v for _, v in new])
+        for key, vec in zip(keys, vecs):
+            self._remember(key, vec)
+
+    # ── public API ────────────────────────────────────────────────
+    def encode(self, text: str) -> np.ndarray:
+        """Embedding of `text`, from cache when possible (read-only array)."""
+        key = normalise(text)
+        with self._lock:
+            vec = self._cached(key)
+            if vec is not None:
+                return vec
+            self.misses += 1
+
+        # encode outside the lock so other queries are not held up
+        vec = np.asarray(self.model.encode(key), dtype=np.float32)
+        vec.setflags(write=False)
+        with self._lock:
+            self._store([key], [vec])
+        return vec
+
+    def encode_many(self, texts: Sequence[str],
+                    batch_size: int = BATCH_SIZE) -> np.ndarray:
+        """
+        `(len(texts), dim)` matrix of embeddings.  Cached queries are
+        looked up; all distinct misses go through a single batched
+        `model.encode()` call.
+        """
+        keys  = [normalise(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vec = self._cached(key)
+                if vec is not None:
+                    found[key] = vec
+            todo = [k for k in dict.fromkeys(keys) if k not in found]
+            self.misses += len(todo)
+
+        if todo:
+            mat  = np.asarray(self.model.encode(todo, batch_size=batch_size,
+                                                convert_to_numpy=True,
+                                                show_progress_bar=False),
+                              dtype=np.float32)
+            vecs = []
+            for row in mat:
+                vec = row.copy()                    # own buffer, not a view of `mat`
+                vec.setflags(write=False)
+                vecs.append(vec)
+            with self._lock:
+                self._store(todo, vecs)
+            found.update(zip(todo, vecs))
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[k] for k in keys])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits":         self.hits,
+                "disk_hits":    self.disk_hits,
+                "misses":       self.misses,
+                "hit_rate":     (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries":      len(self._mem),
+                "disk_entries": self._on_disk,
+            }
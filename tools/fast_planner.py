@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+fast_planner.py
+────────────────────────────────────────────────────────────────────
+Rule-based planner for the TAO agents (`agent.py`, `extra/lab3-agent`).
+Most traffic is "weather in <City>", which needs no multi-second Llama
+call to plan: if the prompt can be resolved *unambiguously*, the
+planner emits the `get_weather` call itself and the LLM is only the
+fallback.
+
+Resolution order
+----------------
+1. **coords**       – exactly one valid "lat, lon" pair in the prompt.
+2. **city_state**   – "Austin, TX"       } looked up as written in the
+3. **city_country** – "Paris, France"    } offline gazetteer
+4. **place**        – "weather in/for/at <place>" or "<place> weather",
+                      exact gazetteer key (no fuzzy matching).
+
+`plan_many()` is the fan-out variant: "weather in Paris, London and
+Austin, TX" → one plan per place (path **multi**), or [] unless every
+place resolves.
+
+Anything else returns None and the caller asks the LLM.  Every decision
+is counted (`stats()`), including the LLM fallbacks, so we can see how
+much traffic the fast path absorbs.
+
+    planner = FastPlanner(Gazetteer.load())
+    plan    = planner.plan("What's the weather in Paris?")
+    if plan: print(plan.text)               # Thought / Action / Args lines
+    else:    planner.fallback()             # … and ask the LLM
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Protocol, Tuple
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Patterns                                                     ║
+# ╚════════════════════════════════════════════════════════════════╝
+COORD_RE        = re.compile(r"(?<![\w.])(-?\d{1,2}(?:\.\d+)?)\s*[,\s]\s*(-?\d{1,3}(?:\.\d+)?)(?![\w.])")
+CITY_STATE_RE   = re.compile(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+)*),\s*([A-Z]{2})\b")
+CITY_COUNTRY_RE = re.compile(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+)*),\s*([A-Z][a-z]{2,})\b")
+
+# "weather (today) in Paris", "forecast for Austin, TX", "temperature at …"
+PLACE_AFTER_RE  = re.compile(
+    r"\b(?:weather|forecast|temperature|conditions)\b[^?.!;]*?\s"
+    r"(?:in|for|at)\s+(?P<place>[^?.!;]+)", re.I)
+# "Paris weather", "Austin, TX forecast"
+PLACE_BEFORE_RE = re.compile(
+    r"^(?:(?:what(?:'s| is)|how(?:'s| is)|show me|get)\s+(?:the\s+)?)?"
+    r"(?P<place>[^?.!;]+?)\s+(?:weather|forecast)\b", re.I)
+# "compare (the weather in) Paris, London and Tokyo"
+PLACE_LIST_RE   = re.compile(
+    r"\bcompare\s+(?:the\s+)?(?:(?:weather|forecasts?|temperatures?)\s+)?"
+    r"(?:(?:in|for|at|of|between)\s+)?(?P<place>[^?.!;]+)", re.I)
+SPLIT_RE        = re.compile(r"\s*(?:,|;|&|/|\band\b|\bor\b|\bvs\.?|\bversus\b)\s*", re.I)
+# Explicit comparisons only: "compare …", "Paris vs London", "all (of) our
+# offices", "every city", "each of the locations".  "all about the Paris
+# office" or "each team at HQ" are single-place questions.
+FANOUT_RE       = re.compile(
+    r"\b(?:compare|comparing|comparison|versus|vs)\b|"
+    r"\b(?:all|every|each)\s+(?:(?:of\s+)?(?:our|the|your|company)\s+)*(?:\w+\s+)?"
+    r"(?:offices?|locations?|cities|city|sites?|branches)\b", re.I)
+TRAILING_RE     = re.compile(
+    r"(?:\s+(?:today|tonight|tomorrow|now|right now|currently|please|"
+    r"this (?:morning|afternoon|evening|week)))+\s*$", re.I)
+
+PATHS = ("coords", "city_state", "city_country", "place", "multi", "llm")
+
+
+class LocalIndex(Protocol):
+    """Offline place index (see `gazetteer.py`)."""
+
+    def exact(self, name: str): ...
+
+    def lookup(self, name: str, fuzzy: bool = False) -> Optional[Tuple[float, float]]: ...
+
+
+class Plan(NamedTuple):
+    tool: str
+    args: Dict[str, Any]
+    source: str                                 # one of PATHS, minus "llm"
+    thought: str
+    place: str = ""                             # resolved name, for summaries
+
+    @property
+    def text(self) -> str:
+        """The plan in the agents' TAO format (three lines)."""
+        return (f"Thought: {self.thought}\n"
+                f"Action: {self.tool}\n"
+                f"Args: {json.dumps(self.args)}")
+
+
+def place_phrases(prompt: str) -> List[Tuple[str, str]]:
+    """Candidate `(source, place)` names in the prompt, most specific first."""
+    out: List[Tuple[str, str]] = []
+    out += [("city_state", m.group(0)) for m in CITY_STATE_RE.finditer(prompt)]
+    out += [("city_country", m.group(0)) for m in CITY_COUNTRY_RE.finditer(prompt)]
+    for pattern in (PLACE_AFTER_RE, PLACE_BEFORE_RE, PLACE_LIST_RE):
+        m = pattern.search(prompt.strip())
+        if m:
+            place = TRAILING_RE.sub("", m.group("place")).strip(" ,'\"")
+            if place:
+                out.append(("place", place))
+    return out
+
+
+def wants_fanout(prompt: str) -> bool:
+    """
+    True if the prompt explicitly compares places ("compare", "all
+    offices", "every city" …).  Callers also fan out when `plan_many`
+    finds two or more places; anything else is a single-place question.
+    """
+    return FANOUT_RE.search(prompt) is not None
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Planner                                                      ║
+# ╚════════════════════════════════════════════════════════════════╝
+class FastPlanner:
+    """Deterministic `get_weather` planning with per-path counters."""
+
+    def __init__(self, local: Optional[LocalIndex] = None):
+        self.local  = local
+        self._paths = Counter({p: 0 for p in PATHS})
+        self._lock  = threading.Lock()
+
+    def _count(self, path: str) -> None:
+        with self._lock:
+            self._paths[path] += 1
+
+    def _coords(self, prompt: str) -> Optional[Plan]:
+        pairs = {(float(a), float(b)) for a, b in COORD_RE.findall(prompt)}
+        pairs = {(lat, lon) for lat, lon in pairs if -90 <= lat <= 90 and -180 <= lon <= 180}
+        if len(pairs) != 1:                     # none, or ambiguous
+            return None
+        lat, lon = pairs.pop()
+        return Plan("get_weather", {"lat": lat, "lon": lon}, "coords",
+                    "The prompt gives the coordinates; get the weather there.",
+                    f"{lat}, {lon}")
+
+    @staticmethod
+    def _place_plan(source: str, name: str, place) -> Plan:
+        return Plan("get_weather", {"lat": place.lat, "lon": place.lon}, source,
+                    f"{name} is {place.label}; get the weather there.", place.label)
+
+    def plan(self, prompt: str, count: bool = True) -> Optional[Plan]:
+        """
+        A `get_weather` plan, or None if the LLM has to decide.  Pass
+        `count=False` for a retry that was already counted as "llm".
+        """
+        plan = self._coords(prompt)
+        if plan is None and self.local is not None:
+            for source, name in place_phrases(prompt):
+                place = self.local.exact(name)
+                if place is not None:
+                    plan = self._place_plan(source, name, place)
+                    break
+        if plan is not None and count:
+            self._count(plan.source)
+        return plan
+
+    def plan_many(self, prompt: str, count: bool = True) -> List[Plan]:
+        """
+        One `get_weather` plan per place when the prompt names two or
+        more ("Paris, London and Austin, TX"), else [].  A "City, XX"
+        pair is kept together when the gazetteer knows it; every part
+        must resolve, or the prompt is left to the single-place paths.
+        Pass `count=False` to look without counting (as for `plan()`).
+        """
+        if self.local is None:
+            return []
+        phrases = sorted({name for _, name in place_phrases(prompt)}, key=len, reverse=True)
+        for phrase in phrases:                  # longest first: the whole list
+            parts = [p for p in SPLIT_RE.split(phrase) if p]
+            plans: List[Plan] = []
+            i = 0
+            while i < len(parts):
+                pair  = f"{parts[i]}, {parts[i + 1]}" if i + 1 < len(parts) else None
+                place = self.local.exact(pair) if pair else None
+                if place is not None:
+                    plans.append(self._place_plan("multi", pair, place))
+                    i += 2
+                    continue
+                place = self.local.exact(parts[i])
+                if place is None:
+                    break
+                plans.append(self._place_plan("multi", parts[i], place))
+                i += 1
+            else:
+                # same place twice ("Paris and Paris, FR") counts once
+                plans = list({(p.args["lat"], p.args["lon"]): p for p in plans}.values())
+                if len(plans) > 1:
+                    if count:
+                        self._count("multi")
+                    return plans
+        return []
+
+    def guess(self, prompt: str) -> Optional[Tuple[float, float]]:
+        """
+        Likely coordinates for a prompt `plan()` declined (fuzzy gazetteer
+        match): good enough to prefetch on while the LLM plans, not to
+        plan with.
+        """
+        if self.local is None:
+            return None
+        for _, name in place_phrases(prompt):
+            coords = self.local.lookup(name, fuzzy=True)
+            if coords is not None:
+                return coords
+        return None
+
+    def fallback(self) -> None:
+        """Record that the LLM planned this prompt."""
+        self._count("llm")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self._paths.values())
+            fast  = total - self._paths["llm"]
+            return {**self._paths, "fast_rate": fast / total if total else 0.0}
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+gazetteer.py
+────────────────────────────────────────────────────────────────────
+Offline place-name → coordinates index, so known cities (and our own
+offices) resolve without a network call.  The online geocoder
+(`geocoding.py`) is only asked about names this index does not know.
+
+On-disk layout (`./data/gazetteer/`, written by `build_gazetteer.py`)
+--------------------------------------------------------------------
+    keys.npy     S<n>     sorted, normalised lookup keys (ASCII)
+    key_len.npy  uint8    key → length in bytes
+    key_place.npy int32   key → place row
+    gram_codes.npy int32  sorted distinct trigram codes of the keys
+    gram_ptr.npy  int64   trigram → range in gram_keys (CSR offsets)
+    gram_keys.npy int32   key rows containing each trigram
+    coords.npy   float32  place row → (lat, lon)
+    labels.npy   S<n>     place row → "Austin, TX, US" (UTF-8)
+    meta.json             counts, sources, format version
+
+The arrays are opened with `np.load(mmap_mode="r")`, so start-up costs a
+few page faults rather than a parse, and memory is shared between
+processes.  Keys for one place include its name, ASCII name, optional
+alternate names and qualified forms ("austin, tx", "austin, us",
+"austin, united states").  When several places share a key the most
+populous one sorts first and wins.
+
+Lookups
+-------
+* exact  – binary search (`np.searchsorted`) on the sorted keys.
+* prefix – the key range `[p, p + "\\xff")`.
+* fuzzy  – opt-in.  Candidates are keys of a similar length that share
+  enough trigrams with the query (q-gram filter on the inverted index),
+  ranked by `difflib` similarity; no scan over the key range.
+
+    gaz = Gazetteer.load()            # None if the index was never built
+    gaz.lookup("Austin, TX")          # (30.2672, -97.7431)
+    gaz.lookup("Austn, TX", fuzzy=True)
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import difflib
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# ─── 3rd-party ────────────────────────────────────────────────────
+import numpy as np
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+GAZETTEER_DIR  = Path("./data/gazetteer")
+FORMAT_VERSION = 2
+MAX_KEY_LEN    = 64                             # longer keys are dropped
+FUZZY_CUTOFF   = 0.9                            # min difflib ratio
+FUZZY_SLACK    = 2                              # candidate key length ± this
+GRAM_PAD       = (b"  ", b" ")                  # trigram padding (head, tail)
+
+Coords = Tuple[float, float]
+
+_SPACES_RE = re.compile(r"\s+")
+_COMMA_RE  = re.compile(r"\s*,\s*")
+
+
+def normalise(name: str) -> str:
+    """
+    Lookup key for a place name: accents folded to ASCII, case-folded,
+    dots dropped, single spaces and ", " between parts.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = name.encode("ascii", "ignore").decode("ascii").replace(".", "")
+    name = _COMMA_RE.sub(", ", name.strip())
+    return _SPACES_RE.sub(" ", name).casefold()
+
+
+def trigram_codes(key: bytes) -> np.ndarray:
+    """Distinct padded trigrams of one key, as int32 codes (a·2¹⁶ + b·2⁸ + c)."""
+    raw = np.frombuffer(GRAM_PAD[0] + key + GRAM_PAD[1], dtype=np.uint8).astype(np.int32)
+    return np.unique((raw[:-2] << 16) | (raw[1:-1] << 8) | raw[2:])
+
+
+def _gram_index(keys: np.ndarray, lens: np.ndarray
+                ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Trigram → key rows inverted index (CSR) for sorted `keys`."""
+    head, tail = GRAM_PAD
+    width  = keys.dtype.itemsize + len(head) + len(tail)
+    padded = np.char.add(np.char.add(head, keys), tail).astype(f"S{width}")
+    raw    = padded.view(np.uint8).reshape(len(keys), width).astype(np.int32)
+    codes  = (raw[:, :-2] << 16) | (raw[:, 1:-1] << 8) | raw[:, 2:]
+    valid  = np.arange(width - 2)[None, :] < (lens.astype(np.int64)[:, None]
+                                              + len(head) + len(tail) - 2)
+    rows   = np.broadcast_to(np.arange(len(keys), dtype=np.int64)[:, None], codes.shape)
+    pairs  = np.unique((codes[valid].astype(np.int64) << 32) | rows[valid])
+    gram   = (pairs >> 32).astype(np.int32)
+    grams, counts = np.unique(gram, return_counts=True)
+    ptr    = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return grams, ptr, (pairs & 0xFFFFFFFF).astype(np.int32)
+
+
+class Place(NamedTuple):
+    label: str
+    lat: float
+    lon: float
+
+
+class PlaceRecord(NamedTuple):
+    """One place to be written: display label, coordinates, ranking and keys."""
+    label: str
+    lat: float
+    lon: float
+    population: int
+    names: Sequence[str]                        # raw names; normalised on write
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Writer                                                       ║
+# ╚════════════════════════════════════════════════════════════════╝
+def write_gazetteer(places: Iterable[PlaceRecord],
+                    out_dir: Path = GAZETTEER_DIR,
+                    sources: Sequence[str] = ()) -> Dict[str, int]:
+    """Normalise, sort and save `places`; returns place/key counts."""
+    labels: List[str] = []
+    coords: List[Coords] = []
+    keys:   List[bytes] = []
+    owner:  List[int] = []
+    rank:   List[int] = []
+
+    for record in places:
+        row = len(labels)
+        labels.append(record.label)
+        coords.append((record.lat, record.lon))
+        for key in {normalise(n) for n in record.names}:
+            raw = key.encode("ascii")
+            if raw and len(raw) <= MAX_KEY_LEN:
+                keys.append(raw)
+                owner.append(row)
+                rank.append(record.population)
+
+    # by key, then most populous first (lexsort: last key is primary)
+    keys_arr  = np.asarray(keys, dtype=bytes)
+    order     = np.lexsort((-np.asarray(rank, dtype=np.int64), keys_arr))
+    keys_arr  = keys_arr[order]
+    owner_arr = np.asarray(owner, dtype=np.int32)[order]
+    lens_arr  = np.char.str_len(keys_arr).astype(np.uint8)
+    grams, ptr, gram_keys = _gram_index(keys_arr, lens_arr)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    np.save(out_dir / "keys.npy",      keys_arr)
+    np.save(out_dir / "key_len.npy",   lens_arr)
+    np.save(out_dir / "key_place.npy", owner_arr)
+    np.save(out_dir / "gram_codes.npy", grams)
+    np.save(out_dir / "gram_ptr.npy",   ptr)
+    np.save(out_dir / "gram_keys.npy",  gram_keys)
+    np.save(out_dir / "coords.npy",    np.asarray(coords, dtype=np.float32).reshape(-1, 2))
+    np.save(out_dir / "labels.npy",    np.asarray([l.encode("utf-8") for l in labels], dtype=bytes))
+
+    counts = {"places": len(labels), "keys": int(keys_arr.size)}
+    (out_dir / "meta.json").write_text(json.dumps(
+        {"version": FORMAT_VERSION, **counts, "sources": list(sources)}, indent=2))
+    return counts
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Reader                                                       ║
+# ╚════════════════════════════════════════════════════════════════╝
+class Gazetteer:
+    """Memory-mapped, read-only view of a built gazetteer."""
+
+    def __init__(self, path: Path = GAZETTEER_DIR):
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: gazetteer format {meta.get('version')}, "
+                             f"expected {FORMAT_VERSION}; rebuild it.")
+        self.path      = path
+        self.keys      = np.load(path / "keys.npy",       mmap_mode="r")
+        self.key_len   = np.load(path / "key_len.npy",    mmap_mode="r")
+        self.key_place = np.load(path / "key_place.npy",  mmap_mode="r")
+        self.coords    = np.load(path / "coords.npy",     mmap_mode="r")
+        self.labels    = np.load(path / "labels.npy",     mmap_mode="r")
+        self.grams     = np.load(path / "gram_codes.npy", mmap_mode="r")
+        self.gram_ptr  = np.load(path / "gram_ptr.npy",   mmap_mode="r")
+        self.gram_keys = np.load(path / "gram_keys.npy",  mmap_mode="r")
+
+    @classmethod
+    def load(cls, path: Path = GAZETTEER_DIR) -> Optional["Gazetteer"]:
+        """The gazetteer at `path`, or None if it has not been built."""
+        if not (path / "meta.json").exists():
+            return None
+        return cls(path)
+
+    def __len__(self) -> int:
+        return int(self.keys.size)
+
+    # ── helpers ───────────────────────────────────────────────────
+    def _place(self, key_row: int) -> Place:
+        row = int(self.key_place[key_row])
+        lat, lon = self.coords[row]
+        return Place(bytes(self.labels[row]).decode("utf-8"),
+                     round(float(lat), 5), round(float(lon), 5))
+
+    def _range(self, lo: bytes, hi: bytes) -> Tuple[int, int]:
+        return (int(np.searchsorted(self.keys, lo, side="left")),
+                int(np.searchsorted(self.keys, hi, side="left")))
+
+    @staticmethod
+    def _key(name: str) -> bytes:
+        return normalise(name).encode("ascii")
+
+    # ── public API ────────────────────────────────────────────────
+    def exact(self, name: str) -> Optional[Place]:
+        """Most populous place whose key equals `name` (normalised)."""
+        key = self._key(name)
+        if not key:
+            return None
+        i = int(np.searchsorted(self.keys, key, side="left"))
+        if i < self.keys.size and self.keys[i] == key:
+            return self._place(i)
+        return None
+
+    def prefix(self, text: str, limit: int = 10) -> List[Place]:
+        """Places with a key starting with `text`, distinct, in key order."""
+        key = self._key(text)
+        if not key:
+            return []
+        lo, hi = self._range(key, key + b"\xff")
+        out: List[Place] = []
+        seen = set()
+        for i in range(lo, hi):
+            row = int(self.key_place[i])
+            if row not in seen:
+                seen.add(row)
+                out.append(self._place(i))
+                if len(out) >= limit:
+                    break
+        return out
+
+    def _candidates(self, key: bytes, cutoff: float) -> np.ndarray:
+        """
+        Key rows that can reach `cutoff`: a similar length, and at least
+        as many shared trigrams as survive the edits that `cutoff`
+        allows (each edit breaks at most three trigrams).
+        """
+        query  = trigram_codes(key)
+        pos    = np.searchsorted(self.grams, query)
+        inside = pos < self.grams.size
+        pos    = pos[inside][self.grams[pos[inside]] == query[inside]]
+        if pos.size == 0:
+            return pos
+        rows = np.concatenate([self.gram_keys[self.gram_ptr[p]:self.gram_ptr[p + 1]]
+                               for p in pos])
+        rows, shared = np.unique(rows, return_counts=True)
+        edits  = max(1, int(np.ceil((1.0 - cutoff) * 2 * len(key))))
+        enough = shared >= max(1, query.size - 3 * edits)
+        near   = np.abs(self.key_len[rows].astype(np.int32) - len(key)) <= FUZZY_SLACK
+        return rows[enough & near]
+
+    def fuzzy(self, text: str, limit: int = 5,
+              cutoff: float = FUZZY_CUTOFF) -> List[Place]:
+        """
+        Closest keys to `text` by `difflib` ratio (≥ `cutoff`), among the
+        trigram-filtered candidates (`_candidates`).
+        """
+        key = self._key(text)
+        if not key:
+            return []
+        near = self._candidates(key, cutoff)
+        if near.size == 0:
+            return []
+
+        words   = key.decode("ascii")
+        matcher = difflib.SequenceMatcher(b=words)
+        scored  = []
+        for i in near:
+            matcher.set_seq1(bytes(self.keys[i]).decode("ascii"))
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((-ratio, int(i)))
+        scored.sort()
+
+        out: List[Place] = []
+        seen = set()
+        for _, i in scored:
+            row = int(self.key_place[i])
+            if row not in seen:
+                seen.add(row)
+                out.append(self._place(i))
+                if len(out) >= limit:
+                    break
+        return out
+
+    def lookup(self, name: str, fuzzy: bool = False) -> Optional[Coords]:
+        """
+        Coordinates for `name`, or None.  Tries the full name, then just
+        the part before the first comma ("City, XX" → "City"), then, if
+        `fuzzy` (opt-in: a near-miss spelling is a guess, not an
+        answer), the closest spelling of the full name.
+        """
+        place = self.exact(name)
+        if place is None and "," in name:
+            place = self.exact(name.split(",", 1)[0])
+        if place is None and fuzzy:
+            hits  = self.fuzzy(name, limit=1)
+            place = hits[0] if hits else None
+        return (place.lat, place.lon) if place else None
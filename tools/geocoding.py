@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+geocoding.py
+────────────────────────────────────────────────────────────────────
+Async, connection-pooled client for Open-Meteo's geocoding API.
+
+Why not plain `requests.get`?
+-----------------------------
+* **Non-blocking** – lookups are awaited, so the agent's event loop keeps
+  serving other prompts while a lookup is on the wire.
+* **Pooled** – one shared `httpx.AsyncClient` keeps TLS connections alive
+  between lookups.
+* **Cached** – an LRU + TTL cache keyed on the *normalised* place name
+  ("  new york,NY " == "New York, NY").  Misses ("no such place") are
+  cached too, for a shorter time.  Network errors are never cached.
+* **Coalesced** – concurrent lookups for the same name share a single
+  upstream request, run as its own task: cancelling one caller never
+  cancels (or caches a fake miss for) the others.
+* **Local first** – given an offline index (`local=`, e.g. the
+  `gazetteer.Gazetteer`), names it knows never touch the network.
+
+The upstream URL is configurable (`base_url=` or `$GEOCODE_URL`) so the
+client can be pointed at a local stand-in server in tests.
+
+    async with AsyncGeocoder() as geo:
+        coords = await geo.geocode("Austin, TX")     # (lat, lon) or None
+"""
+
+from __future__ import annotations
+
+# ────────────────────────── standard libs ───────────────────────────
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Protocol, Tuple
+
+# ────────────────────────── third-party libs ────────────────────────
+import httpx                                    # ships with fastmcp
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                             ║
+# ╚══════════════════════════════════════════════════════════════════╝
+GEOCODE_URL     = os.environ.get(
+    "GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+CACHE_SIZE      = 4096                          # distinct names remembered
+CACHE_TTL       = 24 * 3600                     # s – found places
+NEGATIVE_TTL    = 10 * 60                       # s – "no such place"
+REQUEST_TIMEOUT = 10.0                          # s per upstream call
+MAX_CONNECTIONS = 20                            # pooled sockets
+
+Coords = Tuple[float, float]
+
+_SPACES_RE = re.compile(r"\s+")
+_COMMA_RE  = re.compile(r"\s*,\s*")
+
+
+class LocalIndex(Protocol):
+    """Anything that can resolve a name offline (see `gazetteer.py`)."""
+
+    def lookup(self, name: str) -> Optional[Coords]: ...
+
+
+def normalise(name: str) -> str:
+    """Cache key for a place name: case-folded, single spaces, ", " commas."""
+    name = _COMMA_RE.sub(", ", name.strip())
+    return _SPACES_RE.sub(" ", name).casefold()
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 2.  LRU + TTL cache                                                ║
+# ╚══════════════════════════════════════════════════════════════════╝
+class TTLCache:
+    """Small LRU cache whose entries also expire after a per-entry TTL."""
+
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, object]:
+        """Return `(found, value)`; expired entries count as not found."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: object, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# ╔══════════════════════════════════════════════════════════════════╗
+# 3.  Async geocoder                                                 ║
+# ╚══════════════════════════════════════════════════════════════════╝
+class _UpstreamError(Exception):
+    """Transient failure talking to the geocoding API (not cacheable)."""
+
+
+class AsyncGeocoder:
+    """
+    Async geocoder with a pooled HTTP client, LRU+TTL cache (including
+    negative results) and per-name request coalescing, behind an optional
+    offline `local` index.  Use it as an async context manager, or call
+    `aclose()` when done.
+    """
+
+    def __init__(self,
+                 base_url: str = GEOCODE_URL,
+                 *,
+                 max_size: int = CACHE_SIZE,
+                 ttl: float = CACHE_TTL,
+                 negative_ttl: float = NEGATIVE_TTL,
+                 timeout: float = REQUEST_TIMEOUT,
+                 client: Optional[httpx.AsyncClient] = None,
+                 local: Optional[LocalIndex] = None):
+        self.base_url     = base_url
+        self.local        = local
+        self.ttl          = ttl
+        self.negative_ttl = negative_ttl
+        self.cache        = TTLCache(max_size)
+        self._client      = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_CONNECTIONS),
+        )
+        self._owns_client = client is None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"local": 0, "hits": 0, "misses": 0, "coalesced": 0,
+                      "upstream": 0, "errors": 0}
+
+    async def __aenter__(self) -> "AsyncGeocoder":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self._client.aclose()
+
+    # ── public API ────────────────────────────────────────────────
+    async def geocode(self, name: str) -> Optional[Coords]:
+        """
+        Coordinates for `name`, or None.  The local index is asked
+        first; online, if "City, XX" is unknown, retry with just "City"
+        (same rule as the original helper).
+        """
+        if self.local is not None:
+            coords = self.local.lookup(name)
+            if coords is not None:
+                self.stats["local"] += 1
+                return coords
+
+        coords = await self._cached_lookup(name)
+        if coords is None and "," in name:
+            coords = await self._cached_lookup(name.split(",", 1)[0].strip())
+        return coords
+
+    # ── cache + coalescing ────────────────────────────────────────
+    async def _cached_lookup(self, name: str) -> Optional[Coords]:
+        key = normalise(name)
+        if not key:
+            return None
+
+        found, value = self.cache.get(key)
+        if found:
+            self.stats["hits"] += 1
+            return value                                   # type: ignore[return-value]
+
+        # Someone is already asking upstream for this name → share it
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._fetch(key, name))
+            self._inflight[key] = task
+        # The lookup is its own task: a caller that gets cancelled stops
+        # waiting, but the lookup (and everyone sharing it) carries on.
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, name: str) -> Optional[Coords]:
+        """Upstream lookup for one in-flight key; caches only real answers."""
+        try:
+            coords = await self._lookup(name)
+        except _UpstreamError:
+            return None                                    # not cached
+        finally:
+            self._inflight.pop(key, None)
+        self.cache.set(key, coords, self.ttl if coords else self.negative_ttl)
+        return coords
+
+    # ── upstream call ─────────────────────────────────────────────
+    async def _lookup(self, name: str) -> Optional[Coords]:
+        """One upstream request; raises `_UpstreamError` on failures."""
+        self.stats["upstream"] += 1
+        try:
+            r = await self._client.get(self.base_url,
+                                       params={"name": name, "count": 1})
+            r.raise_for_status()
+            data = r.json()
+        except (httpx.HTTPError, ValueError) as err:
+            self.stats["errors"] += 1
+            raise _UpstreamError(str(err)) from err
+
+        if data.get("results"):
+            hit = data["results"][0]
+            return float(hit["latitude"]), float(hit["longitude"])
+        return None
@@ -2,8 +2,8 @@
 """
 index_code.py
 ────────────────────────────────────────────────────────────────────
-Create a new Chroma DB vector index and index local *.py files
-inside the repository (or whichever directory `ROOT_DIR` points to).
+Build (or incrementally refresh) a Chroma DB vector index of local *.py
+files inside the repository (or whichever directory `ROOT_DIR` points to).
 
 Design goals
 ------------
@@ -12,30 +12,53 @@ Design goals
    vectors live in the **same semantic space**.
 2. **CPU-friendly** — MiniLM is <100 MB and runs quickly without a GPU
    or Ollama server.
-3. **Line-aware chunking** — never split a line of code; try to break
-   on blank lines; guarantee ≤ 500 GPT-3.5 tokens per chunk.
+3. **Code-aware chunking** — never split a line of code; guarantee
+   ≤ 500 GPT-3.5 tokens per chunk.  The default `"ast"` mode emits one
+   chunk per top-level function / class (qualified name + line range in
+   the metadata); `"lines"` mode breaks on blank lines instead.
+4. **Incremental** — a manifest of file/chunk hashes
+   (`index_manifest.py`) means unchanged files are skipped, only chunks
+   with new text are embedded (moved chunks keep their stored vector)
+   and files that disappeared are deleted.  The manifest records the
+   chunk mode and size; if either changes, every file is re-indexed.
+   `--full` rebuilds from scratch.
+5. **Hybrid-ready** — after a run that changed the collection, the IDs
+   it wrote and deleted are applied to the BM25 index (`bm25_index.py`)
+   for lexical search and to an existing local vector export
+   (`local_index.py`); neither is rebuilt from scratch.
 
 Output
 ------
-• `./chroma_db/` — on-disk Chroma database (overwritten on each run)  
+• `./chroma_db/` — on-disk Chroma database (overwritten with `--full`)  
 • Collection name `"codebase"`  
 • One vector per code chunk, metadata keeps file path + chunk index
+  (+ `qualname`, `kind`, `start_line`, `end_line` in `"ast"` mode)
+• `./chroma_db/bm25/` — lexical (BM25) index over the same documents
 """
 
 from __future__ import annotations
 
 # ─── standard library ─────────────────────────────────────────────
+import argparse
+import ast
 import os
 import shutil
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, List, Optional, Tuple
 
 # ─── third-party ---------------------------------------------------
-from sentence_transformers import SentenceTransformer          # local embeddings
-from tiktoken import encoding_for_model                        # token counter
+from tiktoken import Encoding, encoding_for_model              # token counter
 from chromadb import PersistentClient                          # Chroma client
 from chromadb.config import Settings, DEFAULT_TENANT, DEFAULT_DATABASE
 
+# ─── local helpers -------------------------------------------------
+from bm25_index import BM25_DIR, update_bm25
+from local_index import LOCAL_DIR, QUANTIZE_MODES, export_local, update_local
+from index_manifest import (IndexManifest, apply_settings, chunk_hash,
+                            chunk_ids, delete_removed, diff_chunks,
+                            file_hash, stored_vectors)
+
 # ╔════════════════════════════════════════════════════════════════╗
 # 1.  Configuration                                                ║
 # ╚════════════════════════════════════════════════════════════════╝
@@ -44,6 +67,8 @@ CHROMA_PATH      = Path("./chroma_db")          # where vectors are stored
 COLLECTION_NAME  = "codebase"                   # logical collection name
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"           # SBERT model
 MAX_TOKENS       = 500                          # ≤500 GPT-3.5 tokens/chunk
+CHUNK_MODE       = "ast"                        # "ast" (def/class) or "lines"
+MANIFEST_NAME    = "manifest_code.json"         # file/chunk hashes (in CHROMA_PATH)
 
 # Folder names we *never* descend into
 SKIP_DIRS = {
@@ -56,13 +81,32 @@ SKIP_DIRS = {
 # ╔════════════════════════════════════════════════════════════════╗
 # 2.  Chunking helper (Python-code aware)                          ║
 # ╚════════════════════════════════════════════════════════════════╝
+@lru_cache(maxsize=None)
+def get_encoder() -> Encoding:
+    """The GPT-3.5 tokenizer, built once per process (it is not cheap)."""
+    return encoding_for_model("gpt-3.5-turbo")
+
+
+def line_token_counts(lines: List[str]) -> List[int]:
+    """
+    GPT-3.5 token count of every line (newline included), computed for
+    the whole file in one `encode_batch()` call instead of one `encode()`
+    per line.
+    """
+    if not lines:
+        return []
+    encoded = get_encoder().encode_batch([line + "\n" for line in lines])
+    return [len(tokens) for tokens in encoded]
+
+
 def chunk_python_code(code: str, max_tokens: int = MAX_TOKENS) -> Iterable[str]:
     """
     Yield contiguous code blocks (≤ `max_tokens`) **without breaking lines.**
 
     Strategy
     --------
-    1. Count GPT-3.5 tokens for *every* physical line (`tiktoken`).
+    1. Count GPT-3.5 tokens for *every* physical line up front
+       (`line_token_counts`, one batched `tiktoken` call per file).
     2. Accumulate lines until:
          • adding the next line would exceed `max_tokens`, OR
          • we hit a *blank* line and already have content (makes blocks
@@ -74,14 +118,13 @@ def chunk_python_code(code: str, max_tokens: int = MAX_TOKENS) -> Iterable[str]:
     Iterable[str]
         Each yielded string is a code chunk ready for embedding.
     """
-    enc = encoding_for_model("gpt-3.5-turbo")
+    lines  = code.splitlines()
+    counts = line_token_counts(lines)
 
     current_lines: List[str] = []
     token_count = 0
 
-    for line in code.splitlines():
-        line_tokens = len(enc.encode(line + "\n"))
-
+    for line, line_tokens in zip(lines, counts):
         # Hard break: next line would overflow token budget
         if current_lines and token_count + line_tokens > max_tokens:
             yield "\n".join(current_lines)
@@ -100,7 +143,116 @@ def chunk_python_code(code: str, max_tokens: int = MAX_TOKENS) -> Iterable[str]:
         yield "\n".join(current_lines)
 
 # ╔════════════════════════════════════════════════════════════════╗
-# 3.  Fresh-DB helper                                              ║
+# 3.  AST chunking (one chunk per top-level function / class)      ║
+# ╚════════════════════════════════════════════════════════════════╝
+# A segment is (qualname, kind, first line, end line, node) with 0-based,
+# half-open line numbers.
+Segment = Tuple[str, str, int, int, Optional[ast.AST]]
+
+
+def _token_ranges(counts: List[int], lo: int, hi: int,
+                  max_tokens: int) -> Iterable[Tuple[int, int]]:
+    """Split lines `[lo, hi)` into consecutive ranges of ≤ `max_tokens`."""
+    start, total = lo, 0
+    for i in range(lo, hi):
+        if i > start and total + counts[i] > max_tokens:
+            yield start, i
+            start, total = i, 0
+        total += counts[i]
+    if start < hi:
+        yield start, hi
+
+
+def _ast_segments(body: List[ast.stmt], prefix: str,
+                  lo: int, hi: int) -> List[Segment]:
+    """
+    Cover lines `[lo, hi)` with one segment per function/class in `body`
+    and one per run of other statements (imports, constants, …).
+    Comments and blank lines *before* a definition belong to it; lines
+    after the last statement go to the last segment.
+    """
+    owner = prefix.rstrip(".")
+    plain_name, plain_kind = (owner, "class") if owner else ("<module>", "module")
+
+    segs: List[Segment] = []
+    for node in body:
+        end = node.end_lineno or node.lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            segs.append((prefix + node.name, kind, 0, end, node))
+        elif segs and segs[-1][4] is None:            # extend plain run
+            segs[-1] = segs[-1][:3] + (end, None)
+        else:
+            segs.append((plain_name, plain_kind, 0, end, None))
+
+    if not segs:
+        return [(plain_name, plain_kind, lo, hi, None)]
+
+    # Make segments contiguous: each starts where the previous ended
+    out: List[Segment] = []
+    cursor = lo
+    for k, (name, kind, _, end, node) in enumerate(segs):
+        stop = hi if k == len(segs) - 1 else max(end, cursor)
+        out.append((name, kind, cursor, stop, node))
+        cursor = stop
+    return out
+
+
+def chunk_python_ast(code: str,
+                     max_tokens: int = MAX_TOKENS) -> Iterable[Tuple[str, dict]]:
+    """
+    Yield `(chunk, metadata)` pairs with **one chunk per top-level
+    function or class** (plus one per run of module-level statements).
+
+    * A class over `max_tokens` is split into its members
+      (`Class.method`), recursively.
+    * Anything else over `max_tokens` is split on line boundaries into
+      ≤ `max_tokens` pieces that keep the same qualified name.
+    * Files that do not parse fall back to plain token-budget splitting.
+
+    Metadata keys: `qualname`, `kind` (module / class / function),
+    `start_line`, `end_line` (1-based, inclusive).
+    """
+    lines  = code.splitlines()
+    counts = line_token_counts(lines)
+    try:
+        body = ast.parse(code).body
+    except (SyntaxError, ValueError):
+        body = []
+
+    def _emit(segments: List[Segment]) -> Iterable[Tuple[str, dict]]:
+        for name, kind, start, end, node in segments:
+            # Trim blank lines at either end (line numbers stay exact)
+            while start < end and not lines[start].strip():
+                start += 1
+            while end > start and not lines[end - 1].strip():
+                end -= 1
+            if start >= end:
+                continue
+
+            if sum(counts[start:end]) > max_tokens and isinstance(node, ast.ClassDef):
+                yield from _emit(_ast_segments(node.body, name + ".", start, end))
+                continue
+
+            for lo, hi in _token_ranges(counts, start, end, max_tokens):
+                yield "\n".join(lines[lo:hi]), {
+                    "qualname":   name,
+                    "kind":       kind,
+                    "start_line": lo + 1,
+                    "end_line":   hi,
+                }
+
+    yield from _emit(_ast_segments(body, "", 0, len(lines)))
+
+
+def chunk_file(code: str, mode: str = CHUNK_MODE) -> List[Tuple[str, dict]]:
+    """Chunk one file with the selected `mode` ("ast" or "lines")."""
+    if mode == "ast":
+        return list(chunk_python_ast(code))
+    return [(chunk, {}) for chunk in chunk_python_code(code)]
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 4.  Fresh-DB helper                                              ║
 # ╚════════════════════════════════════════════════════════════════╝
 def reset_chroma(db_path: Path) -> None:
     """
@@ -112,23 +264,34 @@ def reset_chroma(db_path: Path) -> None:
     db_path.mkdir(parents=True, exist_ok=True)
 
 # ╔════════════════════════════════════════════════════════════════╗
-# 4.  Main routine                                                 ║
+# 5.  Main routine                                                 ║
 # ╚════════════════════════════════════════════════════════════════╝
-def index_python_sources() -> None:
+def index_python_sources(full: bool = False, chunk_mode: str = CHUNK_MODE,
+                         quantize: Optional[str] = None) -> None:
     """
     Walk the directory tree under `ROOT_DIR`, embed every `.py` file,
-    and store vectors + metadata in a fresh Chroma database.
+    and store vectors + metadata in the Chroma database.
+
+    Incremental by default: unchanged files are skipped, only changed
+    chunks are re-embedded and upserted, and vectors of deleted files
+    are removed.  `full=True` wipes the DB first.  `chunk_mode` picks
+    the chunker (see `chunk_file`); when it (or `MAX_TOKENS`) differs
+    from the manifest's, the old code chunks are dropped and every file
+    is re-indexed, so the two chunkings never mix.
+    `quantize` ("none", "int8", "binary") (re-)writes the local vector
+    export (`local_index.py`) with those scan codes.
     """
     if not ROOT_DIR.exists():
         print(f"[ERROR] {ROOT_DIR.resolve()} does not exist.")
         return
 
-    # ── 1. Load embedding model (once) ────────────────────────────
-    print(f"Embedding model: {EMBED_MODEL_NAME}")
-    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+    # ── 1. Embedding model is loaded lazily (no-op runs stay fast) ─
+    embed_model = None
 
-    # ── 2. Fresh on-disk DB ───────────────────────────────────────
-    reset_chroma(CHROMA_PATH)
+    # ── 2. Fresh on-disk DB (full rebuild only) ───────────────────
+    if full:
+        reset_chroma(CHROMA_PATH)
+    manifest = IndexManifest(CHROMA_PATH / MANIFEST_NAME)
 
     # ── 3. Connect to persistent Chroma client ────────────────────
     client = PersistentClient(
@@ -140,50 +303,143 @@ def index_python_sources() -> None:
     collection = client.get_or_create_collection(COLLECTION_NAME)
 
     file_counter = 0
+    skipped      = 0
+    seen: set    = set()
+    written: set = set()                    # IDs upserted / updated this run
+    deleted: set = set()                    # IDs deleted this run
+
+    # Chunks made with another mode / size are not comparable: drop them
+    apply_settings(collection, manifest,
+                   {"chunk_mode": chunk_mode, "max_tokens": MAX_TOKENS}, deleted)
 
     # ── 4. Recursively scan .py files ─────────────────────────────
-    for root, dirs, files in os.walk(ROOT_DIR):
-        # In-place filter to stop os.walk() descending into skip folders
-        dirs[:] = [
-            d for d in dirs
-            if d not in SKIP_DIRS and not d.startswith(".")
-        ]
-
-        for name in files:
-            if not name.endswith(".py"):
-                continue
+    try:
+        for root, dirs, files in os.walk(ROOT_DIR):
+            # In-place filter to stop os.walk() descending into skip folders
+            dirs[:] = [
+                d for d in dirs
+                if d not in SKIP_DIRS and not d.startswith(".")
+            ]
 
-            file_path = Path(root) / name
+            for name in files:
+                if not name.endswith(".py"):
+                    continue
 
-            # Read file
-            try:
-                code_text = file_path.read_text(encoding="utf-8", errors="ignore")
-            except Exception as err:
-                print(f"[WARN] Could not read {file_path}: {err}")
-                continue
+                file_path = Path(root) / name
+                key = str(file_path)
+                seen.add(key)
+
+                # Read file (skip it entirely if its bytes are unchanged)
+                try:
+                    digest = file_hash(file_path)
+                    if manifest.is_unchanged(key, digest):
+                        skipped += 1
+                        continue
+                    code_text = file_path.read_text(encoding="utf-8", errors="ignore")
+                except Exception as err:
+                    print(f"[WARN] Could not read {file_path}: {err}")
+                    continue
+
+                # Chunk → diff against manifest → embed changed → upsert
+                chunks = chunk_file(code_text, chunk_mode)
+                texts  = [text for text, _ in chunks]
+                metas  = [{"path": key, "chunk_index": i, **meta}
+                          for i, (_, meta) in enumerate(chunks)]
+                hashes = [chunk_hash(text) for text in texts]
+                old    = (manifest.get(key) or {}).get("chunks", [])
+                changed, moved, stale = diff_chunks(old, hashes)
+
+                # Chunks that only moved keep their stored vector (read it
+                # before any upsert below overwrites the old ID)
+                vectors = stored_vectors(collection, key, moved.values())
+                copies  = {i: vectors[j] for i, j in moved.items() if j in vectors}
+                changed = sorted(set(changed) | (set(moved) - set(copies)))
+
+                if changed:
+                    if embed_model is None:
+                        # torch is only imported once something needs embedding
+                        from sentence_transformers import SentenceTransformer
+                        print(f"Embedding model: {EMBED_MODEL_NAME}")
+                        embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+                    vectors = embed_model.encode(
+                        [texts[i] for i in changed], convert_to_numpy=True
+                    )
+                    collection.upsert(
+                        ids        =chunk_ids(key, changed),
+                        embeddings =vectors,
+                        documents  =[texts[i] for i in changed],
+                        metadatas  =[metas[i] for i in changed],
+                    )
+                if copies:
+                    collection.upsert(
+                        ids        =chunk_ids(key, copies),
+                        embeddings =list(copies.values()),
+                        documents  =[texts[i] for i in copies],
+                        metadatas  =[metas[i] for i in copies],
+                    )
+
+                # Unchanged chunks may still have moved (line numbers):
+                # refresh their metadata without re-embedding.
+                kept = sorted(set(range(len(chunks))) - set(changed) - set(copies))
+                if kept and chunk_mode == "ast":
+                    collection.update(
+                        ids       =chunk_ids(key, kept),
+                        metadatas =[metas[i] for i in kept],
+                    )
+                    written.update(chunk_ids(key, kept))
+                if stale:
+                    collection.delete(ids=chunk_ids(key, stale))
+                    deleted.update(chunk_ids(key, stale))
+                written.update(chunk_ids(key, changed) + chunk_ids(key, copies))
+
+                manifest.update(key, digest, hashes)
+                file_counter += 1
+                print(f"Indexed {file_path} ({len(changed)}/{len(chunks)} chunks embedded, "
+                      f"{len(copies)} moved)")
 
-            # Chunk → embed → add to collection
-            for idx, chunk in enumerate(chunk_python_code(code_text)):
-                vector = embed_model.encode(chunk).tolist()
+        # ── 5. Drop vectors of files that no longer exist ─────────
+        removed = delete_removed(collection, manifest, seen, deleted)
+    finally:
+        manifest.save()
 
-                collection.add(
-                    ids        =[f"{file_path}-{idx}"],
-                    embeddings =[vector],
-                    documents  =[chunk],
-                    metadatas  =[{"path": str(file_path), "chunk_index": idx}],
-                )
+    # ── 6. Keep the lexical index in step with the collection ─────
+    #      (only the IDs this run wrote or deleted are re-applied)
+    bm25_path = CHROMA_PATH / BM25_DIR
+    if written or deleted or not (bm25_path / "meta.json").exists():
+        counts = update_bm25(collection, bm25_path, written, deleted)
+        print(f"BM25 index: {counts['docs']} docs, {counts['terms']} terms")
 
-            file_counter += 1
-            print(f"Indexed {file_path}")
+    # ── … and the local vector export, if this deployment uses one ─
+    #      (`quantize` asks for a full re-export, retraining IVF/codes)
+    local_path = CHROMA_PATH / LOCAL_DIR
+    if quantize is not None:
+        counts = export_local(collection, local_path, quantize=quantize)
+        print(f"Local index: {counts['rows']} rows exported "
+              f"(quantize {counts['quantize']})")
+    elif (written or deleted) and (local_path / "meta.json").exists():
+        counts = update_local(collection, local_path, written, deleted)
+        print(f"Local index: {counts['rows']} rows, "
+              f"{len(written)} written, {len(deleted)} deleted")
 
-    # ── 5. Done ───────────────────────────────────────────────────
+    # ── 7. Done ───────────────────────────────────────────────────
     print(
-        f"Indexing complete: {file_counter} Python files processed.\n"
-        "New vector DB saved to ./chroma_db"
+        f"Indexing complete: {file_counter} Python files (re)indexed, "
+        f"{skipped} unchanged, {removed} removed.\n"
+        "Vector DB saved to ./chroma_db"
     )
 
 # ╔════════════════════════════════════════════════════════════════╗
-# 5.  Entry point                                                  ║
+# 6.  Entry point                                                  ║
 # ╚════════════════════════════════════════════════════════════════╝
 if __name__ == "__main__":
-    index_python_sources()
+    parser = argparse.ArgumentParser(description="Index *.py files into Chroma.")
+    parser.add_argument("--full", action="store_true",
+                        help="wipe ./chroma_db and rebuild from scratch")
+    parser.add_argument("--chunk-mode", choices=("ast", "lines"), default=CHUNK_MODE,
+                        help=f"chunking strategy (default {CHUNK_MODE})")
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default=None,
+                        help="write the local vector export with int8 / binary "
+                             "scan codes (see local_index.py)")
+    args = parser.parse_args()
+    index_python_sources(full=args.full, chunk_mode=args.chunk_mode,
+                         quantize=args.quantize)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+index_manifest.py
+────────────────────────────────────────────────────────────────────
+Tiny on-disk manifest that lets the indexers re-index **incrementally**
+instead of wiping `./chroma_db/` on every run.
+
+For every indexed file we remember
+
+* the SHA-256 of the file's bytes  → unchanged files are skipped outright;
+* the SHA-256 of every chunk, in chunk order → for a changed file only
+  chunks whose text is *new to the file* are embedded.  A chunk whose text
+  was already indexed at another position (a line inserted above it) keeps
+  its stored vector: it is copied to the new ID, not re-encoded.
+
+Chunk IDs in Chroma are `<path>-<chunk index>`, so the manifest is all we
+need to work out which IDs to upsert, copy and delete.  It also keeps the
+indexer's chunking `settings`: chunk hashes from another chunker mean
+nothing, so an indexer re-indexes every file when they change.
+
+Used by `index_pdf.py` and `index_code.py`; each keeps its own manifest
+file inside the Chroma folder so a full reset also resets the manifest.
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+MANIFEST_VERSION = 1
+READ_BLOCK       = 1 << 20                      # 1 MiB per hashed read
+FETCH_PAGE       = 500                          # IDs per coll.get() of stored vectors
+
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Hash helpers                                                 ║
+# ╚════════════════════════════════════════════════════════════════╝
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file's bytes, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    """SHA-256 of one chunk's text (what actually gets embedded)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(path: str, indices: Sequence[int]) -> List[str]:
+    """Chroma IDs for the given chunk indices of `path`."""
+    return [f"{path}-{i}" for i in indices]
+
+
+def diff_chunks(old: Sequence[str], new: Sequence[str]
+                ) -> Tuple[List[int], Dict[int, int], List[int]]:
+    """
+    Compare per-chunk hashes of the previous and current version of a file.
+    Matching is by content hash, not position, so an inserted chunk does
+    not make every later one look changed.
+
+    Returns
+    -------
+    (changed, moved, stale)
+        changed – chunk indices whose text is new to the file
+                  (must be embedded + upserted);
+        moved   – new index → old index for chunks whose text was indexed
+                  at another position (copy the stored vector, see
+                  `stored_vectors`);
+        stale   – indices that existed before but not any more
+                  (must be deleted).
+    """
+    first = old_positions(old)
+    changed: List[int]     = []
+    moved:   Dict[int, int] = {}
+    for i, h in enumerate(new):
+        if i < len(old) and old[i] == h:
+            continue                            # same text, same ID
+        if h in first:
+            moved[i] = first[h]
+        else:
+            changed.append(i)
+    stale = list(range(len(new), len(old)))
+    return changed, moved, stale
+
+
+def old_positions(old: Sequence[str]) -> Dict[str, int]:
+    """Chunk hash → its first index in the previous version."""
+    first: Dict[str, int] = {}
+    for i, h in enumerate(old):
+        first.setdefault(h, i)
+    return first
+
+
+def stored_vectors(coll, path: str, indices: Iterable[int],
+                   page: int = FETCH_PAGE) -> Dict[int, Any]:
+    """
+    Embeddings currently stored for the given chunk indices of `path`
+    (index → vector), read `page` IDs per `coll.get()`.  Indices with no
+    stored vector are left out.  Read these *before* upserting over the
+    same IDs.
+    """
+    indices = sorted(set(indices))
+    out: Dict[int, Any] = {}
+    for lo in range(0, len(indices), page):
+        block = indices[lo:lo + page]
+        ids   = chunk_ids(path, block)
+        got   = coll.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(got["ids"], got["embeddings"]))
+        out.update((i, by_id[cid]) for i, cid in zip(block, ids) if cid in by_id)
+    return out
+
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Manifest                                                     ║
+# ╚════════════════════════════════════════════════════════════════╝
+class IndexManifest:
+    """
+    JSON manifest: `{"version": 1, "settings": {…},
+    "files": {path: {"hash": …, "chunks": […]}}}`.
+
+    The file is only rewritten by `save()`, atomically (temp file +
+    rename), so an interrupted run never leaves a half-written manifest.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.files: Dict[str, dict] = {}
+        self.settings: Dict[str, Any] = {}     # how the chunks were made
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("version") == MANIFEST_VERSION:
+                    self.files    = data.get("files", {})
+                    self.settings = data.get("settings", {})
+            except (OSError, ValueError) as err:
+                print(f"[WARN] Ignoring unreadable manifest {self.path}: {err}")
+
+    def get(self, path: str) -> Optional[dict]:
+        return self.files.get(path)
+
+    def is_unchanged(self, path: str, digest: str) -> bool:
+        entry = self.files.get(path)
+        return entry is not None and entry.get("hash") == digest
+
+    def update(self, path: str, digest: str, chunks: List[str]) -> None:
+        self.files[path] = {"hash": digest, "chunks": chunks}
+
+    def remove(self, path: str) -> Optional[dict]:
+        return self.files.pop(path, None)
+
+    def paths(self) -> List[str]:
+        return list(self.files)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(
+            json.dumps({"version": MANIFEST_VERSION, "settings": self.settings,
+                        "files": self.files}),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+
+def delete_removed(coll, manifest: IndexManifest, seen: set,
+                   deleted: Optional[set] = None) -> int:
+    """
+    Delete the vectors of every file that is in the manifest but was not
+    seen in the current scan, and drop it from the manifest.  The deleted
+    IDs are added to `deleted`, if given.  Returns the number of files
+    removed.
+    """
+    removed = 0
+    for path in manifest.paths():
+        if path in seen:
+            continue
+        entry = manifest.remove(path) or {}
+        ids = chunk_ids(path, range(len(entry.get("chunks", []))))
+        if ids:
+            coll.delete(ids=ids)
+            if deleted is not None:
+                deleted.update(ids)
+        print(f"Removed {path} ({len(ids)} chunks)")
+        removed += 1
+    return removed
+
+
+def apply_settings(coll, manifest: IndexManifest, settings: Dict[str, Any],
+                   deleted: Optional[set] = None) -> bool:
+    """
+    Record the indexer's chunking `settings` in the manifest.  If files
+    were indexed with different ones, delete their chunks (added to
+    `deleted`, if given) and forget them, so this run re-indexes every
+    file.  Returns True if that happened.
+    """
+    stale = manifest.settings != settings and bool(manifest.files)
+    if stale:
+        print(f"Chunking changed ({manifest.settings or 'unknown'} → {settings}); "
+              f"re-indexing every file")
+        delete_removed(coll, manifest, set(), deleted)
+    manifest.settings = dict(settings)
+    return stale
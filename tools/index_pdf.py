@@ -3,77 +3,90 @@
 """
 index_pdfs.py
 ────────────────────────────────────────────────────────────────────
-Create a **fresh** ChromaDB vector-index from the contents of every PDF
-inside `./data/`, embedding **each non-blank line** with the
-*all-MiniLM-L6-v2* Sentence-BERT model.
+Build (or incrementally refresh) a ChromaDB vector-index from the
+contents of every PDF inside `./data/`, embedding **each non-blank line**
+with the *all-MiniLM-L6-v2* Sentence-BERT model.
 
 High-level flow
 ---------------
-1. **Reset DB** – delete any existing `./chroma_db/` folder so we never mix
-   embeddings from previous runs.
-2. **Collect PDFs** – scan `./data/*.pdf`.
+1. **Reset DB** – only with `--full`: delete any existing `./chroma_db/`
+   folder so we never mix embeddings from previous runs.  Otherwise a
+   manifest of file/line hashes (`index_manifest.py`) decides what to do.
+2. **Collect PDFs** – scan `./data/*.pdf`; skip PDFs whose hash is
+   unchanged, delete vectors of PDFs that disappeared.
 3. **Extract lines** – use *pdfplumber* to pull plain text from each page,
-   split on newlines, drop blank lines.
-4. **Embed** – convert each line to a 384-dimensional vector
-   (MiniLM-L6-v2).
+   split on newlines, drop blank lines.  Runs in a process pool
+   (`pdf_extract.py`), parallel across PDFs and page ranges, streaming
+   lines to the embedding step so extraction and embedding overlap.
+4. **Embed** – convert lines to 384-dimensional vectors (MiniLM-L6-v2)
+   in batches of `BATCH_SIZE`, one `encode()` call per batch.
 5. **Store** – write `(vector, raw line, metadata)` into a persistent
-   Chroma collection called `"codebase"`.
+   Chroma collection called `"codebase"`, one bulk `upsert()` per batch.
+   Only lines whose text is new to the PDF are embedded; a line that
+   merely moved (text inserted above it) keeps its stored vector, and
+   trailing lines that vanished are deleted.
+6. **Offices** – lines that are rows of the office table (`offices.py`)
+   are parsed once, here, into structured records (office, city,
+   country, services, …) with coordinates from the offline gazetteer or,
+   failing that, the online geocoder.  The records are stored as the
+   lines' Chroma metadata and in a side table (`chroma_db/offices.json`),
+   so the RAG agent reads lat/lon straight off a hit.
+7. **Lexical index** – if anything changed, apply the written and
+   deleted IDs to the BM25 index (`bm25_index.py`, `chroma_db/bm25/`;
+   built from the whole collection the first time), so hybrid search
+   sees exactly what is in Chroma.  An existing local vector export
+   (`local_index.py`, `chroma_db/local/`) gets the same delta.
 
 After it finishes you can query the vectors with any Chroma-compatible
 client or the companion RAG script.
 """
 
 # ───────────────────── standard-library imports ────────────────────
+import argparse
+import asyncio
 import shutil
-import re
+import time
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 # ───────────────────── 3rd-party imports ───────────────────────────
-import pdfplumber                               # PDF text extractor
-from sentence_transformers import SentenceTransformer
 from chromadb import PersistentClient
 from chromadb.config import Settings, DEFAULT_TENANT, DEFAULT_DATABASE
 
+# ───────────────────── local helpers ───────────────────────────────
+from bm25_index import BM25_DIR, update_bm25
+from local_index import LOCAL_DIR, QUANTIZE_MODES, export_local, update_local
+from index_manifest import (IndexManifest, chunk_hash, chunk_ids,
+                            delete_removed, diff_chunks, file_hash,
+                            old_positions, stored_vectors)
+from offices import OFFICE_FIELDS, OfficeTable, parse_office_line, place_name
+from pdf_extract import EXTRACT_WORKERS, PAGES_PER_TASK, stream_pdf_lines
+
+# sentence-transformers (torch) is imported where the model is loaded:
+# extraction workers are *spawned* and re-import this script, and they
+# must not each pull in torch.
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 # ╔════════════════════════════════════════════════════════════════╗
 # 1.  Configuration / constants                                    ║
 # ╚════════════════════════════════════════════════════════════════╝
 PDF_DIR          = Path("./data")              # where to look for *.pdf
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"          # SBERT model on HF Hub
-CHROMA_PATH      = Path("./chroma_db")         # output folder (wiped each run)
+CHROMA_PATH      = Path("./chroma_db")         # output folder
 COLLECTION_NAME  = "codebase"                  # logical collection inside DB
+BATCH_SIZE       = 256                         # lines per encode()/upsert() call
+MANIFEST_NAME    = "manifest_pdf.json"         # file/line hashes (in CHROMA_PATH)
+OFFICES_NAME     = "offices.json"              # office side table (in CHROMA_PATH)
+
+# Chroma merges metadata on upsert()/update(); a None value deletes the key.
+# Every rewritten line carries these, so an ID that held an office row
+# before an edit keeps none of its fields or coordinates.
+NO_OFFICE = dict.fromkeys(OFFICE_FIELDS)
 
 # ╔════════════════════════════════════════════════════════════════╗
-# 2.  Regex helper: split lines & trim whitespace                  ║
+# 2.  Fresh-DB helper                                              ║
 # ╚════════════════════════════════════════════════════════════════╝
-#   • `\r?\n`  = Windows or Unix newline
-#   • `[^\S\r\n]*` = optional leading/trailing spaces or tabs
-LINE_RE = re.compile(r"[^\S\r\n]*\r?\n[^\S\r\n]*")
-
-def extract_lines(path: Path) -> List[str]:
-    """
-    Read a PDF and return *every* non-blank line, preserving order.
-
-    Parameters
-    ----------
-    path : Path
-        Full path to a .pdf file.
-
-    Returns
-    -------
-    List[str]
-        One entry per non-empty line (page order kept).
-    """
-    lines: List[str] = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text() or ""
-            for raw_line in LINE_RE.split(text):
-                line = raw_line.strip()
-                if line:                      # skip blanks
-                    lines.append(line)
-    return lines
-
 def reset_chroma(db_path: Path) -> None:
     """
     Delete any existing `db_path` directory so we always start clean.
@@ -85,22 +98,120 @@ def reset_chroma(db_path: Path) -> None:
 # ╔════════════════════════════════════════════════════════════════╗
 # 3.  Main routine                                                 ║
 # ╚════════════════════════════════════════════════════════════════╝
-def index_pdfs() -> None:
+def write_batch(coll, embed_model: "SentenceTransformer", pdf_path: Path,
+                items: List[Tuple[int, str]],
+                batch_size: int = BATCH_SIZE,
+                vectors: Optional[list] = None) -> None:
+    """
+    Embed a batch of `(chunk_index, line)` pairs in one `encode()` call
+    and write them to `coll` with a single bulk `upsert()`.  IDs stay
+    `<path>-<line number>`, so re-writing a changed line replaces it
+    (office fields included: `write_offices` sets them again on rows).
+    Pass `vectors` to write already-known embeddings (moved lines).
+    """
+    indices = [idx for idx, _ in items]
+    lines   = [line for _, line in items]
+    if vectors is None:
+        vectors = embed_model.encode(
+            lines,
+            batch_size=batch_size,
+            convert_to_numpy=True,            # one (n, 384) array, no lists
+            show_progress_bar=False,
+        )
+    coll.upsert(
+        ids        =chunk_ids(str(pdf_path), indices),
+        embeddings =vectors,
+        documents  =lines,
+        metadatas  =[{"path": str(pdf_path), "chunk_index": idx, **NO_OFFICE}
+                     for idx in indices],
+    )
+
+
+def locate_offices(rows: List[dict],
+                   online: bool = True) -> Dict[str, Tuple[float, float]]:
+    """
+    Place name → (lat, lon) for office rows: the offline gazetteer first,
+    then (unless `online` is False) the online geocoder.  Unresolved
+    names are simply missing from the result.
+    """
+    from gazetteer import Gazetteer
+    from geocoding import AsyncGeocoder
+
+    names = sorted({place_name(r) for r in rows})
+    local = Gazetteer.load()
+    if not online:
+        found = {n: local.lookup(n) if local else None for n in names}
+    else:
+        async def lookup_all():
+            async with AsyncGeocoder(local=local) as geo:
+                return await asyncio.gather(*(geo.geocode(n) for n in names))
+        found = dict(zip(names, asyncio.run(lookup_all())))
+    return {n: c for n, c in found.items() if c}
+
+
+def write_offices(coll, table: OfficeTable, pdf_key: str,
+                  rows: Dict[int, dict], online: bool = True) -> int:
+    """
+    Store the parsed office `rows` (line index → fields) of one PDF as
+    metadata of their lines and in the side table.  Unchanged lines are
+    updated too, so their metadata is always current; a row that no
+    longer geocodes loses its old lat/lon.  Returns how many rows got
+    coordinates.
+    """
+    coords  = locate_offices(list(rows.values()), online) if rows else {}
+    ids     = chunk_ids(pdf_key, list(rows))
+    records = {}
+    metas   = []
+    for cid, (idx, row) in zip(ids, rows.items()):
+        record = dict(row)
+        if place_name(row) in coords:
+            record["lat"], record["lon"] = coords[place_name(row)]
+        records[cid] = record
+        metas.append({"path": pdf_key, "chunk_index": idx, **NO_OFFICE, **record})
+
+    if ids:
+        coll.update(ids=ids, metadatas=metas)
+    table.replace(pdf_key, records)
+    return sum(1 for r in records.values() if "lat" in r)
+
+
+def index_pdfs(batch_size: int = BATCH_SIZE, full: bool = False,
+               workers: int = EXTRACT_WORKERS,
+               pages_per_task: int = PAGES_PER_TASK,
+               geocode: bool = True,
+               quantize: Optional[str] = None) -> None:
     """
     Walk `PDF_DIR`, embed every line of every PDF, and store everything
-    into a *new* ChromaDB at `CHROMA_PATH`.
+    in the ChromaDB at `CHROMA_PATH`.
+
+    By default the run is **incremental**: PDFs whose bytes are unchanged
+    since the last run are skipped, only changed lines of changed PDFs
+    are re-embedded, and vectors of deleted PDFs are removed.  Pass
+    `full=True` to wipe the DB and rebuild from scratch.
+
+    Text extraction runs in `workers` processes, `pages_per_task` pages
+    per task, while this process embeds lines as they arrive.  Lines are
+    embedded and written `batch_size` at a time; throughput in lines/sec
+    is reported at the end.
+
+    Office rows are parsed into structured metadata + the side table;
+    `geocode=False` keeps coordinate lookup to the offline gazetteer.
+
+    `quantize` ("none", "int8", "binary") (re-)writes the local vector
+    export (`local_index.py`) with those scan codes.
     """
     pdf_files = sorted(PDF_DIR.glob("*.pdf"))
     if not pdf_files:
         print(f"No PDF files found in {PDF_DIR.resolve()}")
-        return
 
-    # ── 1. Load embedding model (one-off) ─────────────────────────
-    print(f"Embedding model: {EMBED_MODEL_NAME}")
-    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+    # ── 1. Embedding model is loaded lazily (no-op runs stay fast) ─
+    embed_model = None
 
-    # ── 2. Fresh DB on disk ───────────────────────────────────────
-    reset_chroma(CHROMA_PATH)
+    # ── 2. Fresh DB on disk (full rebuild only) ───────────────────
+    if full:
+        reset_chroma(CHROMA_PATH)
+    manifest = IndexManifest(CHROMA_PATH / MANIFEST_NAME)
+    offices  = OfficeTable(CHROMA_PATH / OFFICES_NAME)
 
     # ── 3. Connect to persistent Chroma client ────────────────────
     client = PersistentClient(
@@ -111,31 +222,165 @@ def index_pdfs() -> None:
     )
     coll = client.get_or_create_collection(COLLECTION_NAME)
 
-    # ── 4. Iterate over every PDF ─────────────────────────────────
-    for pdf_path in pdf_files:
-        print(f"→ Indexing {pdf_path.name}")
-        try:
-            lines = extract_lines(pdf_path)
-        except Exception as err:
-            print(f"[WARN] Could not read {pdf_path}: {err}")
-            continue
-
-        # Embed and write each line
-        for idx, line in enumerate(lines):
-            vector = embed_model.encode(line).tolist()
-
-            coll.add(
-                ids        =[f"{pdf_path}-{idx}"],            # unique ID
-                embeddings =[vector],                         # the vector
-                documents  =[line],                           # raw text
-                metadatas  =[{"path": str(pdf_path),
-                              "chunk_index": idx}],           # extra info
-            )
-
-    print("Indexing complete — new DB stored in ./chroma_db")
+    # Chroma rejects writes above its own max batch size
+    batch_size = max(1, min(batch_size, client.get_max_batch_size()))
+
+    # ── 4. Decide which PDFs need work ────────────────────────────
+    total_lines = 0
+    started     = time.perf_counter()
+    seen        = {str(p) for p in pdf_files}
+    digests     = {str(p): file_hash(p) for p in pdf_files}
+    todo        = [p for p in pdf_files
+                   if not offices.exists            # side table missing → re-parse all
+                   or not manifest.is_unchanged(str(p), digests[str(p)])]
+    skipped     = len(pdf_files) - len(todo)
+
+    # Per-PDF state while its lines stream in from the extractors
+    old:     List[str]             = []        # previous line hashes
+    hashes:  List[str]             = []
+    pending: List[Tuple[int, str]] = []
+    copies:  List[Tuple[int, str]] = []        # moved lines, vector reused
+    source:  Dict[int, int]        = {}        # copy index → old line index
+    rows:    Dict[int, dict]       = {}        # office rows by line index
+    stored:  Dict[int, Any]        = {}        # old vectors read so far
+    first:   Dict[str, int]        = {}        # old line hash → old index
+    written: set                   = set()     # IDs upserted / updated this run
+    deleted: set                   = set()     # IDs deleted this run
+
+    def flush(pdf_path: Path) -> None:
+        nonlocal embed_model, total_lines
+        key = str(pdf_path)
+        # Before overwriting old IDs, read what this PDF may still need
+        # from them: the sources of this batch's moved lines, and the old
+        # vectors at the IDs about to be written (a later line may have
+        # moved there from here).  Only lines touched by the edit are read.
+        targets = [idx for idx, _ in copies + pending if idx < len(old)]
+        need    = {source[idx] for idx, _ in copies}
+        need   |= {i for i in targets if first.get(old[i]) == i}
+        stored.update(stored_vectors(coll, key, need - stored.keys()))
+
+        lost = [c for c in copies if source[c[0]] not in stored]
+        if lost:                                # no stored vector → embed it
+            copies[:] = [c for c in copies if source[c[0]] in stored]
+            pending.extend(lost)
+        if copies:
+            write_batch(coll, embed_model, pdf_path, copies, batch_size,
+                        vectors=[stored[source.pop(idx)] for idx, _ in copies])
+            written.update(chunk_ids(key, [idx for idx, _ in copies]))
+            copies.clear()
+        if not pending:
+            return
+        if embed_model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"Embedding model: {EMBED_MODEL_NAME}")
+            embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+        write_batch(coll, embed_model, pdf_path, pending, batch_size)
+        written.update(chunk_ids(key, [idx for idx, _ in pending]))
+        total_lines += len(pending)
+        pending.clear()
+
+    def reset() -> None:
+        for state in (old, hashes, pending, copies, source, rows, stored, first):
+            state.clear()
+
+    # ── 5. Extract (in parallel) → diff → embed changed lines ─────
+    try:
+        for pdf_path, lines, err in stream_pdf_lines(
+                todo, workers=workers, pages_per_task=pages_per_task):
+            key = str(pdf_path)
+            if not hashes and not old:         # first message for this PDF
+                old.extend((manifest.get(key) or {}).get("chunks", []))
+                first.update(old_positions(old))
+
+            if err is not None:
+                print(f"[WARN] Could not read {pdf_path}: {err}")
+                reset()
+                continue
+
+            if lines is None:                  # PDF complete
+                flush(pdf_path)
+                _, _, stale = diff_chunks(old, hashes)
+                if stale:
+                    coll.delete(ids=chunk_ids(key, stale))
+                    deleted.update(chunk_ids(key, stale))
+                located = write_offices(coll, offices, key, rows, geocode)
+                written.update(chunk_ids(key, list(rows)))
+                manifest.update(key, digests[key], list(hashes))
+                print(f"→ Indexed {pdf_path.name} ({len(hashes)} lines, "
+                      f"{len(rows)} office rows, {located} located)")
+                reset()
+                continue
+
+            # Only lines whose text is new to the PDF need an embedding;
+            # a line that moved copies its stored vector to the new ID
+            for line in lines:
+                idx = len(hashes)
+                h   = chunk_hash(line)
+                hashes.append(h)
+                if (row := parse_office_line(line)):
+                    rows[idx] = row
+                if idx < len(old) and old[idx] == h:
+                    continue
+                if h in first:
+                    copies.append((idx, line))
+                    source[idx] = first[h]
+                else:
+                    pending.append((idx, line))
+                if len(pending) + len(copies) >= batch_size:
+                    flush(pdf_path)
+
+        # ── 6. Drop vectors of PDFs that no longer exist ──────────
+        removed = delete_removed(coll, manifest, seen, deleted)
+        offices.prune(seen)
+    finally:
+        manifest.save()
+        offices.save()
+
+    # ── 7. Keep the lexical index in step with the collection ─────
+    #      (only the IDs this run wrote or deleted are re-applied)
+    bm25_path = CHROMA_PATH / BM25_DIR
+    if written or deleted or not (bm25_path / "meta.json").exists():
+        counts = update_bm25(coll, bm25_path, written, deleted)
+        print(f"BM25 index: {counts['docs']} docs, {counts['terms']} terms")
+
+    # ── … and the local vector export, if this deployment uses one ─
+    #      (`quantize` asks for a full re-export, retraining IVF/codes)
+    local_path = CHROMA_PATH / LOCAL_DIR
+    if quantize is not None:
+        counts = export_local(coll, local_path, quantize=quantize)
+        print(f"Local index: {counts['rows']} rows exported "
+              f"(quantize {counts['quantize']})")
+    elif (written or deleted) and (local_path / "meta.json").exists():
+        counts = update_local(coll, local_path, written, deleted)
+        print(f"Local index: {counts['rows']} rows, "
+              f"{len(written)} written, {len(deleted)} deleted")
+
+    elapsed = time.perf_counter() - started
+    rate    = total_lines / elapsed if elapsed > 0 else 0.0
+    print(f"Embedded {total_lines} lines in {elapsed:.1f} s "
+          f"({rate:.0f} lines/sec, batch size {batch_size}); "
+          f"{skipped} unchanged PDF(s) skipped")
+    print("Indexing complete — DB stored in ./chroma_db")
 
 # ╔════════════════════════════════════════════════════════════════╗
 # 4.  Script entry-point                                           ║
 # ╚════════════════════════════════════════════════════════════════╝
 if __name__ == "__main__":
-    index_pdfs()
+    parser = argparse.ArgumentParser(description="Index ./data/*.pdf into Chroma.")
+    parser.add_argument("--full", action="store_true",
+                        help="wipe ./chroma_db and rebuild from scratch")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"lines per embedding batch (default {BATCH_SIZE})")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help=f"extraction processes (default {EXTRACT_WORKERS})")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK,
+                        help=f"pages per extraction task (default {PAGES_PER_TASK})")
+    parser.add_argument("--no-geocode", action="store_true",
+                        help="locate offices with the offline gazetteer only")
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default=None,
+                        help="write the local vector export with int8 / binary "
+                             "scan codes (see local_index.py)")
+    args = parser.parse_args()
+    index_pdfs(batch_size=args.batch_size, full=args.full,
+               workers=args.workers, pages_per_task=args.pages_per_task,
+               geocode=not args.no_geocode, quantize=args.quantize)
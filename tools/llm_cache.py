@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+llm_cache.py
+────────────────────────────────────────────────────────────────────
+Response cache in front of a LangChain chat model (`ChatOllama`).  A
+local Llama call takes seconds; the same planning step or the same
+office/weather summary is asked for over and over.
+
+Tiers
+-----
+* **Exact** – key = SHA-256 of (model, temperature, normalised message
+  list, the caller's `facts`).  Normalising strips and collapses whitespace, so formatting
+  noise does not cause misses.
+* **Semantic** (optional, `similarity=`) – on an exact miss, the
+  non-system text is embedded with the agent's MiniLM `EmbeddingCache`
+  and compared with cached prompts of the same *scope* (model,
+  temperature, system prompt, message count and the caller's `facts`).
+  A hit needs cosine ≥ `similarity` **and** exactly the same numbers in
+  the text, so a rephrased prompt can hit but a different temperature
+  or coordinate never does.  Words that must match exactly – an office
+  or city name, the conditions – go in `facts=`: the embedding alone
+  would happily equate "Paris Office" and "Lyon Office".
+
+A reply is only stored if `validate(text)` (optional) accepts it, so a
+malformed plan is not replayed for the whole `ttl`; a cached reply that
+fails it is treated as a miss.
+
+Entries expire after a per-call `ttl`; callers tie it to how long the
+facts in the prompt stay true (e.g. the weather cache's lifetime).
+Storage is one SQLite file (stdlib, survives restarts, shared by
+processes on the host).  Concurrent identical `ainvoke()` calls share
+one LLM call.
+
+`stream()` / `astream()` yield text pieces as the model produces them
+(a hit is yielded whole) and store the joined reply once it completes.
+
+    cache = LLMCache(llm, embedder=embed_cache, similarity=0.97)
+    reply = await cache.ainvoke(messages, ttl=600)    # reply.content
+    reply = cache.invoke(messages, facts={"office": "HQ"}, validate=is_plan)
+    async for piece in cache.astream(messages): ...
+    cache.stats()
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import (Any, AsyncIterator, Callable, Dict, Iterator, List,
+                    NamedTuple, Optional, Sequence, Tuple)
+
+# ─── 3rd-party ────────────────────────────────────────────────────
+import numpy as np
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+LLM_CACHE_PATH = Path("./chroma_db/llm_cache.sqlite")
+CACHE_TTL      = 600                            # s – default entry lifetime
+MAX_ROWS       = 20_000                         # oldest entries dropped above
+PRUNE_EVERY    = 100                            # stores between clean-ups
+
+_SPACES_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class CachedReply(NamedTuple):
+    """What a cache hit returns; has `.content` like an `AIMessage`."""
+    content: str
+    tier: str                                   # "exact" or "semantic"
+
+
+def _normalise(text: str) -> str:
+    return _SPACES_RE.sub(" ", str(text).strip())
+
+
+def _role_content(msg: Any) -> Tuple[str, str]:
+    """(role, content) of a dict message or a LangChain message object."""
+    if isinstance(msg, dict):
+        return msg.get("role", ""), _normalise(msg.get("content", ""))
+    return getattr(msg, "type", type(msg).__name__), _normalise(getattr(msg, "content", msg))
+
+
+def _digest(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _accepts(validate: Optional[Callable[[str], Any]], content: str) -> bool:
+    """True if there is no validator or it accepts `content` (raising = no)."""
+    if validate is None:
+        return True
+    try:
+        return bool(validate(content))
+    except Exception:
+        return False
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Cache                                                        ║
+# ╚════════════════════════════════════════════════════════════════╝
+class LLMCache:
+    """
+    Wraps `llm.invoke` / `llm.ainvoke`.  Misses call the model and store
+    its reply's `.content`; hits return a `CachedReply`.
+    """
+
+    def __init__(self, llm, path: Path = LLM_CACHE_PATH,
+                 ttl: float = CACHE_TTL,
+                 embedder=None,
+                 similarity: Optional[float] = None,
+                 max_rows: int = MAX_ROWS):
+        self.llm         = llm
+        self.ttl         = ttl
+        self.embedder    = embedder                 # needs .encode(text) → vector
+        self.similarity  = similarity if embedder is not None else None
+        self.max_rows    = max_rows
+        self.model       = str(getattr(llm, "model", type(llm).__name__))
+        self.temperature = getattr(llm, "temperature", None)
+        self.hits = self.semantic_hits = self.misses = self.coalesced = 0
+        self._stores     = 0
+        self._lock       = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False,
+                                   isolation_level=None)   # autocommit
+        self._db.execute("PRAGMA journal_mode=WAL")        # readers never block
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key     TEXT PRIMARY KEY,
+                scope   TEXT NOT NULL,
+                prompt  TEXT NOT NULL,
+                numbers TEXT NOT NULL,
+                vec     BLOB,
+                content TEXT NOT NULL,
+                created REAL NOT NULL,
+                expires REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_scope "
+                         "ON responses (scope, expires)")
+
+    # ── keys ──────────────────────────────────────────────────────
+    def _keys(self, messages: Sequence[Any], facts: Any = None) -> Tuple[str, str, str]:
+        """(exact key, semantic scope, non-system prompt text)."""
+        pairs  = [_role_content(m) for m in messages]
+        head   = {"model": self.model, "temperature": self.temperature}
+        system = [c for r, c in pairs if r == "system"]
+        prompt = "\n".join(f"{r}: {c}" for r, c in pairs if r != "system")
+        return (_digest({**head, "messages": pairs, "facts": facts}),
+                _digest({**head, "system": system, "n": len(pairs), "facts": facts}),
+                prompt)
+
+    @staticmethod
+    def _numbers(text: str) -> str:
+        return json.dumps(sorted(_NUMBER_RE.findall(text)))
+
+    # ── lookup / store (blocking; SQLite + optional embedding) ────
+    def _lookup(self, messages: Sequence[Any], facts: Any = None,
+                validate: Optional[Callable[[str], Any]] = None
+                ) -> Tuple[str, Optional[CachedReply], Any]:
+        key, scope, prompt = self._keys(messages, facts)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT content FROM responses "
+                                   "WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        if row and _accepts(validate, row[0]):
+            with self._lock:
+                self.hits += 1
+            return key, CachedReply(row[0], "exact"), None
+
+        vec = None
+        if self.similarity is not None:
+            vec = np.asarray(self.embedder.encode(prompt), dtype=np.float32)
+            hit = self._nearest(scope, prompt, vec, now)
+            if hit is not None and _accepts(validate, hit):
+                with self._lock:
+                    self.semantic_hits += 1
+                return key, CachedReply(hit, "semantic"), vec
+        return key, None, vec
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _nearest(self, scope: str, prompt: str, vec: np.ndarray,
+                 now: float) -> Optional[str]:
+        """Content of the most similar live entry with the same numbers."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT vec, content FROM responses WHERE scope = ? AND numbers = ? "
+                "AND expires > ? AND vec IS NOT NULL",
+                (scope, self._numbers(prompt), now)).fetchall()
+        if not rows:
+            return None
+        mat  = np.stack([np.frombuffer(v, dtype=np.float32) for v, _ in rows])
+        sims = mat @ vec / (np.linalg.norm(mat, axis=1) * np.linalg.norm(vec) + 1e-12)
+        best = int(np.argmax(sims))
+        return rows[best][1] if sims[best] >= self.similarity else None
+
+    def _store(self, key: str, messages: Sequence[Any], content: str,
+               vec: Optional[np.ndarray], ttl: float, facts: Any = None,
+               validate: Optional[Callable[[str], Any]] = None) -> None:
+        if not _accepts(validate, content):
+            return                              # never replay a malformed reply
+        _, scope, prompt = self._keys(messages, facts)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, prompt, self._numbers(prompt),
+                 None if vec is None else vec.tobytes(), content, now, now + ttl))
+            self._stores += 1
+            if self._stores % PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        """Drop expired rows, then the oldest above `max_rows` (lock held)."""
+        self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+
+    # ── public API ────────────────────────────────────────────────
+    def invoke(self, messages: List[Any], ttl: Optional[float] = None,
+               facts: Any = None, validate: Optional[Callable[[str], Any]] = None):
+        """Cached `llm.invoke(messages)`; the reply has `.content`."""
+        key, hit, vec = self._lookup(messages, facts, validate)
+        if hit is not None:
+            return hit
+        self._miss()
+        reply = self.llm.invoke(messages)
+        self._store(key, messages, reply.content, vec, self.ttl if ttl is None else ttl,
+                    facts, validate)
+        return reply
+
+    async def ainvoke(self, messages: List[Any], ttl: Optional[float] = None,
+                      facts: Any = None, validate: Optional[Callable[[str], Any]] = None):
+        """
+        Cached `llm.ainvoke(messages)`.  Lookups run in a worker thread;
+        identical prompts already being generated wait for that reply.
+        """
+        key, hit, vec = await asyncio.to_thread(self._lookup, messages, facts, validate)
+        if hit is not None:
+            return hit
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+            return CachedReply((await asyncio.shield(pending)).content, "exact")
+
+        self._miss()
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            reply = await self.llm.ainvoke(messages)
+            future.set_result(reply)
+        except BaseException as err:
+            future.set_exception(err)
+            future.exception()                    # consumed: no "never retrieved" warning
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        await asyncio.to_thread(self._store, key, messages, reply.content, vec,
+                                self.ttl if ttl is None else ttl, facts, validate)
+        return reply
+
+    def stream(self, messages: List[Any], ttl: Optional[float] = None,
+               facts: Any = None,
+               validate: Optional[Callable[[str], Any]] = None) -> Iterator[str]:
+        """Cached `llm.stream(messages)`, yielding text pieces."""
+        key, hit, vec = self._lookup(messages, facts, validate)
+        if hit is not None:
+            yield hit.content
+            return
+        self._miss()
+        parts: List[str] = []
+        for chunk in self.llm.stream(messages):
+            if chunk.content:                   # skip empty keep-alive chunks
+                parts.append(chunk.content)
+                yield chunk.content
+        self._store(key, messages, "".join(parts), vec, self.ttl if ttl is None else ttl,
+                    facts, validate)
+
+    async def astream(self, messages: List[Any], ttl: Optional[float] = None,
+                      facts: Any = None,
+                      validate: Optional[Callable[[str], Any]] = None) -> AsyncIterator[str]:
+        """
+        Cached `llm.astream(messages)`, yielding text pieces.  A reply is
+        only stored if the stream ran to the end.
+        """
+        key, hit, vec = await asyncio.to_thread(self._lookup, messages, facts, validate)
+        if hit is not None:
+            yield hit.content
+            return
+        self._miss()
+        parts: List[str] = []
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:                   # skip empty keep-alive chunks
+                parts.append(chunk.content)
+                yield chunk.content
+        await asyncio.to_thread(self._store, key, messages, "".join(parts), vec,
+                                self.ttl if ttl is None else ttl, facts, validate)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses + self.coalesced
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits":          self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses":        self.misses,
+                "coalesced":     self.coalesced,
+                "hit_rate":      (self.hits + self.semantic_hits + self.coalesced) / lookups
+                             if lookups else 0.0,
+                "entries":       entries,
+            }
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,656 @@
+#!/usr/bin/env python3
+"""
+local_index.py
+────────────────────────────────────────────────────────────────────
+Read-only local vector index: an export of the Chroma collection that
+the agents can search without a Chroma client (`VECTOR_BACKEND=local`).
+Meant for read-mostly deployments: start-up is a handful of `mmap`s, and
+every worker process on the host shares the same page-cache copy.
+
+On-disk layout (`./chroma_db/local/`)
+--------------------------------------
+    vectors.npy   float16  (n, dim) L2-normalised embeddings
+    records.jsonl          one {"id", "document", "metadata"} per row
+    offsets.npy   int64    row → byte offset in records.jsonl (n + 1)
+    id_keys.npy   S<n>     sorted Chroma IDs (UTF-8) …
+    id_rows.npy   int32    … and their rows, for `get(ids=…)`
+    codes_int8.npy int8    int8 only: (n, dim) scalar codes …
+    scale.npy     float32  … per-dimension step (v ≈ code · scale)
+    codes_bin.npy uint8    binary only: (n, dim / 8) sign bits
+    centroids.npy float32  IVF only: (nlist, dim) cluster centres
+    ivf_rows.npy  int32    IVF only: rows grouped by cluster …
+    ivf_ptr.npy   int64    … cluster c owns ivf_rows[ptr[c]:ptr[c+1]]
+    meta.json              counts, dim, nlist, quantize, format version
+
+Search
+------
+* **exact** – one matrix product of the query block with the float16
+  matrix (converted block-wise to float32 for BLAS) and `argpartition`.
+* **ivf**   – k-means clusters; only the `nprobe` clusters closest to
+  the query are scored exactly.  Built with `--nlist` for large corpora.
+* **quantised** (`--quantize int8|binary`) – exact search scans the
+  int8 codes (4× smaller than float32) or the sign bits (32× smaller,
+  Hamming distance) instead of the float16 matrix, then rescores the
+  best `RESCORE_MULT × k` candidates against their float16 rows.  Only
+  those rows are paged in, so the memory that is actually scanned per
+  query shrinks accordingly.
+
+`python tools/local_index.py --report` prints recall@k against exact
+float search and the bytes per vector of every mode.
+
+`LocalCollection` answers the subset of the Chroma collection API the
+agents use (`query`, `get`, `count`, `metadata`), with Chroma's default
+"l2" distances, so `rag_search()` works unchanged on either backend.
+
+    python tools/local_index.py                 # export, exact search only
+    python tools/local_index.py --nlist 1024    # … plus an IVF index
+    python tools/local_index.py --quantize int8 # … scan int8 codes, rescore
+
+`export_local` is a full export: every row is read back from Chroma,
+k-means is retrained and the codes re-quantised.  After an incremental
+run the indexers call `update_local` with the IDs they wrote and
+deleted instead: those rows are dropped / appended, new rows join the
+nearest *existing* IVF centroid and are quantised with the existing
+int8 scale, and everything else is copied over.  Runs that changed
+nothing leave the export alone; `--quantize` (or `--nlist` here)
+forces a full export, which also retrains after large changes.
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import argparse
+import json
+import mmap
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# ─── 3rd-party ────────────────────────────────────────────────────
+import numpy as np
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Config / constants                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+LOCAL_DIR      = "local"                        # folder inside the Chroma path
+FORMAT_VERSION = 1
+PAGE_SIZE      = 5000                           # rows per coll.get() on export
+BLOCK_ROWS     = 65536                          # rows per float32 product block
+KMEANS_ITERS   = 20
+KMEANS_SAMPLE  = 100_000                        # rows used to train centroids
+NPROBE         = 8                              # IVF clusters searched per query
+QUANTIZE_MODES = ("none", "int8", "binary")
+RESCORE_MULT   = 10                             # candidates kept per result …
+RESCORE_MIN    = 100                            # … but at least this many
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalise(mat: np.ndarray) -> np.ndarray:
+    mat   = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.maximum(norms, 1e-12)
+
+
+def float_scores(vectors: np.ndarray, q: np.ndarray,
+                 rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cosine scores (rows, m) of the float16 vectors – all, or `rows` – with a query block."""
+    if rows is not None:
+        return np.asarray(vectors[rows], dtype=np.float32) @ q.T
+    out = np.empty((len(vectors), len(q)), dtype=np.float32)
+    for lo in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[lo:lo + BLOCK_ROWS], dtype=np.float32)
+        out[lo:lo + BLOCK_ROWS] = block @ q.T
+    return out
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` largest scores, best first."""
+    k    = min(k, len(scores))
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Quantisation                                                 ║
+# ╚════════════════════════════════════════════════════════════════╝
+def int8_scale(vectors: np.ndarray) -> np.ndarray:
+    """Per-dimension step so the largest |value| maps to ±127."""
+    peak = np.zeros(vectors.shape[1], dtype=np.float32)
+    for lo in range(0, len(vectors), BLOCK_ROWS):
+        block = np.abs(np.asarray(vectors[lo:lo + BLOCK_ROWS], dtype=np.float32))
+        peak  = np.maximum(peak, block.max(axis=0))
+    return np.maximum(peak, 1e-12) / 127.0
+
+
+def quantize_int8(vectors: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    vecs = np.asarray(vectors, dtype=np.float32)
+    return np.clip(np.rint(vecs / scale), -127, 127).astype(np.int8)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed 8 per byte."""
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+def int8_scores(codes: np.ndarray, scale: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Approximate dot products (rows, m) of int8 codes with a query block."""
+    qs  = (q * scale).T                         # fold the step into the query
+    out = np.empty((len(codes), len(q)), dtype=np.float32)
+    for lo in range(0, len(codes), BLOCK_ROWS):
+        out[lo:lo + BLOCK_ROWS] = np.asarray(codes[lo:lo + BLOCK_ROWS],
+                                             dtype=np.float32) @ qs
+    return out
+
+
+def binary_scores(bits: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """−Hamming distance (rows, m) between sign bits and a query block."""
+    qbits = quantize_binary(q)
+    out   = np.empty((len(bits), len(q)), dtype=np.float32)
+    for lo in range(0, len(bits), BLOCK_ROWS):
+        block = np.asarray(bits[lo:lo + BLOCK_ROWS])
+        for j, qb in enumerate(qbits):
+            out[lo:lo + BLOCK_ROWS, j] = -_POPCOUNT[block ^ qb].sum(axis=1, dtype=np.int32)
+    return out
+
+
+def _write_codes(vectors: np.ndarray, quantize: str, out_dir: Path) -> None:
+    if quantize == "int8":
+        scale = int8_scale(vectors)
+        codes = np.lib.format.open_memmap(out_dir / "codes_int8.npy", mode="w+",
+                                          dtype=np.int8, shape=vectors.shape)
+        for lo in range(0, len(vectors), BLOCK_ROWS):
+            codes[lo:lo + BLOCK_ROWS] = quantize_int8(vectors[lo:lo + BLOCK_ROWS], scale)
+        codes.flush()
+        np.save(out_dir / "scale.npy", scale)
+    elif quantize == "binary":
+        bits = np.lib.format.open_memmap(out_dir / "codes_bin.npy", mode="w+",
+                                         dtype=np.uint8,
+                                         shape=(len(vectors), (vectors.shape[1] + 7) // 8))
+        for lo in range(0, len(vectors), BLOCK_ROWS):
+            bits[lo:lo + BLOCK_ROWS] = quantize_binary(vectors[lo:lo + BLOCK_ROWS])
+        bits.flush()
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Export (Chroma → local files)                                ║
+# ╚════════════════════════════════════════════════════════════════╝
+def kmeans(vecs: np.ndarray, nlist: int, iters: int = KMEANS_ITERS,
+           seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit vectors; returns (nlist, dim) centroids."""
+    rng  = np.random.default_rng(seed)
+    cent = vecs[rng.choice(len(vecs), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(vecs @ cent.T, axis=1)
+        for c in range(nlist):
+            members = vecs[assign == c]
+            if len(members):
+                cent[c] = members.sum(axis=0)
+            else:                                   # re-seed an empty cluster
+                cent[c] = vecs[rng.integers(len(vecs))]
+        cent = _normalise(cent)
+    return cent
+
+
+def _build_ivf(vectors: np.ndarray, nlist: int, out_dir: Path) -> int:
+    """Train centroids on a sample, assign every row, save the lists."""
+    n     = len(vectors)
+    nlist = max(1, min(nlist, n))
+    rng   = np.random.default_rng(0)
+    pick  = np.sort(rng.choice(n, size=min(n, KMEANS_SAMPLE), replace=False))
+    cent  = kmeans(np.asarray(vectors[pick], dtype=np.float32), nlist)
+
+    assign = np.empty(n, dtype=np.int32)
+    for lo in range(0, n, BLOCK_ROWS):
+        block = np.asarray(vectors[lo:lo + BLOCK_ROWS], dtype=np.float32)
+        assign[lo:lo + BLOCK_ROWS] = np.argmax(block @ cent.T, axis=1)
+
+    ptr = np.zeros(nlist + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+    np.save(out_dir / "centroids.npy", cent)
+    np.save(out_dir / "ivf_rows.npy",  np.argsort(assign, kind="stable").astype(np.int32))
+    np.save(out_dir / "ivf_ptr.npy",   ptr)
+    return nlist
+
+
+def export_local(coll, out_dir: Path, nlist: Optional[int] = None,
+                 quantize: Optional[str] = None,
+                 page_size: int = PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Write every row of `coll` to `out_dir`, replacing any previous export.
+    `nlist` > 0 adds an IVF index with that many clusters; `quantize`
+    ("int8", "binary" or "none") adds scan codes.  None keeps the
+    setting of the previous export (off if there was none).
+    """
+    old = json.loads((out_dir / "meta.json").read_text()) \
+        if (out_dir / "meta.json").exists() else {}
+    nlist    = old.get("nlist", 0) if nlist is None else nlist
+    quantize = old.get("quantize", "none") if quantize is None else quantize
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"quantize must be one of {QUANTIZE_MODES}, not {quantize!r}")
+
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    total   = coll.count()
+    vectors = None
+    ids:     List[str] = []
+    offsets: List[int] = [0]
+    with open(tmp / "records.jsonl", "wb") as fh:
+        while len(ids) < total:
+            page = coll.get(include=["embeddings", "documents", "metadatas"],
+                            limit=page_size, offset=len(ids))
+            if not page["ids"]:
+                break
+            emb = _normalise(page["embeddings"])
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    tmp / "vectors.npy", mode="w+", dtype=np.float16,
+                    shape=(total, emb.shape[1]))
+            vectors[len(ids):len(ids) + len(emb)] = emb
+            for cid, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                fh.write(json.dumps({"id": cid, "document": doc, "metadata": meta},
+                                    ensure_ascii=False).encode("utf-8") + b"\n")
+                offsets.append(fh.tell())
+            ids.extend(page["ids"])
+
+    n   = len(ids)
+    dim = 0 if vectors is None else int(vectors.shape[1])
+    if vectors is None:
+        np.save(tmp / "vectors.npy", np.zeros((0, 0), dtype=np.float16))
+    else:
+        vectors.flush()
+        vectors = np.load(tmp / "vectors.npy", mmap_mode="r")[:n]
+
+    keys  = np.asarray([i.encode("utf-8") for i in ids], dtype=bytes)
+    order = np.argsort(keys, kind="stable")
+    np.save(tmp / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+    np.save(tmp / "id_keys.npy", keys[order])
+    np.save(tmp / "id_rows.npy", order.astype(np.int32))
+    if nlist and n:
+        nlist = _build_ivf(vectors, nlist, tmp)
+    else:
+        nlist = 0
+    if quantize != "none" and n:
+        _write_codes(vectors, quantize, tmp)
+    else:
+        quantize = "none"
+
+    counts = {"rows": n, "dim": dim, "nlist": nlist, "quantize": quantize}
+    (tmp / "meta.json").write_text(json.dumps(
+        {"version": FORMAT_VERSION, **counts}, indent=2))
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp.rename(out_dir)
+    return counts
+
+def _copy_rows(src: np.ndarray, rows: np.ndarray, extra: np.ndarray,
+               path: Path) -> None:
+    """Save `src[rows]` followed by `extra` to `path`, block by block."""
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=src.dtype,
+                                    shape=(len(rows) + len(extra),) + src.shape[1:])
+    for lo in range(0, len(rows), BLOCK_ROWS):
+        block = rows[lo:lo + BLOCK_ROWS]
+        out[lo:lo + len(block)] = src[block]
+    out[len(rows):] = extra
+    out.flush()
+
+
+def update_local(coll, out_dir: Path, changed: Iterable[str], removed: Iterable[str],
+                 page_size: int = PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Apply one indexer run to the export at `out_dir`: drop the rows of
+    the `changed` and `removed` IDs and append the current rows of
+    `changed`.  Centroids and the int8 scale are reused (new rows are
+    assigned / quantised with them), so nothing is retrained.  Falls
+    back to `export_local` when there is no usable export yet.
+    """
+    meta = json.loads((out_dir / "meta.json").read_text()) \
+        if (out_dir / "meta.json").exists() else {}
+    n, dim = int(meta.get("rows", 0)), int(meta.get("dim", 0))
+    if meta.get("version") != FORMAT_VERSION or not n:
+        return export_local(coll, out_dir, page_size=page_size)
+
+    changed = list(dict.fromkeys(changed))
+    ids:   List[str] = []
+    emb:   List[Any] = []
+    lines: List[bytes] = []
+    for lo in range(0, len(changed), page_size):
+        page = coll.get(ids=changed[lo:lo + page_size],
+                        include=["embeddings", "documents", "metadatas"])
+        ids.extend(page["ids"])
+        emb.extend(page["embeddings"])
+        lines += [json.dumps({"id": cid, "document": doc, "metadata": m},
+                             ensure_ascii=False).encode("utf-8") + b"\n"
+                  for cid, doc, m in zip(page["ids"], page["documents"], page["metadatas"])]
+    added = _normalise(emb).reshape(len(ids), -1) if ids else np.zeros((0, dim), np.float32)
+    if added.shape[1] != dim:                   # model changed: start over
+        return export_local(coll, out_dir, page_size=page_size)
+
+    # rows that survive, in their old order
+    id_keys = np.load(out_dir / "id_keys.npy")
+    row_ids = np.empty(n, dtype=id_keys.dtype)
+    row_ids[np.load(out_dir / "id_rows.npy")] = id_keys
+    drop = np.asarray([i.encode("utf-8") for i in {*changed, *removed}], dtype=bytes)
+    kept = np.flatnonzero(~np.isin(row_ids, drop)) if drop.size else np.arange(n)
+    if len(kept) + len(ids) == 0:
+        return export_local(coll, out_dir, page_size=page_size)
+
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    vectors = np.load(out_dir / "vectors.npy", mmap_mode="r")
+    _copy_rows(vectors, kept, added.astype(np.float16), tmp / "vectors.npy")
+
+    # records: copy the surviving byte ranges run by run, then append
+    offsets = np.load(out_dir / "offsets.npy")
+    sizes   = offsets[kept + 1] - offsets[kept]
+    breaks  = np.flatnonzero(np.diff(kept) != 1) + 1
+    with open(out_dir / "records.jsonl", "rb") as src, \
+            open(tmp / "records.jsonl", "wb") as fh:
+        for run in np.split(kept, breaks):
+            if run.size:
+                src.seek(int(offsets[run[0]]))
+                fh.write(src.read(int(offsets[run[-1] + 1] - offsets[run[0]])))
+        fh.writelines(lines)
+    np.save(tmp / "offsets.npy", np.concatenate(
+        ([0], np.cumsum(np.concatenate([sizes, [len(l) for l in lines]])))).astype(np.int64))
+
+    keys  = np.concatenate([row_ids[kept],
+                            np.asarray([i.encode("utf-8") for i in ids], dtype=bytes)])
+    order = np.argsort(keys, kind="stable")
+    np.save(tmp / "id_keys.npy", keys[order])
+    np.save(tmp / "id_rows.npy", order.astype(np.int32))
+
+    nlist = int(meta.get("nlist", 0))
+    if nlist:
+        cent   = np.load(out_dir / "centroids.npy")
+        ptr    = np.load(out_dir / "ivf_ptr.npy")
+        assign = np.empty(n, dtype=np.int32)
+        assign[np.load(out_dir / "ivf_rows.npy")] = np.repeat(np.arange(nlist), np.diff(ptr))
+        assign = np.concatenate([assign[kept], np.argmax(added @ cent.T, axis=1)])
+        ptr    = np.zeros(nlist + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        np.save(tmp / "centroids.npy", cent)
+        np.save(tmp / "ivf_rows.npy",  np.argsort(assign, kind="stable").astype(np.int32))
+        np.save(tmp / "ivf_ptr.npy",   ptr)
+
+    quantize = meta.get("quantize", "none")
+    if quantize == "int8":
+        scale = np.load(out_dir / "scale.npy")
+        _copy_rows(np.load(out_dir / "codes_int8.npy", mmap_mode="r"), kept,
+                   quantize_int8(added, scale), tmp / "codes_int8.npy")
+        np.save(tmp / "scale.npy", scale)
+    elif quantize == "binary":
+        _copy_rows(np.load(out_dir / "codes_bin.npy", mmap_mode="r"), kept,
+                   quantize_binary(added), tmp / "codes_bin.npy")
+
+    counts = {"rows": len(kept) + len(ids), "dim": dim, "nlist": nlist, "quantize": quantize}
+    (tmp / "meta.json").write_text(json.dumps(
+        {"version": FORMAT_VERSION, **counts}, indent=2))
+
+    shutil.rmtree(out_dir)
+    tmp.rename(out_dir)
+    return counts
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 4.  Reader (Chroma-compatible subset)                            ║
+# ╚════════════════════════════════════════════════════════════════╝
+class LocalCollection:
+    """
+    Memory-mapped, read-only stand-in for a Chroma collection.
+
+    `mode` is "exact", "ivf" or "auto" (IVF when the export has one).
+    """
+
+    metadata = {"hnsw:space": "l2"}
+
+    def __init__(self, path: Path, mode: str = "auto", nprobe: int = NPROBE):
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: local index format {meta.get('version')}, "
+                             f"expected {FORMAT_VERSION}; re-export it.")
+        self.path    = path
+        self.name    = path.name
+        self.rows    = int(meta["rows"])
+        self.nprobe  = nprobe
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.id_keys = np.load(path / "id_keys.npy", mmap_mode="r")
+        self.id_rows = np.load(path / "id_rows.npy", mmap_mode="r")
+
+        has_ivf = int(meta.get("nlist", 0)) > 0
+        if mode == "ivf" and not has_ivf:
+            raise ValueError(f"{path}: no IVF index; export with --nlist.")
+        self.mode = "ivf" if has_ivf and mode in ("ivf", "auto") else "exact"
+        if self.mode == "ivf":
+            self.centroids = np.load(path / "centroids.npy", mmap_mode="r")
+            self.ivf_rows  = np.load(path / "ivf_rows.npy",  mmap_mode="r")
+            self.ivf_ptr   = np.load(path / "ivf_ptr.npy",   mmap_mode="r")
+
+        self.quantize = meta.get("quantize", "none")
+        if self.quantize == "int8":
+            self.codes = np.load(path / "codes_int8.npy", mmap_mode="r")
+            self.scale = np.load(path / "scale.npy")
+        elif self.quantize == "binary":
+            self.codes = np.load(path / "codes_bin.npy", mmap_mode="r")
+
+        self._fh      = open(path / "records.jsonl", "rb")
+        self._records = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self.rows else b""
+
+    @classmethod
+    def load(cls, path: Path, mode: str = "auto") -> Optional["LocalCollection"]:
+        """The export at `path`, or None if there is none."""
+        if not (path / "meta.json").exists():
+            return None
+        return cls(path, mode)
+
+    def count(self) -> int:
+        return self.rows
+
+    # ── helpers ───────────────────────────────────────────────────
+    def _record(self, row: int) -> Dict[str, Any]:
+        lo, hi = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._records[lo:hi])
+
+    def _scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        return float_scores(self.vectors[:self.rows], q, rows)
+
+    def _coarse_scores(self, q: np.ndarray) -> np.ndarray:
+        """Stage 1 of quantised search: approximate scores from the codes."""
+        if self.quantize == "int8":
+            return int8_scores(self.codes, self.scale, q)
+        return binary_scores(self.codes, q)
+
+    def _candidates(self, q: np.ndarray) -> np.ndarray:
+        """IVF: rows of the `nprobe` clusters nearest to one query vector."""
+        near = top_k(np.asarray(self.centroids) @ q, self.nprobe)
+        return np.concatenate([self.ivf_rows[self.ivf_ptr[c]:self.ivf_ptr[c + 1]]
+                               for c in near])
+
+    def _result(self, rows_per_query: List[Sequence[int]],
+                include: Sequence[str],
+                dists: Optional[List[np.ndarray]] = None) -> Dict[str, Any]:
+        recs = [[self._record(int(r)) for r in rows] for rows in rows_per_query]
+        out: Dict[str, Any] = {"ids": [[r["id"] for r in rs] for rs in recs]}
+        if "documents" in include:
+            out["documents"] = [[r["document"] for r in rs] for rs in recs]
+        if "metadatas" in include:
+            out["metadatas"] = [[r["metadata"] for r in rs] for rs in recs]
+        if "distances" in include and dists is not None:
+            out["distances"] = [d.tolist() for d in dists]
+        if "embeddings" in include:
+            out["embeddings"] = [np.asarray(self.vectors[list(rows)], dtype=np.float32)
+                                 for rows in rows_per_query]
+        return out
+
+    # ── public API ────────────────────────────────────────────────
+    def query(self, query_embeddings, n_results: int = 10,
+              include: Sequence[str] = ("documents", "metadatas", "distances"),
+              **_ignored) -> Dict[str, Any]:
+        """
+        Top-`n_results` rows per query embedding, like `Collection.query`.
+        Distances are squared L2 between unit vectors (2 − 2·cos).
+        """
+        q = _normalise(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        if self.rows == 0:
+            return self._result([[] for _ in q], include, [np.empty(0)] * len(q))
+
+        rows_out: List[np.ndarray] = []
+        dists:    List[np.ndarray] = []
+        if self.mode == "exact" and self.quantize != "none":
+            coarse = self._coarse_scores(q)             # (rows, m), scan codes
+            keep   = max(RESCORE_MIN, RESCORE_MULT * n_results)
+            for j in range(len(q)):
+                cand   = np.sort(top_k(coarse[:, j], keep))
+                scores = self._scores(q[j:j + 1], cand)[:, 0]   # float16 rows
+                best   = top_k(scores, n_results)
+                rows_out.append(cand[best])
+                dists.append(np.maximum(2.0 - 2.0 * scores[best], 0.0))
+        elif self.mode == "exact":
+            scores = self._scores(q)                    # (rows, m), one product
+            for j in range(len(q)):
+                best = top_k(scores[:, j], n_results)
+                rows_out.append(best)
+                dists.append(np.maximum(2.0 - 2.0 * scores[best, j], 0.0))
+        else:
+            for vec in q:
+                cand   = self._candidates(vec)
+                scores = self._scores(vec[None, :], cand)[:, 0]
+                best   = top_k(scores, n_results)
+                rows_out.append(cand[best])
+                dists.append(np.maximum(2.0 - 2.0 * scores[best], 0.0))
+        return self._result(rows_out, include, dists)
+
+    def get(self, ids: Optional[Sequence[str]] = None,
+            include: Sequence[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: int = 0,
+            **_ignored) -> Dict[str, Any]:
+        """Rows by ID (unknown IDs are skipped) or by position, like `Collection.get`."""
+        if ids is None:
+            stop = self.rows if limit is None else min(self.rows, offset + limit)
+            rows = list(range(offset, stop))
+        else:
+            rows = []
+            for cid in ids:
+                key = cid.encode("utf-8")
+                i   = int(np.searchsorted(self.id_keys, key, side="left"))
+                if i < self.id_keys.size and self.id_keys[i] == key:
+                    rows.append(int(self.id_rows[i]))
+        res = self._result([rows], include)
+        return {k: v[0] for k, v in res.items()}
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 5.  Recall-vs-memory report                                      ║
+# ╚════════════════════════════════════════════════════════════════╝
+def recall_report(path: Path, k: int = 5, n_queries: int = 200,
+                  seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Recall@k of int8 / binary search, with and without rescoring,
+    against exact float search over the export at `path`; plus bytes
+    scanned per vector and query latency.  The codes are computed on
+    the fly, so this works whatever the export's own `quantize` is.
+
+    Queries are a sample of the indexed vectors themselves: each finds
+    itself first, and the other k − 1 neighbours carry the signal.
+    """
+    vectors = np.load(path / "vectors.npy", mmap_mode="r")
+    n, dim  = vectors.shape
+    rng     = np.random.default_rng(seed)
+    q       = _normalise(vectors[np.sort(rng.choice(n, size=min(n, n_queries),
+                                                    replace=False))])
+    keep    = max(RESCORE_MIN, RESCORE_MULT * k)
+
+    def timed(fn):
+        started = time.perf_counter()
+        out     = fn()
+        return out, (time.perf_counter() - started) * 1000 / len(q)
+
+    def tops(scores):
+        return [top_k(scores[:, j], k) for j in range(len(q))]
+
+    def rescored(coarse):
+        out = []
+        for j in range(len(q)):
+            cand = np.sort(top_k(coarse[:, j], keep))
+            out.append(cand[top_k(float_scores(vectors, q[j:j + 1], cand)[:, 0], k)])
+        return out
+
+    truth, ms = timed(lambda: tops(float_scores(vectors, q)))
+
+    def recall(found):
+        return float(np.mean([len(set(f) & set(t)) / len(t)
+                              for f, t in zip(found, truth)]))
+
+    scale = int8_scale(vectors)
+    codes = {"int8":   (dim,            lambda: int8_scores(quantize_int8(vectors, scale), scale, q)),
+             "binary": ((dim + 7) // 8, lambda: binary_scores(quantize_binary(vectors), q))}
+
+    report = [{"mode": "float32 (Chroma)", "bytes": 4 * dim, "recall": None, "ms": None},
+              {"mode": "float16 exact",    "bytes": 2 * dim, "recall": 1.0,  "ms": ms}]
+    for name, (nbytes, score_fn) in codes.items():
+        coarse = score_fn()                          # encoding is not timed
+        found, ms = timed(lambda: tops(coarse))
+        report.append({"mode": f"{name} scan only", "bytes": nbytes,
+                       "recall": recall(found), "ms": ms})
+        found, ms = timed(lambda: rescored(coarse))
+        report.append({"mode": f"{name} + rescore", "bytes": nbytes,
+                       "recall": recall(found), "ms": ms})
+    for row in report:
+        row["mb"]      = row["bytes"] * n / 2**20
+        row["smaller"] = 4 * dim / row["bytes"]
+    return report
+
+
+def print_report(report: List[Dict[str, Any]], k: int) -> None:
+    print(f"{'mode':<18} {'B/vec':>6} {'MB':>9} {'× smaller':>9} "
+          f"{f'recall@{k}':>9} {'ms/query':>9}")
+    for row in report:
+        recall = "ref" if row["recall"] is None else f"{row['recall']:.3f}"
+        ms     = "" if row["ms"] is None else f"{row['ms']:.2f}"
+        print(f"{row['mode']:<18} {row['bytes']:>6} {row['mb']:>9.1f} "
+              f"{row['smaller']:>9.1f} {recall:>9} {ms:>9}")
+    print("(rescoring also reads the float16 rows of the candidates only)")
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 6.  Script entry-point                                           ║
+# ╚════════════════════════════════════════════════════════════════╝
+if __name__ == "__main__":
+    from chromadb import PersistentClient
+    from chromadb.config import Settings, DEFAULT_TENANT, DEFAULT_DATABASE
+
+    parser = argparse.ArgumentParser(description="Export Chroma to the local index.")
+    parser.add_argument("--chroma", type=Path, default=Path("./chroma_db"),
+                        help="Chroma folder (default ./chroma_db)")
+    parser.add_argument("--collection", default="codebase")
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="IVF clusters (≈ √rows); 0 = exact only, "
+                             "default keeps the previous export's setting")
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default=None,
+                        help="scan codes for exact search; "
+                             "default keeps the previous export's setting")
+    parser.add_argument("--report", action="store_true",
+                        help="print recall vs memory for every mode and exit")
+    parser.add_argument("--k", type=int, default=5, help="recall@k for --report")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="sampled queries for --report")
+    args = parser.parse_args()
+
+    if args.report:
+        print_report(recall_report(args.chroma / LOCAL_DIR, args.k, args.queries), args.k)
+        raise SystemExit(0)
+
+    client = PersistentClient(path=str(args.chroma), settings=Settings(),
+                              tenant=DEFAULT_TENANT, database=DEFAULT_DATABASE)
+    started = time.perf_counter()
+    counts  = export_local(client.get_or_create_collection(args.collection),
+                           args.chroma / LOCAL_DIR, args.nlist, args.quantize)
+    print(f"Local index: {counts['rows']} rows × {counts['dim']} dims, "
+          f"IVF lists {counts['nlist'] or 'none'}, "
+          f"quantize {counts['quantize']} in "
+          f"{time.perf_counter() - started:.1f} s → {args.chroma / LOCAL_DIR}")
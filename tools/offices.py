@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+offices.py
+────────────────────────────────────────────────────────────────────
+Parse the rows of the office table in `data/offices.pdf` into fields.
+
+pdfplumber flattens each table row into one line of text:
+
+    HQ 123 Main St, New York, NY 200 15M Corporate Operations, Finance
+    └┬┘ └─────────────┬───────────┘ └┬┘ └┬┘ └────────────┬─────────────┘
+   office          address      employees revenue     services
+
+The address is "<street>, <city>[, <region>]" where region is a US state
+or a country (Singapore has none).  When two table cells overlap,
+pdfplumber interleaves their characters, e.g.
+
+    Cape Town Office 12 Table Mountain St, Cape Town, South Afr7ic0a 5M …
+
+so a second pattern pulls the employee digits back out of the region.
+
+Lines that are not office rows (the header, prose) give `None`.
+
+`OfficeTable` is the side table `index_pdf.py` writes next to the Chroma
+DB: one structured record (with coordinates) per office row, keyed by the
+row's Chroma ID, so consumers never have to re-parse the text.
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Row patterns                                                 ║
+# ╚════════════════════════════════════════════════════════════════╝
+ROW_RE = re.compile(r"""
+    ^(?P<office>\S.*?)\s+
+    (?P<street>\d[\w-]*\s[^,]+),\s*
+    (?P<city>[^,\d]+?)
+    (?:,\s*(?P<region>[^,\d]+?))?\s+
+    (?P<employees>\d+)\s+
+    (?P<revenue>\d+(?:\.\d+)?[KMB])\s+
+    (?P<services>.+)$
+""", re.X)
+
+# Same row, but the employee count is interleaved into the region text
+MANGLED_ROW_RE = re.compile(r"""
+    ^(?P<office>\S.*?)\s+
+    (?P<street>\d[\w-]*\s[^,]+),\s*
+    (?P<city>[^,\d]+?),\s*
+    (?P<region>[^,]*?\d[^,]*?)\s+
+    (?P<revenue>\d+(?:\.\d+)?[KMB])\s+
+    (?P<services>.+)$
+""", re.X)
+
+REVENUE_SCALE = {"K": 1e3, "M": 1e6, "B": 1e9}
+
+# Every metadata key an office row adds to its line (parsed fields + coordinates)
+OFFICE_FIELDS = ("office", "street", "city", "region", "country",
+                 "employees", "revenue_usd", "services", "lat", "lon")
+
+US_STATES = {
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "DC", "FL", "GA", "HI",
+    "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN",
+    "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH",
+    "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA",
+    "WV", "WI", "WY",
+}
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Parsing                                                      ║
+# ╚════════════════════════════════════════════════════════════════╝
+def parse_office_line(line: str) -> Optional[Dict[str, object]]:
+    """
+    Fields of one office row, or None if `line` is not one.
+
+    Keys: office, street, city, region (str, "" if absent), country
+    (region, "USA" for a US state, the city for city-states), employees
+    (int), revenue_usd (int), services (str, comma-separated).
+    """
+    line = line.strip()
+    match = ROW_RE.match(line)
+    if match:
+        fields = match.groupdict()
+    else:
+        match = MANGLED_ROW_RE.match(line)
+        if not match:
+            return None
+        fields = match.groupdict()
+        mixed  = fields["region"]
+        fields["employees"] = "".join(ch for ch in mixed if ch.isdigit())
+        fields["region"]    = "".join(ch for ch in mixed if not ch.isdigit())
+
+    revenue = fields["revenue"]
+    city    = fields["city"].strip()
+    region  = (fields["region"] or "").strip()
+    return {
+        "office":      fields["office"].strip(),
+        "street":      fields["street"].strip(),
+        "city":        city,
+        "region":      region,
+        "country":     "USA" if region in US_STATES else (region or city),
+        "employees":   int(fields["employees"]),
+        "revenue_usd": int(float(revenue[:-1]) * REVENUE_SCALE[revenue[-1]]),
+        "services":    fields["services"].strip(),
+    }
+
+
+def read_offices(pdf_path: Path) -> Iterator[Dict[str, object]]:
+    """Every office row found in a PDF, in document order."""
+    import pdfplumber                           # only needed here
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            for line in (page.extract_text() or "").splitlines():
+                row = parse_office_line(line)
+                if row:
+                    yield row
+
+
+def place_name(row: Dict[str, object]) -> str:
+    """Place name of an office row: "City, Region", or just "City"."""
+    return ", ".join(p for p in (row["city"], row["region"]) if p)
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Side table                                                   ║
+# ╚════════════════════════════════════════════════════════════════╝
+TABLE_VERSION = 1
+
+
+class OfficeTable:
+    """
+    JSON file of office records, grouped by source PDF:
+
+        {"version": 1,
+         "files": {"data/offices.pdf": {"data/offices.pdf-1": {...}, ...}}}
+    """
+
+    def __init__(self, path: Path):
+        self.path   = path
+        self.exists = path.exists()
+        self.files: Dict[str, Dict[str, dict]] = {}
+        if self.exists:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == TABLE_VERSION:
+                self.files = data.get("files", {})
+            else:
+                self.exists = False                 # old format → rebuild
+
+    def replace(self, pdf_path: str, records: Dict[str, dict]) -> None:
+        """Set all office records of one PDF (chunk ID → record)."""
+        if records:
+            self.files[pdf_path] = records
+        else:
+            self.files.pop(pdf_path, None)
+
+    def prune(self, seen: Iterable[str]) -> None:
+        """Forget PDFs that no longer exist."""
+        keep = set(seen)
+        for pdf_path in [p for p in self.files if p not in keep]:
+            del self.files[pdf_path]
+
+    def records(self) -> List[dict]:
+        """Every office record, in file and row order."""
+        return [rec for recs in self.files.values() for rec in recs.values()]
+
+    def save(self) -> None:
+        """Write atomically (temp file + rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"version": TABLE_VERSION, "files": self.files},
+                                  indent=1, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
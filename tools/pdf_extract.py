@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+pdf_extract.py
+────────────────────────────────────────────────────────────────────
+PDF → text-line extraction for `index_pdf.py`, sequential **or** spread
+over a pool of worker processes.
+
+pdfplumber is pure Python and CPU-bound, so one core extracts while the
+rest sit idle.  `stream_pdf_lines()` instead:
+
+1. Opens every PDF in the pool just long enough to count its pages.
+2. Splits each PDF into page ranges of `PAGES_PER_TASK` pages and hands
+   the ranges to the pool (parallel *across* and *within* PDFs).
+3. Emits the extracted lines **in document order** through a bounded
+   queue, so the embedding stage in the parent process overlaps with
+   extraction, and extraction pauses when embedding falls behind.
+
+This module deliberately imports nothing heavier than pdfplumber: the
+workers are started with the "spawn" method and re-import it, and they
+should not pay for loading torch or Chroma.
+"""
+
+from __future__ import annotations
+
+# ───────────────────── standard-library imports ────────────────────
+import multiprocessing
+import os
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# ───────────────────── 3rd-party imports ───────────────────────────
+import pdfplumber                               # PDF text extractor
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  Configuration                                                ║
+# ╚════════════════════════════════════════════════════════════════╝
+EXTRACT_WORKERS = os.cpu_count() or 1          # worker processes
+PAGES_PER_TASK  = 16                           # pages per pool task
+QUEUE_SIZE      = 64                           # page-range segments buffered
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  Regex helper: split lines & trim whitespace                  ║
+# ╚════════════════════════════════════════════════════════════════╝
+#   • `\r?\n`  = Windows or Unix newline
+#   • `[^\S\r\n]*` = optional leading/trailing spaces or tabs
+LINE_RE = re.compile(r"[^\S\r\n]*\r?\n[^\S\r\n]*")
+
+# One item on the output stream:
+#   (path, lines, None)  – next segment of lines for `path`, in order
+#   (path, None,  None)  – `path` is complete
+#   (path, None,  err)   – `path` failed; no more items for it follow
+Segment = Tuple[Path, Optional[List[str]], Optional[str]]
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Worker functions (must be top-level so they pickle)          ║
+# ╚════════════════════════════════════════════════════════════════╝
+def page_count(path: Path) -> int:
+    """Number of pages in a PDF."""
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_range(path: Path, start: int = 0,
+                       stop: Optional[int] = None) -> List[str]:
+    """
+    Return every non-blank line on pages `[start, stop)` of a PDF,
+    preserving order.
+    """
+    lines: List[str] = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[start:stop]:
+            text = page.extract_text() or ""
+            for raw_line in LINE_RE.split(text):
+                line = raw_line.strip()
+                if line:                      # skip blanks
+                    lines.append(line)
+    return lines
+
+
+def extract_lines(path: Path) -> List[str]:
+    """
+    Read a PDF and return *every* non-blank line, preserving order.
+
+    Parameters
+    ----------
+    path : Path
+        Full path to a .pdf file.
+
+    Returns
+    -------
+    List[str]
+        One entry per non-empty line (page order kept).
+    """
+    return extract_page_range(path)
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 4.  Streaming, parallel extraction                               ║
+# ╚════════════════════════════════════════════════════════════════╝
+def _sequential(pdf_files: Sequence[Path]) -> Iterator[Segment]:
+    """Single-process fallback (`workers <= 1`)."""
+    for path in pdf_files:
+        try:
+            lines = extract_lines(path)
+        except Exception as err:
+            yield path, None, str(err)
+            continue
+        yield path, lines, None
+        yield path, None, None
+
+
+def _produce(pdf_files: Sequence[Path], workers: int, pages_per_task: int,
+             put) -> None:
+    """
+    Producer thread body: count pages, fan page ranges out to the pool
+    and `put()` the results back in order.  At most `2 × workers` tasks
+    are in flight, so finished-but-unconsumed text stays bounded too.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # ── 1. Page counts (opening big PDFs is itself slow) ──────
+        count_futs = [pool.submit(page_count, p) for p in pdf_files]
+        tasks: List[Tuple[Path, int, int]] = []
+        failed: set = set()
+        for path, fut in zip(pdf_files, count_futs):
+            try:
+                n = fut.result()
+            except Exception as err:
+                failed.add(path)
+                if not put((path, None, str(err))):
+                    return
+                continue
+            tasks += [(path, s, min(s + pages_per_task, n))
+                      for s in range(0, n, pages_per_task)]
+            tasks.append((path, n, -1))       # end-of-file marker
+
+        # ── 2. Page ranges, sliding window, in-order output ───────
+        window: deque = deque()
+        pending = iter(tasks)
+        max_in_flight = max(2, 2 * workers)
+
+        def _fill() -> None:
+            while len(window) < max_in_flight:
+                task = next(pending, None)
+                if task is None:
+                    return
+                path, start, stop = task
+                fut = None if stop < 0 else pool.submit(
+                    extract_page_range, path, start, stop)
+                window.append((path, fut))
+
+        _fill()
+        while window:
+            path, fut = window.popleft()
+            _fill()
+            if path in failed:
+                if fut is not None:
+                    fut.cancel()
+                continue
+            if fut is None:
+                item: Segment = (path, None, None)
+            else:
+                try:
+                    item = (path, fut.result(), None)
+                except Exception as err:
+                    failed.add(path)
+                    item = (path, None, str(err))
+            if not put(item):
+                for _, f in window:
+                    if f is not None:
+                        f.cancel()
+                return
+
+
+def stream_pdf_lines(pdf_files: Sequence[Path],
+                     workers: int = EXTRACT_WORKERS,
+                     pages_per_task: int = PAGES_PER_TASK,
+                     queue_size: int = QUEUE_SIZE) -> Iterator[Segment]:
+    """
+    Yield `Segment`s for `pdf_files`, extracted by `workers` processes.
+
+    Segments of one PDF arrive in page order and PDFs arrive in the
+    order given, so callers can number lines with a running counter.
+    The bounded queue (`queue_size` segments) provides back-pressure.
+    """
+    if workers <= 1:
+        yield from _sequential(pdf_files)
+        return
+
+    out: queue.Queue = queue.Queue(maxsize=queue_size)
+    done = object()
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        """Blocking put that gives up once the consumer has gone away."""
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    finished: set = set()                     # paths whose last item went out
+
+    def _emit(item: Segment) -> bool:
+        if item[1] is None:
+            finished.add(item[0])
+        return _put(item)
+
+    def _run() -> None:
+        try:
+            _produce(pdf_files, workers, pages_per_task, _emit)
+        except Exception as err:              # pool broke: fail what's left
+            for path in pdf_files:
+                if path not in finished and \
+                        not _emit((path, None, f"extraction pool failed: {err}")):
+                    break
+        finally:
+            _put(done)
+
+    producer = threading.Thread(target=_run, name="pdf-extract", daemon=True)
+    producer.start()
+    try:
+        while (item := out.get()) is not done:
+            yield item
+    finally:
+        stop.set()
+        producer.join()
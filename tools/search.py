@@ -1,12 +1,34 @@
 #!/usr/bin/env python3
 # search.py — colourised, similarity-aware search with numbered, clearly-
 #             separated results and explicit cosine-similarity labels.
+#             Similarities come straight from Chroma's distances; no
+#             corpus scan or embedding round trip per query.
+#
+#             Batch mode (offline evaluation) reads JSONL queries from a
+#             file or stdin and streams JSONL results:
+#
+#               python tools/search.py --batch queries.jsonl > results.jsonl
+#               echo '{"id": 7, "query": "paris office"}' | python tools/search.py --batch -
+#
+#             Input lines are {"query": ..., "id": ...} objects, JSON
+#             strings or plain text.  Each chunk of queries costs one
+#             batched encode and one multi-embedding Chroma query.
+
+import argparse
+import json
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple
 
 import numpy as np
 from sentence_transformers import SentenceTransformer
 from chromadb import PersistentClient
 from chromadb.config import Settings, DEFAULT_TENANT, DEFAULT_DATABASE
 
+from embed_cache import EmbeddingCache   # repeat queries skip the encoder
+
 # ── ANSI colours (works on most POSIX terminals) ─────────────────────────
 GREEN = "\033[92m"   # best match
 BLUE  = "\033[94m"   # other matches
@@ -21,39 +43,116 @@ db_client = PersistentClient(
     database=DEFAULT_DATABASE,
 )
 
+# Opened once and reused by every query (the handle is cheap to keep)
+coll = db_client.get_or_create_collection(name="codebase")
+
 embed_model = SentenceTransformer("all-MiniLM-L6-v2")  # same model as indexers
+embed_cache = EmbeddingCache(embed_model, "all-MiniLM-L6-v2",
+                             disk_dir=Path("./chroma_db/embed_cache"))
+
+# ── Utility: Chroma distance → cosine similarity ─────────────────────────
+def distance_to_similarity(dists: np.ndarray, space: str) -> np.ndarray:
+    """
+    Turn Chroma's distances into cosine similarity in one numpy pass, so
+    we never have to fetch the stored embeddings.  MiniLM vectors are
+    unit length, which makes all three spaces exact:
+
+        cosine : d = 1 - cos          →  cos = 1 - d
+        ip     : d = 1 - a·b          →  cos = 1 - d
+        l2     : d = |a - b|² = 2 - 2cos  →  cos = 1 - d / 2
+    """
+    dists = np.asarray(dists, dtype=np.float64)
+    if space == "l2":
+        return 1.0 - dists / 2.0
+    return 1.0 - dists
+
+# ── Batch search ─────────────────────────────────────────────────────────
+QUERY_BATCH = 256   # queries per encode + Chroma round trip in batch mode
+
+def search_batch(queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+    """
+    Top-k hits for every query, in input order.  All queries share one
+    batched encode (cache misses only) and one Chroma query.
+    """
+    total_chunks = coll.count()
+    if not queries or total_chunks == 0:
+        return [[] for _ in queries]
+
+    results = coll.query(
+        query_embeddings=embed_cache.encode_many(queries),
+        n_results=min(top_k, total_chunks),
+        include=["documents", "metadatas", "distances"],
+    )
+
+    space = (coll.metadata or {}).get("hnsw:space", "l2")
+    out: List[List[Dict[str, Any]]] = []
+    for docs, metas, dists in zip(results["documents"], results["metadatas"],
+                                  results["distances"]):
+        sims = distance_to_similarity(dists, space)
+        out.append([
+            {"rank": rank, "similarity": round(float(sim), 6),
+             "path": meta.get("path"), "chunk_index": meta.get("chunk_index"),
+             "document": doc}
+            for rank, (doc, meta, sim) in enumerate(zip(docs, metas, sims), start=1)
+        ])
+    return out
 
-# ── Utility: exact cosine similarity ─────────────────────────────────────
-def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10))
+def read_queries(lines: Iterable[str]) -> Iterator[Tuple[Any, str]]:
+    """(id, query) per non-blank input line; id defaults to the line number."""
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line                               # plain-text query
+        if isinstance(item, dict):
+            yield item.get("id", line_no), str(item.get("query", ""))
+        else:
+            yield line_no, str(item)
+
+def run_batch(src: TextIO, dst: TextIO, top_k: int = 3,
+              batch_size: int = QUERY_BATCH) -> int:
+    """Stream JSONL results for every query in `src`; returns the count."""
+    pending = read_queries(src)
+    count   = 0
+    while True:
+        chunk = list(islice(pending, batch_size))
+        if not chunk:
+            return count
+        hits = search_batch([q for _, q in chunk], top_k)
+        for (qid, query), results in zip(chunk, hits):
+            dst.write(json.dumps({"id": qid, "query": query, "results": results},
+                                 ensure_ascii=False) + "\n")
+        dst.flush()                                   # results appear per chunk
+        count += len(chunk)
 
 # ── Core search routine ──────────────────────────────────────────────────
 def search(query: str, top_k: int = 3) -> None:
-    coll = db_client.get_or_create_collection(name="codebase")
-
-    total_chunks = len(coll.get().get("documents", []))
+    total_chunks = coll.count()                  # O(1); no documents loaded
     if total_chunks == 0:
         print("Collection is empty — nothing to search.")
         return
     print(f"Collection contains {total_chunks} chunks.\n")
 
-    query_vec = embed_model.encode(query)
+    query_vec = embed_cache.encode(query)
 
     results = coll.query(
         query_embeddings=[query_vec.tolist()],
-        n_results=top_k,
-        include=["documents", "metadatas", "embeddings"],
+        n_results=min(top_k, total_chunks),
+        include=["documents", "metadatas", "distances"],
     )
 
-    docs   = results["documents"][0]
-    metas  = results["metadatas"][0]
-    embeds = results["embeddings"][0]
+    docs  = results["documents"][0]
+    metas = results["metadatas"][0]
 
     if not docs:
         print("No matches found.")
         return
 
-    sims = [cosine_sim(query_vec, np.array(e)) for e in embeds]
+    space    = (coll.metadata or {}).get("hnsw:space", "l2")
+    sims     = distance_to_similarity(results["distances"][0], space)
     best_idx = int(np.argmax(sims))
 
     for i, (doc, meta, sim) in enumerate(zip(docs, metas, sims), start=1):
@@ -68,12 +167,35 @@ def search(query: str, top_k: int = 3) -> None:
             f"Source: {meta['path']}  (chunk {meta['chunk_index']})\n"
         )
 
-# ── Simple REPL ──────────────────────────────────────────────────────────
+# ── Simple REPL (or batch mode) ──────────────────────────────────────────
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the indexed codebase.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="JSONL queries to run ('-' for stdin); results go to stdout")
+    parser.add_argument("--top-k", type=int, default=3,
+                        help="hits per query (default 3)")
+    parser.add_argument("--batch-size", type=int, default=QUERY_BATCH,
+                        help=f"queries per encode/Chroma call (default {QUERY_BATCH})")
+    args = parser.parse_args()
+
+    if args.batch:
+        started = time.perf_counter()
+        if args.batch == "-":
+            n = run_batch(sys.stdin, sys.stdout, args.top_k, args.batch_size)
+        else:
+            with open(args.batch, encoding="utf-8") as fh:
+                n = run_batch(fh, sys.stdout, args.top_k, args.batch_size)
+        elapsed = time.perf_counter() - started
+        print(f"{n} queries in {elapsed:.1f} s "
+              f"({n / elapsed if elapsed else 0:.0f}/s); "
+              f"embedding cache: {embed_cache.stats()}", file=sys.stderr)
+        sys.exit(0)
+
     print("Enter your search query (type 'exit' to quit):")
     while True:
         user_input = input("🔍 Search: ").strip()
         if user_input.lower() == "exit":
+            print(f"Embedding cache: {embed_cache.stats()}")
             print("Exiting search.")
             break
         if user_input:
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+speculation.py
+────────────────────────────────────────────────────────────────────
+Speculative execution for the agents' pipelines.  A step whose inputs
+can be *guessed* early (geocode the city named in the prompt, fetch the
+weather there) is started on that guess while the real dependency
+(vector search, LLM planning) is still running.  When the pipeline
+reaches the step it asks for the same key: a matching guess is awaited
+instead of starting over, anything else runs normally, and every guess
+still unused at the end is cancelled.
+
+End-to-end latency then approaches the longest dependency chain, not
+the sum of the steps – when the guess is right.  A wrong guess costs a
+cancelled request, nothing more.
+
+    async with Speculator(stats) as spec:
+        spec.start(("geocode", "Paris"), geocoder.geocode("Paris"))
+        hits   = await search                                  # meanwhile …
+        coords = await spec.get(("geocode", city), lambda: geocoder.geocode(city))
+    # unused speculative tasks are cancelled here
+
+`stats` (optional, a `Counter`) accumulates across Speculators:
+started / used / cancelled / wasted (finished, but not needed).
+
+`ThreadSpeculator` is the same for blocking code (`agent.py`): work
+runs on a thread pool; unused work that has not started is cancelled,
+work already running is left to finish (threads cannot be interrupted).
+
+`bounded_gather(aws, limit)` is the fan-out counterpart: many
+independent steps (one weather lookup per office) at most `limit` at a
+time, results in input order.
+"""
+
+from __future__ import annotations
+
+# ─── standard library ─────────────────────────────────────────────
+import asyncio
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Any, Awaitable, Callable, Coroutine, Dict, Hashable,
+                    Iterable, List, Optional, Set)
+
+GRID_DEG = 0.1                                  # = the MCP server's weather cell
+
+
+def weather_key(lat: float, lon: float, grid: float = GRID_DEG) -> tuple:
+    """
+    Speculation key for a weather lookup.  The server snaps coordinates
+    to `GRID_DEG` cells, so a guess in the same cell is as good as exact.
+    """
+    return ("weather", round(lat / grid), round(lon / grid))
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 1.  asyncio                                                      ║
+# ╚════════════════════════════════════════════════════════════════╝
+class Speculator:
+    """Keyed speculative tasks for one pipeline run (async context manager)."""
+
+    def __init__(self, stats: Optional[Counter] = None):
+        self.stats = stats if stats is not None else Counter()
+        self._tasks:   Dict[Hashable, asyncio.Task] = {}
+        self._helpers: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "Speculator":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.cancel_unused()
+
+    def start(self, key: Hashable, coro: Coroutine) -> None:
+        """Run `coro` in the background as the guess for `key` (first guess wins)."""
+        if key in self._tasks:
+            coro.close()
+            return
+        self._tasks[key] = asyncio.ensure_future(coro)
+        self.stats["started"] += 1
+
+    def spawn(self, coro: Coroutine) -> None:
+        """
+        Background helper that *makes* guesses (e.g. geocode, then start
+        the weather fetch).  Not counted; cancelled like unused guesses.
+        """
+        task = asyncio.ensure_future(coro)
+        self._helpers.add(task)
+        task.add_done_callback(self._helper_done)
+
+    def _helper_done(self, task: asyncio.Task) -> None:
+        self._helpers.discard(task)
+        if not task.cancelled():
+            task.exception()                    # a failed guess is just no guess
+
+    async def peek(self, key: Hashable) -> Any:
+        """Await the guess for `key` without claiming it (for helpers)."""
+        return await asyncio.shield(self._tasks[key])
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result for `key`: the speculative task's, if one was started
+        (its exception, if it failed), else `await compute()`.
+        """
+        task = self._tasks.pop(key, None)
+        if task is None:
+            return await compute()
+        self.stats["used"] += 1
+        return await task
+
+    async def cancel_unused(self) -> None:
+        """Cancel every unclaimed guess and helper; wait until they are gone."""
+        pending: List[asyncio.Task] = list(self._helpers)
+        for task in self._tasks.values():
+            if task.done():
+                self.stats["wasted"] += 1
+            else:
+                task.cancel()
+                self.stats["cancelled"] += 1
+            pending.append(task)
+        for task in self._helpers:
+            task.cancel()
+        self._tasks.clear()
+        # collect results / exceptions so nothing is logged as "never retrieved"
+        await asyncio.gather(*pending, return_exceptions=True)
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 2.  threads (blocking code)                                      ║
+# ╚════════════════════════════════════════════════════════════════╝
+class ThreadSpeculator:
+    """`Speculator` for synchronous callers; use as a context manager."""
+
+    def __init__(self, executor: ThreadPoolExecutor,
+                 stats: Optional[Counter] = None):
+        self.executor = executor
+        self.stats    = stats if stats is not None else Counter()
+        self._futures: Dict[Hashable, Future] = {}
+
+    def __enter__(self) -> "ThreadSpeculator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cancel_unused()
+
+    def start(self, key: Hashable, fn: Callable[..., Any], *args) -> None:
+        if key not in self._futures:
+            self._futures[key] = self.executor.submit(fn, *args)
+            self.stats["started"] += 1
+
+    def get(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        future = self._futures.pop(key, None)
+        if future is None:
+            return fn(*args)
+        self.stats["used"] += 1
+        return future.result()
+
+    def cancel_unused(self) -> None:
+        for future in self._futures.values():
+            if future.cancel():
+                self.stats["cancelled"] += 1
+            else:                               # running or done: result unused
+                self.stats["wasted"] += 1
+        self._futures.clear()
+
+# ╔════════════════════════════════════════════════════════════════╗
+# 3.  Bounded fan-out                                              ║
+# ╚════════════════════════════════════════════════════════════════╝
+async def bounded_gather(aws: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """
+    `asyncio.gather` with at most `limit` awaitables running at once.
+    Pass coroutines (not tasks) – they only start when a slot is free.
+    """
+    slots = asyncio.Semaphore(limit)
+
+    async def one(aw: Awaitable[Any]) -> Any:
+        async with slots:
+            return await aw
+
+    return await asyncio.gather(*(one(aw) for aw in aws))